@@ -0,0 +1,76 @@
+# benchmarks/bench_aead.py
+"""
+AEAD throughput matrix: AES-256-GCM vs ChaCha20-Poly1305 by payload size.
+
+For each cipher and payload size, seal and open are timed separately
+(best of --repeat runs of --seconds each) and reported in MB/s. The last
+lines show what this machine would advertise in its pairing bundle (the
+startup benchmark, crypto.aead.benchmark) and which cipher it would choose
+for a peer like itself and for one without AES instructions.
+
+AES-GCM wins by a wide margin on CPUs with AES instructions; without them
+(older or low-end ARM/x86 thin clients) ChaCha20-Poly1305 is several times
+faster.
+
+Run:
+    python -m benchmarks.bench_aead [--sizes 64,1024,16384,262144,4194304]
+                                    [--seconds 0.2] [--repeat 3]
+"""
+import argparse
+import os
+import time
+
+from crypto.aead import CIPHERS, NONCE_SIZE, KEY_SIZE, benchmark, choose
+
+
+def _rate(fn, size: int, seconds: float, repeat: int) -> float:
+    best = 0.0
+    for _ in range(repeat):
+        n = 0
+        t0 = time.perf_counter()
+        while True:
+            fn()
+            n += 1
+            elapsed = time.perf_counter() - t0
+            if elapsed >= seconds:
+                break
+        best = max(best, n * size / elapsed / 1e6)
+    return best
+
+
+def _human(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024 or unit == "MiB":
+            return f"{size:g}{unit}"
+        size /= 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="64,1024,16384,262144,4194304", help="payload sizes in bytes")
+    parser.add_argument("--seconds", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    key = os.urandom(KEY_SIZE)
+    nonce = os.urandom(NONCE_SIZE)
+    print(f"{'size':>8}  {'cipher':<18} {'seal MB/s':>10} {'open MB/s':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        data = os.urandom(size)
+        for name, cls in CIPHERS.items():
+            aead = cls(key)
+            sealed = aead.encrypt(nonce, data, None)
+            seal = _rate(lambda: aead.encrypt(nonce, data, None), size, args.seconds, args.repeat)
+            open_ = _rate(lambda: aead.decrypt(nonce, sealed, None), size, args.seconds, args.repeat)
+            print(f"{_human(size):>8}  {name:<18} {seal:>10.0f} {open_:>10.0f}")
+
+    mine = benchmark()
+    print("\nstartup benchmark (advertised):", ", ".join(f"{c} {v:.0f} MB/s" for c, v in mine.items()))
+    # a thin client without AES instructions: same ChaCha speed, AES ~10x slower
+    no_aesni = dict(mine, **{"aes-256-gcm": mine["aes-256-gcm"] / 10})
+    print(f"chosen for a peer like us: {choose(mine, mine)}; "
+          f"for a peer without AES-NI: {choose(no_aesni, mine)}")
+
+
+if __name__ == "__main__":
+    main()
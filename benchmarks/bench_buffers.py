@@ -0,0 +1,121 @@
+# benchmarks/bench_buffers.py
+"""
+Payload copies in the symmetric crypto path: old vs buffer-based.
+
+For each payload size both paths (encrypt, base64 for the wire, decode,
+decrypt) are run step by step under tracemalloc. "copied" is the memory
+allocated for payload copies over the whole round trip and "peak" the
+highest traced memory, both as multiples of the payload size (base64
+copies count as 4/3 of a payload).
+
+  old     str.encode, encrypt, slice ct/tag, base64 via bytes,
+          concat ct + tag, decrypt, bytes.decode
+  buffer  bytes input, combined ct||tag, binascii base64,
+          decrypt_into a preallocated buffer
+
+Run:
+    python -m benchmarks.bench_buffers [--sizes 1,16,128,500]   (MB)
+"""
+import argparse
+import base64
+import gc
+import os
+import time
+import tracemalloc
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from crypto.aes_gcm import aes_gcm_open_into, aes_gcm_seal
+from crypto.hybrid_encrypt import b64d, b64e
+
+MB = 1024 * 1024
+
+
+def old_path(content: str, key: bytes):
+    # one payload-sized allocation per step
+    aes = AESGCM(key)
+    nonce = os.urandom(12)
+    payload = content.encode()
+    yield
+    ciphertext = aes.encrypt(nonce, payload, None)
+    yield
+    ct, tag = ciphertext[:-16], ciphertext[-16:]
+    yield
+    encoded = base64.b64encode(ct)
+    yield
+    wire = encoded.decode("utf-8")
+    yield
+    del payload, ciphertext, ct, encoded
+    yield
+    encoded = wire.encode("utf-8")
+    yield
+    received = base64.b64decode(encoded)
+    yield
+    joined = received + tag
+    yield
+    plaintext = aes.decrypt(nonce, joined, None)
+    yield
+    plaintext.decode()
+    yield
+
+
+def buffer_path(content, key: bytes, out: bytearray):
+    nonce, sealed = aes_gcm_seal(content, key)
+    yield
+    wire = b64e(sealed)
+    yield
+    del sealed
+    yield
+    received = b64d(wire)
+    yield
+    aes_gcm_open_into(nonce, received, key, out)
+    yield
+
+
+def measure(steps, size: int):
+    """
+    Returns (bytes allocated, peak traced memory) as multiples of `size`,
+    and the elapsed time.
+    """
+    gc.collect()
+    tracemalloc.start()
+    allocated = peak = 0
+    t0 = time.perf_counter()
+    while True:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            next(steps)
+        except StopIteration:
+            break
+        step_peak = tracemalloc.get_traced_memory()[1]
+        allocated += step_peak - base
+        peak = max(peak, step_peak)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.stop()
+    return allocated / size, peak / size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="1,16,128,500", help="payload sizes in MB")
+    args = parser.parse_args()
+
+    key = AESGCM.generate_key(bit_length=256)
+    print(f"{'size':>8}  {'path':<7} {'copied':>7} {'peak':>7} {'time':>9}")
+    for mb in (int(s) for s in args.sizes.split(",")):
+        size = mb * MB
+        data = os.urandom(size // 2).hex()  # ASCII text, like a clipboard
+        for name, steps in (
+            ("old", lambda: old_path(data, key)),
+            ("buffer", lambda: buffer_path(memoryview(data.encode()), key, bytearray(size))),
+        ):
+            # build inputs (including the preallocated buffer) before measuring
+            gen = steps()
+            copied, peak, elapsed = measure(gen, size)
+            print(f"{mb:>6}MB  {name:<7} {copied:>6.2f}x {peak:>6.2f}x {elapsed * 1000:>7.0f}ms")
+            del gen
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_first_send.py
+"""
+Send latency: building every bundle from scratch vs a prepared PeerContext.
+
+  scratch  what a send did before: load both key sets from the key store,
+           parse the peer's key, generate an ephemeral keypair, ECDH + HKDF,
+           then AEAD + sign
+  context  crypto/peer_context.py, prepared when the peer was selected:
+           AEAD + sign with a pre-derived ephemeral pair
+
+"first" is the first send after startup / peer selection (fresh process
+state for scratch, a warmed pool for context). The median is over --count
+sends spaced --gap ms apart, like a user copying things; bursts faster than
+the background refill fall back to inline keygen.
+
+Run:
+    python -m benchmarks.bench_first_send [--count 200] [--gap 5] [--size 256]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from client import pairing
+from crypto import peer_context
+from crypto.hybrid_encrypt import encrypt_bundle
+
+
+def _scratch(text: str) -> float:
+    t0 = time.perf_counter()
+    keys = pairing.load_my_keys()
+    peer = pairing.load_peer("bob")
+    encrypt_bundle(text, keys.ed25519_private, peer["x25519_public"], "alice", "text",
+                   cipher=pairing.cipher_for(peer))
+    return time.perf_counter() - t0
+
+
+def _context(text: str) -> float:
+    t0 = time.perf_counter()
+    peer_context.get("bob").encrypt(text, "text")
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--gap", type=float, default=5, help="ms between sends")
+    parser.add_argument("--size", type=int, default=256, help="message size in bytes")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    pairing.DATA_DIR = tmp
+    pairing.KEYS_DB = f"{tmp}/keys.db"
+    me, bob = pairing.generate_keys(), pairing.generate_keys()
+    pairing.save_my_keys("alice", me)
+    pairing.save_peer("bob", bob.x25519_public.public_bytes_raw(), bob.ed25519_public.public_bytes_raw())
+    pairing.aead_speeds()
+    text = "x" * args.size
+
+    results = {}
+    first = _scratch(text)
+    results["scratch"] = (first, [_scratch(text) for _ in range(args.count)])
+
+    peer_context.prepare("bob")  # the peer is selected ...
+    time.sleep(0.2)  # ... a moment before the user sends
+    first = _context(text)
+    samples = []
+    for _ in range(args.count):
+        time.sleep(args.gap / 1000)
+        samples.append(_context(text))
+    results["context"] = (first, samples)
+
+    print(f"{args.size}-byte messages, {args.count} sends {args.gap:g} ms apart")
+    base = statistics.median(results["scratch"][1])
+    for name, (first, samples) in results.items():
+        median = statistics.median(samples)
+        print(f"  {name:<8} first {first * 1e6:8.0f} us   median {median * 1e6:7.0f} us"
+              f"  ({base / median:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/bench_receive.py
+"""
+Receive cost per bundle: the previous decrypt order vs staged checks.
+
+  old     what decrypt_bundle did before: X25519 + HKDF, then signature,
+          then TTL, then AEAD; no duplicate detection
+  staged  the current decrypt_bundle: structure, TTL, duplicate lookup in a
+          ReplayCache (on disk, as in the client), signature, and only then
+          key agreement and AEAD
+
+Traffic classes:
+  valid      fresh, correctly signed bundles
+  replay     bundles that were already accepted once
+  expired    correctly signed, TTL ran out
+  forged     metadata changed after signing
+  malformed  missing or wrong-sized fields
+
+Run:
+    python -m benchmarks.bench_receive [--count 2000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from client.replay_cache import ReplayCache
+from crypto.aead import aead_open, cipher_of
+from crypto.hybrid_encrypt import b64d, b64e, decrypt_bundle, encrypt_bundle, sealed_ciphertext
+from crypto.signature import generate_signing_keys, sign_metadata, verify_metadata
+from crypto.x25519_keys import derive_aes_key, derive_shared_secret, generate_keypair, load_public_key
+
+MIX = {"valid": 0.6, "replay": 0.15, "expired": 0.1, "forged": 0.1, "malformed": 0.05}
+
+
+def _old_decrypt(bundle, recipient_private_key, sender_pub):
+    eph_public = load_public_key(b64d(bundle["ephemeral_pubkey"]))
+    aes_key = derive_aes_key(derive_shared_secret(recipient_private_key, eph_public))
+    verify_metadata(bundle["metadata"], b64d(bundle["signature"]), sender_pub)
+    if time.time() - bundle["metadata"]["timestamp"] > bundle["metadata"]["ttl"]:
+        raise ValueError("Message expired (TTL exceeded)")
+    return aead_open(cipher_of(bundle["metadata"]), b64d(bundle["nonce"]), sealed_ciphertext(bundle), aes_key)
+
+
+class Traffic:
+    def __init__(self):
+        self.recipient_private, self.recipient_public = generate_keypair()
+        self.signing_private, self.signing_public = generate_signing_keys()
+
+    def valid(self, i: int) -> dict:
+        return encrypt_bundle(f"clip {i} " + "x" * 200, self.signing_private,
+                              self.recipient_public, "alice", "text")
+
+    def expired(self, i: int) -> dict:
+        b = self.valid(i)
+        b["metadata"]["timestamp"] -= 3600
+        b["signature"] = b64e(sign_metadata(b["metadata"], self.signing_private))
+        return b
+
+    def forged(self, i: int) -> dict:
+        b = self.valid(i)
+        b["metadata"]["content_type"] = "url"
+        return b
+
+    def malformed(self, i: int) -> dict:
+        b = self.valid(i)
+        if i % 2:
+            del b["metadata"]["nonce"]
+        else:
+            b["ephemeral_pubkey"] = b["ephemeral_pubkey"][:20]
+        return b
+
+
+def _build(traffic: Traffic, count: int, rng: random.Random):
+    """
+    A shuffled stream of (class, bundle); replays repeat earlier valid bundles.
+    """
+    stream, accepted = [], []
+    for i in range(count):
+        kind = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        if kind == "replay" and not accepted:
+            kind = "valid"
+        if kind == "valid":
+            bundle = traffic.valid(i)
+            accepted.append(bundle)
+        elif kind == "replay":
+            bundle = rng.choice(accepted)
+        else:
+            bundle = getattr(traffic, kind)(i)
+        stream.append((kind, bundle))
+    return stream
+
+
+def _run(decrypt, stream):
+    """
+    Returns {class: (total seconds, count, accepted)}.
+    """
+    out = {kind: [0.0, 0, 0] for kind in MIX}
+    for kind, bundle in stream:
+        t0 = time.perf_counter()
+        try:
+            decrypt(bundle)
+            ok = True
+        except Exception:
+            ok = False
+        row = out[kind]
+        row[0] += time.perf_counter() - t0
+        row[1] += 1
+        row[2] += ok
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--count", type=int, default=2000)
+    args = parser.parse_args()
+
+    traffic = Traffic()
+    stream = _build(traffic, args.count, random.Random(1))
+    seen = ReplayCache(os.path.join(tempfile.mkdtemp(), "seen.db"))
+
+    results = {
+        "old": _run(lambda b: _old_decrypt(b, traffic.recipient_private, traffic.signing_public), stream),
+        "staged": _run(lambda b: decrypt_bundle(b, traffic.recipient_private, traffic.signing_public,
+                                                seen=seen), stream),
+    }
+
+    print(f"{args.count} bundles: " + ", ".join(f"{int(v * 100)}% {k}" for k, v in MIX.items()))
+    print(f"{'class':<10} {'count':>6}   {'old us':>8} {'accepted':>9}   {'staged us':>9} {'accepted':>9}")
+    for kind in MIX:
+        old, new = results["old"][kind], results["staged"][kind]
+        if not old[1]:
+            continue
+        print(f"{kind:<10} {old[1]:>6}   {old[0] / old[1] * 1e6:>8.1f} {old[2]:>9}"
+              f"   {new[0] / new[1] * 1e6:>9.1f} {new[2]:>9}")
+    for name, rows in results.items():
+        total = sum(r[0] for r in rows.values())
+        print(f"{name:<7} total {total * 1000:8.1f} ms  ({args.count / total:,.0f} bundles/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/bench_relay_storage.py
+"""
+Relay storage benchmark: parsed-model storage vs opaque byte storage.
+
+"model" reproduces the previous relay path: parse the body into the
+pydantic Bundle model, copy it with .dict(), keep the dict tree, and
+re-encode it as JSON on fetch.
+"opaque" is the current path: read the routing fields, keep the raw body
+bytes in a StoredBundle, and return them unchanged on fetch.
+
+Run:
+    python -m benchmarks.bench_relay_storage [--count N]
+"""
+import argparse
+import base64
+import json
+import os
+import time
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+
+from server import database
+from server.main import _extract_meta
+from server.schemas import Bundle
+
+SIZES = [256, 4 * 1024, 64 * 1024]
+
+
+def _make_body(size: int, i: int) -> bytes:
+    bundle = {
+        "ciphertext": base64.b64encode(os.urandom(size)).decode(),
+        "nonce": base64.b64encode(os.urandom(12)).decode(),
+        "tag": base64.b64encode(os.urandom(16)).decode(),
+        "ephemeral_pubkey": base64.b64encode(os.urandom(32)).decode(),
+        "metadata": {
+            "timestamp": time.time(),
+            "ttl": 300,
+            "nonce": f"{i:032x}",
+            "sender_id": "bench",
+            "content_type": "text",
+            "security_level": "MEDIUM",
+        },
+        "signature": base64.b64encode(os.urandom(64)).decode(),
+    }
+    return json.dumps(bundle).encode()
+
+
+def _model_upload(body: bytes):
+    bundle = Bundle(**json.loads(body))
+    dump = getattr(bundle, "model_dump", None) or bundle.dict
+    return dump()
+
+
+def _model_fetch(stored) -> bytes:
+    return json.dumps(jsonable_encoder(stored)).encode()
+
+
+def _opaque_upload(body: bytes):
+    sender_id, _, content_type, ttl = _extract_meta({}, body)
+    return database.StoredBundle(body, sender_id, content_type, ttl)
+
+
+def _opaque_fetch(stored) -> bytes:
+    return stored.data
+
+
+def _run(upload, fetch, bodies):
+    n = len(bodies)
+
+    t0 = time.perf_counter()
+    stored = [upload(b) for b in bodies]
+    t_upload = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for s in stored:
+        fetch(s)
+    t_fetch = time.perf_counter() - t0
+    del stored
+
+    # memory pass: each upload gets its own copy of the request body, as it
+    # would from the network, so whatever the path keeps alive is counted
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    stored = [upload(bytes(bytearray(b))) for b in bodies]
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return t_upload / n * 1e6, t_fetch / n * 1e6, (held - base) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--count", type=int, default=2000, help="bundles per size")
+    args = parser.parse_args()
+
+    print(f"{'payload':>9} {'path':>12} {'upload us':>10} {'fetch us':>9} {'held B/bundle':>14}")
+    for size in SIZES:
+        bodies = [_make_body(size, i) for i in range(args.count)]
+        for name, up, fe in (("model", _model_upload, _model_fetch),
+                             ("opaque", _opaque_upload, _opaque_fetch)):
+            u, f, m = _run(up, fe, bodies)
+            print(f"{size:>9} {name:>12} {u:>10.1f} {f:>9.1f} {m:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# benchmarks/bench_relay_workers.py
+"""
+Relay delivery throughput: one worker vs several, on one host.
+
+Starts `python -m server.app` with each worker count (one port per worker,
+see server/app.py), waits for /ready, then runs --clients load processes for
+--seconds. Every client logs in for 16 recipient ids and keeps one
+keep-alive connection per worker. Each round trip POSTs a small bundle
+(metadata in X-SCCSE-* headers) and then fetches it with the recipient's
+token from the same worker, the way a proxy routing by recipient id would.
+Only bundles that come back from the fetch count as delivered.
+
+Run:
+    python -m benchmarks.bench_relay_workers [--workers 1,4] [--clients 8]
+                                             [--seconds 5] [--size 1024]
+"""
+import argparse
+import base64
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_startup import ROOT
+from crypto.signature import generate_signing_keys, relay_auth_message
+
+RECIPIENTS = 16  # per client
+
+
+def _wait_ready(port: int, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/ready")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("relay did not become ready")
+
+
+def _post_json(conn, path: str, payload=None) -> dict:
+    body = json.dumps(payload).encode() if payload is not None else b""
+    conn.request("POST", path, body, {"Content-Type": "application/json"})
+    r = conn.getresponse()
+    data = r.read()
+    if r.status != 200:
+        raise RuntimeError(f"POST {path}: {r.status} {data[:200]!r}")
+    return json.loads(data)
+
+
+def _login(conn, device_id: str, keys) -> str:
+    private, public = keys
+    challenge = _post_json(conn, f"/auth/{device_id}/challenge")["challenge"]
+    return _post_json(conn, f"/auth/{device_id}/token", {
+        "public_key": base64.b64encode(public.public_bytes_raw()).decode(),
+        "challenge": challenge,
+        "signature": base64.b64encode(private.sign(relay_auth_message(device_id, challenge))).decode(),
+    })["token"]
+
+
+def _client(ports, seconds: float, size: int, results):
+    conns = [http.client.HTTPConnection("127.0.0.1", port) for port in ports]
+    keys = generate_signing_keys()
+    sender = os.urandom(4).hex()
+    # recipient -> (connection of its worker, fetch token)
+    recipients = []
+    for j in range(RECIPIENTS):
+        conn = conns[j % len(conns)]
+        rid = f"{sender}-{j}"
+        recipients.append((rid, conn, _login(conn, rid, keys)))
+
+    body = json.dumps({"ciphertext": "A" * size}).encode()
+    done = errors = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        rid, conn, token = recipients[(done + errors) % RECIPIENTS]
+        headers = {
+            "Content-Type": "application/json",
+            "X-SCCSE-Sender": sender,
+            "X-SCCSE-Nonce": os.urandom(8).hex(),
+            "X-SCCSE-Content-Type": "text",
+        }
+        conn.request("POST", f"/upload/{rid}", body, headers)
+        r = conn.getresponse()
+        r.read()
+        conn.request("GET", f"/fetch/{rid}", headers={"Authorization": f"Bearer {token}"})
+        f = conn.getresponse()
+        fetched = f.read()
+        if r.status == 200 and f.status == 200 and fetched == body:
+            done += 1
+        else:
+            errors += 1
+    results.put((done, errors))
+
+
+def run(workers: int, clients: int, seconds: float, size: int, port: int) -> float:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "server.app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, stderr=subprocess.DEVNULL,
+        env=dict(os.environ, SCCSE_RELAY_AUTH_DB=os.path.join(tempfile.mkdtemp(), "auth.db")),
+    )
+    try:
+        ports = [port + i for i in range(workers)]
+        for p in ports:
+            _wait_ready(p)
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=_client, args=(ports, seconds, size, results))
+            for _ in range(clients)
+        ]
+        for p in procs:
+            p.start()
+        totals = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    done = sum(d for d, _ in totals)
+    errors = sum(e for _, e in totals)
+    if errors:
+        print(f"  ({errors} round trips not delivered)")
+    return done / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", default=f"1,{max(2, os.cpu_count() or 1)}")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--size", type=int, default=1024, help="ciphertext size in bytes")
+    parser.add_argument("--port", type=int, default=8931)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.size}-byte bundles")
+    base = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        rate = run(workers, args.clients, args.seconds, args.size, args.port)
+        base = base or rate
+        print(f"  {workers:>2} worker(s): {rate:8.0f} deliveries/s  ({rate / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
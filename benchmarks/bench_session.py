@@ -0,0 +1,48 @@
+# benchmarks/bench_session.py
+"""
+Small-message throughput: per-message hybrid encryption vs session mode.
+
+Each iteration encrypts one message for the peer and decrypts it on the
+other side, so both the sender and receiver costs are included.
+
+Run:
+    python -m benchmarks.bench_session [--count N] [--size BYTES]
+"""
+import argparse
+import time
+
+from client.pairing import generate_keys
+from crypto.hybrid_encrypt import encrypt_bundle, decrypt_bundle
+from crypto.session import SessionManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--count", type=int, default=3000)
+    parser.add_argument("--size", type=int, default=64, help="message size in bytes")
+    args = parser.parse_args()
+
+    alice, bob = generate_keys(), generate_keys()
+    text = "x" * args.size
+
+    t0 = time.perf_counter()
+    for _ in range(args.count):
+        b = encrypt_bundle(text, alice.ed25519_private, bob.x25519_public, "alice", "text")
+        decrypt_bundle(b, bob.x25519_private, alice.ed25519_public)
+    hybrid = args.count / (time.perf_counter() - t0)
+
+    a_sessions = SessionManager("alice", alice.x25519_private, alice.ed25519_private)
+    b_sessions = SessionManager("bob", bob.x25519_private, bob.ed25519_private)
+    t0 = time.perf_counter()
+    for _ in range(args.count):
+        b = a_sessions.encrypt(text, "bob", bob.x25519_public, "text")
+        b_sessions.decrypt(b, alice.x25519_public, alice.ed25519_public)
+    session = args.count / (time.perf_counter() - t0)
+
+    print(f"{args.size}-byte messages, {args.count} round trips")
+    print(f"  per-message hybrid : {hybrid:10.0f} msg/s")
+    print(f"  session mode       : {session:10.0f} msg/s  ({session / hybrid:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
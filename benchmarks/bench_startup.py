@@ -0,0 +1,91 @@
+# benchmarks/bench_startup.py
+"""
+Client cold-start benchmark.
+
+Measures, in fresh interpreter processes:
+  - wall time of `import client.app`,
+  - the `-X importtime` cumulative total for client.app, with the most
+    expensive imports,
+  - time until the main window is drawn (only if a display is available).
+
+Run:
+    python -m benchmarks.bench_startup [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import client.app; "
+    "print(time.perf_counter() - t)"
+)
+
+_WINDOW_SNIPPET = (
+    "import time; t = time.perf_counter(); import tkinter as tk; "
+    "from client.ui import ClientUI; root = tk.Tk(); ui = ClientUI(root); "
+    "root.update(); print(time.perf_counter() - t); root.destroy()"
+)
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, capture_output=True, text=True, timeout=60
+    )
+
+
+def importtime(module: str = "client.app"):
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        (cumulative microseconds for `module`, [(cumulative_us, name), ...])
+    """
+    out = _python("-X", "importtime", "-c", f"import {module}").stderr
+    rows = []
+    total = None
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue  # header line
+        name = parts[2].strip()
+        rows.append((cumulative, name))
+        if name == module:
+            total = cumulative
+    rows.sort(reverse=True)
+    return total, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    times = [float(_python("-c", _IMPORT_SNIPPET).stdout) for _ in range(args.runs)]
+    print(f"import client.app      : median {statistics.median(times) * 1000:7.1f} ms  "
+          f"(min {min(times) * 1000:.1f}, max {max(times) * 1000:.1f})")
+
+    total, rows = importtime()
+    print(f"-X importtime total    : {total / 1000:7.1f} ms")
+    for cumulative, name in rows[:10]:
+        print(f"    {cumulative / 1000:7.1f} ms  {name}")
+
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        r = _python("-c", _WINDOW_SNIPPET)
+        if r.returncode == 0:
+            print(f"time to first window   : {float(r.stdout) * 1000:7.1f} ms")
+        else:
+            print("time to first window   : failed:", r.stderr.strip().splitlines()[-1])
+    else:
+        print("time to first window   : skipped (no display)")
+
+
+if __name__ == "__main__":
+    main()
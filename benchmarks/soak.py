@@ -0,0 +1,485 @@
+# benchmarks/soak.py
+"""
+Soak test: hours of simulated traffic through the relay and a headless
+client, failing if memory keeps growing once the process is warmed up.
+
+The relay (server.main.app under uvicorn, in a thread) and the client run
+in this process, so tracemalloc sees both. Per tick:
+
+  - the client "copies" something; its ClipboardMonitor thread picks it up
+    and sends it to the peer the usual way (PeerContext, spool, relay
+    pool), logging it to history
+  - the peer collects its mail from the relay and decrypts it
+  - one of --devices other devices uploads an opaque bundle to another,
+    and one fetches its mail (logging in to the relay first, see
+    server/auth.py); a share of these bundles is never fetched and has to
+    expire (short TTL, /cleanup every few seconds)
+  - now and then a device announces itself or sends a large bundle
+    through a resumable upload
+
+Every --interval seconds the process is garbage-collected and sampled
+(traced Python memory, RSS, relay counters). The first --warmup of the run
+lets caches, replay windows and pools fill up; a tracemalloc snapshot at
+its end is the baseline. The run fails if traced memory grew by more than
+--max-growth MiB or RSS by more than --max-rss-growth MiB since then, and
+lists the allocation sites that grew most.
+
+Run:
+    python -m benchmarks.soak [--duration 2h] [--rate 20] [--interval 60]
+                              [--warmup 0.25] [--max-growth 1] [--max-rss-growth 32]
+                              [--frames 1] [--top 10]
+Exits with status 1 if a leak was detected.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+import requests
+
+from client import history, pairing, replay_cache, server_api, spool
+from client.clipboard import ClipboardMonitor
+from crypto import peer_context
+from crypto.hybrid_encrypt import b64e, decrypt_bundle
+from crypto.signature import generate_signing_keys, relay_auth_message
+from server import auth, database, main as relay, uploads
+
+MiB = 1024 * 1024
+
+LOST_SHARE = 0.25  # device bundles that are never fetched
+LOST_TTL = 2  # seconds
+CLEANUP_EVERY = 5.0  # seconds between /cleanup calls
+ANNOUNCE_EVERY = 50  # ticks
+LARGE_EVERY = 100  # ticks
+LARGE_SIZE = 256 * 1024
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def parse_duration(value: str) -> float:
+    """
+    "90", "90s", "30m", "2h" -> seconds.
+    """
+    value = value.strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def rss_bytes() -> Optional[int]:
+    """
+    Current resident set size, or None where it can't be read.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # peak, not current, but still grows with a leak (KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def _patched(obj, **attrs):
+    saved = {name: getattr(obj, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(obj, name, value)
+
+
+@contextlib.contextmanager
+def _relay():
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(relay.app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+class _Clipboard:
+    """
+    Stands in for the Tk root; ClipboardMonitor only calls clipboard_get().
+    """
+
+    def __init__(self):
+        self.text = ""
+
+    def clipboard_get(self):
+        return self.text
+
+
+class HeadlessClient:
+    """
+    The client's send and receive paths without Tk. Sends are driven by a
+    real ClipboardMonitor thread; the peer's private key is held here so
+    its mail can be decrypted.
+    """
+
+    def __init__(self, my_id: str, peer_id: str, peer_keys, poll_sec: float):
+        self.my_id = my_id
+        self.peer_id = peer_id
+        self.peer_keys = peer_keys
+        self.my_keys = pairing.load_my_keys()
+        self.clipboard = _Clipboard()
+        self.monitor = ClipboardMonitor(self.clipboard, self.on_change, poll_sec=poll_sec)
+        self.sent = self.received = self.errors = 0
+
+    def copy(self, text: str):
+        self.clipboard.text = text
+
+    def on_change(self, text, content_type):
+        try:
+            bundle = peer_context.get(self.peer_id).encrypt(text, content_type)
+            spool.send_or_spool(bundle, self.peer_id)
+            history.save_to_history(text, content_type)
+            self.sent += 1
+        except Exception:
+            self.errors += 1
+
+    def receive(self):
+        try:
+            for bundle in server_api.fetch_all(self.peer_id):
+                plaintext = decrypt_bundle(bundle, self.peer_keys.x25519_private, self.my_keys.ed25519_public,
+                                           seen=replay_cache.default())
+                history.save_to_history(plaintext, bundle["metadata"].get("content_type", "text"))
+                self.received += 1
+        except Exception:
+            self.errors += 1
+
+
+class Devices:
+    """
+    Other devices using the same relay: opaque bundles between each other,
+    announcements and the odd large transfer.
+    """
+
+    def __init__(self, url: str, count: int, rng: random.Random):
+        self.url = url
+        self.ids = [f"device-{i:03d}" for i in range(count)]
+        self.rng = rng
+        self.http = requests.Session()
+        self.uploads = self.errors = 0
+        self._signing = {}
+        self._tokens = {}
+
+    def _bundle(self, sender: str, size: int, ttl: float) -> dict:
+        return {
+            "ciphertext": os.urandom(size).hex(),
+            "metadata": {"sender_id": sender, "nonce": os.urandom(16).hex(),
+                         "content_type": "text", "timestamp": time.time(), "ttl": ttl},
+        }
+
+    def _token(self, device_id: str) -> str:
+        token = self._tokens.get(device_id)
+        if token is None:
+            if device_id not in self._signing:
+                self._signing[device_id] = generate_signing_keys()
+            private, public = self._signing[device_id]
+            r = self.http.post(f"{self.url}/auth/{device_id}/challenge", timeout=10)
+            r.raise_for_status()
+            challenge = r.json()["challenge"]
+            r = self.http.post(f"{self.url}/auth/{device_id}/token", timeout=10, json={
+                "public_key": b64e(public.public_bytes_raw()),
+                "challenge": challenge,
+                "signature": b64e(private.sign(relay_auth_message(device_id, challenge))),
+            })
+            r.raise_for_status()
+            token = self._tokens[device_id] = r.json()["token"]
+        return token
+
+    def _fetch(self, device_id: str):
+        for _ in range(2):
+            r = self.http.get(f"{self.url}/fetch/{device_id}", timeout=10,
+                              headers={"Authorization": f"Bearer {self._token(device_id)}"})
+            if r.status_code != 401:
+                break
+            self._tokens.pop(device_id)  # expired: log in again
+        if r.status_code not in (200, 404, 410):
+            self.errors += 1
+
+    def _announce(self, device_id: str):
+        record = {"device_id": device_id, "addr": f"10.0.0.{self.rng.randint(1, 254)}:7000"}
+        for _ in range(2):
+            r = self.http.put(f"{self.url}/announce/{device_id}", timeout=10, json=record,
+                              headers={"Authorization": f"Bearer {self._token(device_id)}"})
+            if r.status_code != 401:
+                break
+            self._tokens.pop(device_id)  # expired: log in again
+        if r.status_code != 200:
+            self.errors += 1
+
+    def tick(self, n: int):
+        rng = self.rng
+        sender, recipient = rng.sample(self.ids, 2)
+        ttl = LOST_TTL if rng.random() < LOST_SHARE else 300
+        try:
+            if n % LARGE_EVERY == 0:
+                bundle = self._bundle(sender, LARGE_SIZE // 2, ttl)
+                body = json.dumps(bundle).encode()
+                server_api.send_resumable(body, recipient, server_api._relay_headers(bundle["metadata"]),
+                                          relay=self.url)
+            else:
+                bundle = self._bundle(sender, rng.randint(16, 2048), ttl)
+                self.http.post(f"{self.url}/upload/{recipient}", json=bundle, timeout=10).raise_for_status()
+            self.uploads += 1
+            # only "live" mail is collected; the rest waits for its TTL
+            reader = rng.choice(self.ids)
+            self._fetch(reader)
+            if n % ANNOUNCE_EVERY == 0:
+                self._announce(sender)
+        except requests.RequestException:
+            self.errors += 1
+
+
+def _content(rng: random.Random, n: int):
+    kind = rng.random()
+    if kind < 0.1:
+        return f"https://example.com/item/{n}"
+    if kind < 0.2:
+        return f"pw-{n}-{rng.getrandbits(32):x}!"
+    return f"note {n} " + "x" * rng.randint(0, 4096)
+
+
+class Sample:
+    __slots__ = ("t", "traced", "rss", "bundles", "uploads", "sent", "received")
+
+    def __init__(self, t, traced, rss, bundles, uploads, sent, received):
+        self.t, self.traced, self.rss = t, traced, rss
+        self.bundles, self.uploads, self.sent, self.received = bundles, uploads, sent, received
+
+
+class SoakReport:
+    def __init__(self, samples: List[Sample], baseline: Sample, final: Sample,
+                 top: list, max_growth: int, max_rss_growth: int, errors: int):
+        self.samples = samples
+        self.baseline = baseline
+        self.final = final
+        self.top = top
+        self.max_growth = max_growth
+        self.max_rss_growth = max_rss_growth
+        self.errors = errors
+
+    @property
+    def growth(self) -> int:
+        return self.final.traced - self.baseline.traced
+
+    @property
+    def rss_growth(self) -> Optional[int]:
+        if self.final.rss is None or self.baseline.rss is None:
+            return None
+        return self.final.rss - self.baseline.rss
+
+    @property
+    def slope(self) -> float:
+        """
+        Least-squares trend of traced memory after warm-up, bytes per hour.
+        """
+        points = [s for s in self.samples if s.t >= self.baseline.t]
+        if len(points) < 2:
+            return 0.0
+        mt = sum(s.t for s in points) / len(points)
+        mm = sum(s.traced for s in points) / len(points)
+        var = sum((s.t - mt) ** 2 for s in points)
+        if not var:
+            return 0.0
+        return sum((s.t - mt) * (s.traced - mm) for s in points) / var * 3600
+
+    @property
+    def failures(self) -> List[str]:
+        out = []
+        if self.growth > self.max_growth:
+            out.append(f"traced memory grew {self.growth / MiB:.2f} MiB "
+                       f"(limit {self.max_growth / MiB:.2f} MiB)")
+        rss = self.rss_growth
+        if rss is not None and rss > self.max_rss_growth:
+            out.append(f"RSS grew {rss / MiB:.2f} MiB (limit {self.max_rss_growth / MiB:.2f} MiB)")
+        return out
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def lines(self) -> List[str]:
+        b, f = self.baseline, self.final
+        rss = self.rss_growth
+        out = [
+            f"after warm-up ({b.t:.0f}s): traced {b.traced / MiB:.2f} MiB"
+            + (f", RSS {b.rss / MiB:.1f} MiB" if b.rss is not None else ""),
+            f"end ({f.t:.0f}s): traced {f.traced / MiB:.2f} MiB"
+            + (f", RSS {f.rss / MiB:.1f} MiB" if f.rss is not None else ""),
+            f"growth: traced {self.growth / 1024:+.1f} KiB"
+            + (f", RSS {rss / 1024:+.0f} KiB" if rss is not None else "")
+            + f", trend {self.slope / 1024:+.1f} KiB/h",
+            f"traffic: {f.sent} sent, {f.received} received, {f.uploads} device uploads, "
+            f"{self.errors} errors",
+            "top allocation sites since warm-up:",
+        ]
+        for stat in self.top:
+            frames = stat.traceback.format()
+            out.append(f"  {stat.size_diff / 1024:+9.1f} KiB {stat.count_diff:+7d} blocks  {frames[0].strip()}")
+            out.extend(f"  {'':>31}{line.strip()}" for line in frames[1:] if line.strip())
+        out.append("OK" if self.ok else "LEAK: " + "; ".join(self.failures))
+        return out
+
+
+def run(duration: float, rate: float = 20, interval: float = 60, warmup: float = 0.25,
+        devices: int = 50, max_growth: float = 1, max_rss_growth: float = 32,
+        frames: int = 1, top: int = 10, seed: int = 1,
+        log: Optional[Callable[[str], None]] = None) -> SoakReport:
+    """
+    Soak the relay and a headless client for `duration` seconds (see the
+    module docstring). max_growth / max_rss_growth are in MiB.
+    """
+    rng = random.Random(seed)
+    tmp = tempfile.mkdtemp(prefix="sccse-soak-")
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(frames)
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(_patched(pairing, DATA_DIR=tmp, KEYS_DB=os.path.join(tmp, "keys.db"),
+                                     _local=type(pairing._local)()))
+        stack.enter_context(_patched(history, DATA_DIR=tmp, HISTORY_FILE=os.path.join(tmp, "history.enc"),
+                                     HISTORY_KEY_FILE=os.path.join(tmp, "history_key.bin")))
+        stack.enter_context(_patched(auth, DB_PATH=os.path.join(tmp, "auth.db")))
+        url = stack.enter_context(_relay())
+        stack.enter_context(_patched(server_api, SERVER_URL=url))
+        relays_env = os.environ.pop("SCCSE_RELAYS", None)
+        if relays_env is not None:
+            stack.callback(os.environ.__setitem__, "SCCSE_RELAYS", relays_env)
+        peer_context.clear()
+        stack.callback(peer_context.clear)
+
+        me, peer = pairing.generate_keys(), pairing.generate_keys()
+        pairing.save_my_keys("soak-client", me)
+        pairing.save_peer("soak-peer", peer.x25519_public.public_bytes_raw(),
+                          peer.ed25519_public.public_bytes_raw())
+        pairing.aead_speeds()
+        spool.start_flusher()
+
+        tick = 1.0 / rate
+        client = HeadlessClient("soak-client", "soak-peer", peer, poll_sec=tick / 2)
+        others = Devices(url, devices, rng)
+        client.monitor.start()
+        stack.callback(client.monitor.stop)
+
+        samples: List[Sample] = []
+        baseline = snapshot = None
+        t0 = time.monotonic()
+        next_tick = next_sample = t0
+        last_cleanup = t0
+        n = 0
+
+        def sample(now):
+            gc.collect()
+            s = Sample(now - t0, tracemalloc.get_traced_memory()[0], rss_bytes(),
+                       database.count() + uploads.count(), others.uploads, client.sent, client.received)
+            samples.append(s)
+            if log:
+                log(f"{s.t:7.0f}s  traced {s.traced / MiB:7.2f} MiB  "
+                    + (f"RSS {s.rss / MiB:7.1f} MiB  " if s.rss is not None else "")
+                    + f"stored {s.bundles:4d}  sent {s.sent:6d}  received {s.received:6d}")
+            return s
+
+        while True:
+            now = time.monotonic()
+            if now - t0 >= duration:
+                break
+            if now >= next_sample:
+                s = sample(now)
+                if snapshot is None and s.t >= warmup * duration:
+                    baseline, snapshot = s, tracemalloc.take_snapshot()
+                    if log:
+                        log("warm-up done, baseline snapshot taken")
+                next_sample += interval
+            if now - last_cleanup >= CLEANUP_EVERY:
+                requests.post(f"{url}/cleanup", timeout=10)
+                last_cleanup = now
+
+            n += 1
+            client.copy(_content(rng, n))
+            others.tick(n)
+            client.receive()
+
+            next_tick = max(next_tick + tick, time.monotonic())
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+        client.monitor.stop()
+        time.sleep(tick)
+        client.receive()
+        final = sample(time.monotonic())
+        if snapshot is None:
+            baseline, snapshot = samples[0], tracemalloc.take_snapshot()
+        key = "traceback" if frames > 1 else "lineno"
+        diff = tracemalloc.take_snapshot().filter_traces(_IGNORED).compare_to(
+            snapshot.filter_traces(_IGNORED), key)
+        grown = [d for d in diff if d.size_diff > 0][:top]
+
+    if started_tracing:
+        tracemalloc.stop()
+    return SoakReport(samples, baseline, final, grown, int(max_growth * MiB),
+                      int(max_rss_growth * MiB), client.errors + others.errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--duration", default="2h", help="e.g. 600, 30m, 8h")
+    parser.add_argument("--rate", type=float, default=20, help="ticks per second")
+    parser.add_argument("--interval", default="60", help="seconds between samples")
+    parser.add_argument("--warmup", type=float, default=0.25, help="share of the run used to warm up")
+    parser.add_argument("--devices", type=int, default=50, help="other devices on the relay")
+    parser.add_argument("--max-growth", type=float, default=1, help="MiB of traced memory")
+    parser.add_argument("--max-rss-growth", type=float, default=32, help="MiB of RSS")
+    parser.add_argument("--frames", type=int, default=1, help="traceback depth of allocation sites")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    report = run(parse_duration(args.duration), rate=args.rate, interval=parse_duration(args.interval),
+                 warmup=args.warmup, devices=args.devices, max_growth=args.max_growth,
+                 max_rss_growth=args.max_rss_growth, frames=args.frames, top=args.top,
+                 seed=args.seed, log=print)
+    print("\n".join(report.lines()))
+    sys.exit(0 if report.ok else 1)
+
+
+if __name__ == "__main__":
+    main()
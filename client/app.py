@@ -1,6 +1,7 @@
 import tkinter as tk
 from client.ui import ClientUI
 from client.clipboard import ClipboardMonitor
+from client import server_api, spool
 
 
 def main():
@@ -9,11 +10,18 @@ def main():
 
     monitor = ClipboardMonitor(
         tk_root=root,
-        on_change=ui.update_clipboard_display,
+        on_change=ui.on_clipboard_change,
         poll_sec=0.7
     )
     monitor.start()
 
+    # drain bundles queued while the relay was unreachable
+    spool.start_flusher()
+
+    # keep relay scores fresh when several relays are configured
+    if len(server_api.pool().urls) > 1:
+        server_api.pool().start_prober()
+
     root.mainloop()
 
 
@@ -0,0 +1,138 @@
+import os
+import json
+import hashlib
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+# Auto-send sits between ClipboardMonitor.on_change and the send path.
+#
+# Copies are collected until the clipboard has been quiet for DEBOUNCE
+# seconds (or MAX_WAIT seconds have passed since the first copy of the
+# burst), then the burst is sent according to POLICY:
+#   "last"   only the final value is sent
+#   "batch"  all values go out together as one "multi" bundle
+# Either way a burst costs one encryption and one upload. Passwords are
+# never packed with other items; they are always sent on their own.
+DEBOUNCE = float(os.environ.get("SCCSE_AUTOSEND_DEBOUNCE", "0.8"))  # seconds
+MAX_WAIT = 5.0  # seconds, upper bound on how long a burst is held back
+MAX_ITEMS = 20  # "batch": a burst is flushed once it has this many items
+POLICY = os.environ.get("SCCSE_AUTOSEND_POLICY", "last").lower()
+
+POLICIES = ("last", "batch")
+MULTI = "multi"  # content type of a packed burst
+
+Item = Tuple[str, str]  # (content, content_type)
+
+
+def pack(items: List[Item]) -> str:
+    return json.dumps({"items": [{"type": t, "content": c} for c, t in items]})
+
+
+def unpack(payload: str) -> List[Item]:
+    """
+    Items of a "multi" bundle, oldest first.
+    """
+    items = json.loads(payload)["items"]
+    return [(i["content"], i["type"]) for i in items if i.get("type") != "password"]
+
+
+def coalesce(items: List[Item], policy: str = None) -> List[Item]:
+    """
+    What to actually send for a burst of copies.
+
+    The relay delivers a recipient's bundles in upload order and the peer
+    sets its clipboard from each, so the bundle holding the burst's last
+    copy goes last.
+    """
+    policy = policy or POLICY
+    if not items:
+        return []
+    if policy == "last":
+        return [items[-1]]
+
+    # 🔒 passwords travel alone (own bundle, own short TTL)
+    passwords = [i for i in items if i[1] == "password"]
+    others = [i for i in items if i[1] != "password"]
+    out = [] if not others else [others[0]] if len(others) == 1 else [(pack(others), MULTI)]
+    return out + passwords if items[-1][1] == "password" else passwords + out
+
+
+def _fingerprint(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class AutoSender:
+    """
+    Debounces clipboard changes and hands each coalesced burst to `send`.
+
+    push() is cheap and can be called from any thread. `send(items)` is
+    called on a timer thread with the output of coalesce().
+    """
+
+    def __init__(self, send: Callable[[List[Item]], None],
+                 debounce: float = DEBOUNCE, policy: str = None,
+                 max_wait: float = MAX_WAIT, max_items: int = MAX_ITEMS):
+        policy = policy or POLICY
+        if policy not in POLICIES:
+            raise ValueError(f"autosend policy must be one of {', '.join(POLICIES)}")
+        self.send = send
+        self.debounce = debounce
+        self.policy = policy
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self.enabled = True
+
+        self._lock = threading.Lock()
+        self._pending: List[Item] = []
+        self._burst_start = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._ignore: Optional[bytes] = None
+
+    def ignore(self, text: str):
+        """
+        Don't auto-send `text` when it shows up on the clipboard (used for
+        content we just received, so it isn't echoed back).
+        """
+        self._ignore = _fingerprint(text)
+
+    def push(self, text: str, content_type: str):
+        if not self.enabled or not text:
+            return
+        if self._ignore is not None and _fingerprint(text) == self._ignore:
+            self._ignore = None
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if not self._pending:
+                self._burst_start = now
+            self._pending.append((text, content_type))
+            if self.policy == "last":
+                del self._pending[:-1]
+
+            if self._timer is not None:
+                self._timer.cancel()
+            overdue = now - self._burst_start >= self.max_wait
+            if overdue or len(self._pending) >= self.max_items:
+                delay = 0.0
+            else:
+                delay = min(self.debounce, self._burst_start + self.max_wait - now)
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            items, self._pending = self._pending, []
+            self._timer = None
+        out = coalesce(items, self.policy)
+        if out:
+            self.send(out)
+
+    def stop(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            self._pending = []
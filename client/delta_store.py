@@ -0,0 +1,117 @@
+import os
+import hashlib
+from typing import Optional, Tuple
+
+from client import pairing
+
+# Delta mode is opt-in per peer. For each such peer we keep the last content
+# sent to it and the last content received from it, encrypted at rest, so
+# the next transfer can be a delta against it (see crypto/delta.py). The
+# content type is kept with it, so a full re-send keeps the original type.
+SENT = "sent"
+RECEIVED = "recv"
+
+
+def _dir() -> str:
+    d = os.path.join(pairing.DATA_DIR, "delta")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def _peer_tag(peer_id: str) -> str:
+    # peer ids go into file names, so hash them
+    return hashlib.sha256(peer_id.encode("utf-8")).hexdigest()[:32]
+
+
+def _aead():
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    return AESGCM(_key())
+
+
+def _key() -> bytes:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    path = os.path.join(_dir(), "delta_key.bin")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    key = AESGCM.generate_key(bit_length=256)
+    with open(path, "wb") as f:
+        f.write(key)
+    return key
+
+
+def _ref_path(peer_id: str, direction: str) -> str:
+    return os.path.join(_dir(), f"{direction}_{_peer_tag(peer_id)}.enc")
+
+
+def _atomic_write(path: str, blob: bytes):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+    os.replace(tmp, path)
+
+
+# ============================
+# OPT-IN
+# ============================
+def is_enabled(peer_id: str) -> bool:
+    return os.path.exists(os.path.join(_dir(), f"on_{_peer_tag(peer_id)}"))
+
+
+def set_enabled(peer_id: str, on: bool = True):
+    marker = os.path.join(_dir(), f"on_{_peer_tag(peer_id)}")
+    if on:
+        open(marker, "wb").close()
+    else:
+        if os.path.exists(marker):
+            os.remove(marker)
+        drop_reference(peer_id, SENT)
+        drop_reference(peer_id, RECEIVED)
+
+
+# ============================
+# REFERENCES
+# ============================
+def _aad(peer_id: str, direction: str) -> bytes:
+    # bind the blob to its peer and direction so files can't be swapped;
+    # "v2" blobs carry the content type, older ones don't decrypt and count
+    # as missing (the next transfer is a full one)
+    return f"v2:{direction}:{peer_id}".encode("utf-8")
+
+
+def save_reference(peer_id: str, direction: str, content: bytes, content_type: str = "text"):
+    nonce = os.urandom(12)
+    plaintext = content_type.encode("utf-8") + b"\n" + content
+    blob = nonce + _aead().encrypt(nonce, plaintext, _aad(peer_id, direction))
+    _atomic_write(_ref_path(peer_id, direction), blob)
+
+
+def load_reference_with_type(peer_id: str, direction: str) -> Optional[Tuple[bytes, str]]:
+    """
+    (content, content_type) of the reference, or None.
+    """
+    path = _ref_path(peer_id, direction)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        blob = f.read()
+    try:
+        plaintext = _aead().decrypt(blob[:12], blob[12:], _aad(peer_id, direction))
+    except Exception:
+        # unreadable reference: behave as if there is none (full transfer)
+        return None
+    content_type, _, content = plaintext.partition(b"\n")
+    return content, content_type.decode("utf-8")
+
+
+def load_reference(peer_id: str, direction: str) -> Optional[bytes]:
+    entry = load_reference_with_type(peer_id, direction)
+    return entry[0] if entry is not None else None
+
+
+def drop_reference(peer_id: str, direction: str):
+    path = _ref_path(peer_id, direction)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import socket
+import struct
+import hashlib
+import tempfile
+import threading
+import socketserver
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from client import pairing, server_api
+
+# Optional direct path between paired devices on the same host or LAN.
+#
+# A device with SCCSE_DIRECT=1 listens on a TCP port and advertises its
+# address in a signed announcement ({id, host, port, ts} + Ed25519
+# signature). The announcement goes into a discovery directory shared by
+# all profiles on this host, and to the relay (PUT /announce/{id}) for
+# peers on other hosts. Senders verify it with the peer's pinned signing
+# key, push the already-encrypted bundle straight to that address, and fall
+# back to the relay if anything fails.
+#
+# Wire format, one bundle per frame:
+#   sender -> receiver   4-byte big-endian length, JSON bundle
+#   receiver -> sender   1 byte: ACK or NACK
+ACK = b"\x01"
+NACK = b"\x00"
+MAX_FRAME = 64 * 1024 * 1024
+CONNECT_TIMEOUT = 0.3  # seconds; a dead address must not delay the fallback
+IO_TIMEOUT = 5.0
+ANNOUNCE_TTL = 900  # seconds an announcement is trusted
+ANNOUNCE_INTERVAL = 300  # seconds between re-announcements
+FAILURE_BACKOFF = 30  # seconds a peer's direct path is skipped after a failure
+MAX_SEEN = 4096  # (sender, nonce) pairs remembered against replays
+
+Address = Tuple[str, int]
+
+
+def enabled() -> bool:
+    return os.environ.get("SCCSE_DIRECT", "") == "1"
+
+
+def _discovery_dir() -> str:
+    d = os.environ.get("SCCSE_DISCOVERY_DIR") or os.path.join(tempfile.gettempdir(), "sccse-discovery")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def _discovery_path(device_id: str, directory: Optional[str] = None) -> str:
+    tag = hashlib.sha256(device_id.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(directory or _discovery_dir(), f"{tag}.json")
+
+
+# ============================
+# FRAMING
+# ============================
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if not k:
+            raise ConnectionError("connection closed mid-frame")
+        got += k
+    return bytes(buf)
+
+
+def push(address: Address, bundle: dict, timeout: float = IO_TIMEOUT) -> bool:
+    """
+    Send one bundle to a listening peer. True if the peer accepted it.
+    """
+    body = json.dumps(bundle).encode("utf-8")
+    try:
+        with socket.create_connection(address, timeout=CONNECT_TIMEOUT) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(timeout)
+            sock.sendall(struct.pack(">I", len(body)) + body)
+            return sock.recv(1) == ACK
+    except OSError:
+        return False
+
+
+# ============================
+# ANNOUNCEMENTS
+# ============================
+def make_announcement(device_id: str, address: Address, signing_private) -> dict:
+    from crypto.signature import sign_metadata
+    from crypto.hybrid_encrypt import b64e
+
+    record = {"id": device_id, "host": address[0], "port": address[1], "ts": time.time()}
+    return dict(record, sig=b64e(sign_metadata(record, signing_private)))
+
+
+def verify_announcement(record: dict, device_id: str, signing_public) -> Optional[Address]:
+    """
+    The address in `record` if it is a fresh announcement signed by
+    `device_id`'s key, else None.
+    """
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    from crypto.signature import verify_metadata
+    from crypto.hybrid_encrypt import b64d
+
+    try:
+        body = {k: record[k] for k in ("id", "host", "port", "ts")}
+        if body["id"] != device_id or time.time() - float(body["ts"]) > ANNOUNCE_TTL:
+            return None
+        if not isinstance(signing_public, Ed25519PublicKey):
+            signing_public = Ed25519PublicKey.from_public_bytes(signing_public)
+        verify_metadata(body, b64d(record["sig"]), signing_public)
+        return str(body["host"]), int(body["port"])
+    except Exception:
+        return None
+
+
+def publish(record: dict, directory: Optional[str] = None):
+    path = _discovery_path(record["id"], directory)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    os.replace(tmp, path)
+
+
+def unpublish(device_id: str, directory: Optional[str] = None):
+    try:
+        os.remove(_discovery_path(device_id, directory))
+    except FileNotFoundError:
+        pass
+
+
+def lookup(device_id: str, directory: Optional[str] = None) -> Optional[dict]:
+    try:
+        with open(_discovery_path(device_id, directory), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# ============================
+# RECEIVER
+# ============================
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        sock.settimeout(IO_TIMEOUT)
+        try:
+            (size,) = struct.unpack(">I", _recv_exact(sock, 4))
+            if size > MAX_FRAME:
+                sock.sendall(NACK)
+                return
+            bundle = json.loads(_recv_exact(sock, size))
+            ok = self.server.listener._accept(bundle)
+            sock.sendall(ACK if ok else NACK)
+        except (OSError, ValueError):
+            pass
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class DirectListener:
+    """
+    Accepts bundles pushed by peers and hands them to `on_bundle`.
+
+    Only bundles from senders that pass `accept_sender` (by default: paired
+    peers) are taken, and each (sender, nonce) only once. Bundles are still
+    fully verified when decrypted; this just keeps junk out of the inbox.
+    """
+
+    def __init__(self, on_bundle: Callable[[dict], None], host: str = "127.0.0.1",
+                 port: int = 0, accept_sender: Optional[Callable[[str], bool]] = None):
+        self.on_bundle = on_bundle
+        self.accept_sender = accept_sender or (lambda sid: pairing.load_peer(sid) is not None)
+        self._seen: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.listener = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Address:
+        return self._server.server_address[:2]
+
+    def _accept(self, bundle) -> bool:
+        meta = bundle.get("metadata") if isinstance(bundle, dict) else None
+        if not isinstance(meta, dict):
+            return False
+        key = (str(meta.get("sender_id")), str(meta.get("nonce")))
+        if not self.accept_sender(key[0]):
+            return False
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen[key] = None
+            if len(self._seen) > MAX_SEEN:
+                self._seen.popitem(last=False)
+        self.on_bundle(bundle)
+        return True
+
+    def start(self) -> "DirectListener":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _advertised_host(bound_host: str) -> str:
+    override = os.environ.get("SCCSE_DIRECT_ADVERTISE")
+    if override:
+        return override
+    if bound_host not in ("0.0.0.0", ""):
+        return bound_host
+    # the local address used to reach the relay is the one peers can reach
+    relay_host = server_api.pool().ranked()[0].split("://", 1)[-1].split("/", 1)[0].rsplit(":", 1)[0]
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            s.connect((relay_host, 9))
+            return s.getsockname()[0]
+        except OSError:
+            return "127.0.0.1"
+
+
+class Announcer:
+    """
+    Keeps this device's announcement published (discovery file + relay).
+    """
+
+    def __init__(self, device_id: str, address: Address, signing_private):
+        self.device_id = device_id
+        self.address = address
+        self.signing_private = signing_private
+        self._stop = threading.Event()
+
+    def announce_once(self):
+        record = make_announcement(self.device_id, self.address, self.signing_private)
+        publish(record)
+        try:
+            server_api.announce(self.device_id, record)
+        except Exception:
+            pass  # relay down: same-host peers still find the discovery file
+
+    def start(self) -> "Announcer":
+        def loop():
+            while not self._stop.is_set():
+                self.announce_once()
+                self._stop.wait(ANNOUNCE_INTERVAL)
+        threading.Thread(target=loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        unpublish(self.device_id)
+
+
+def start(my_id: str, on_bundle: Callable[[dict], None]) -> Tuple[DirectListener, Announcer]:
+    """
+    Listen for direct pushes and advertise the address.
+    """
+    host = os.environ.get("SCCSE_DIRECT_HOST", "127.0.0.1")
+    port = int(os.environ.get("SCCSE_DIRECT_PORT", "0"))
+    listener = DirectListener(on_bundle, host, port).start()
+    address = (_advertised_host(host), listener.address[1])
+    keys = pairing.load_my_keys()
+    return listener, Announcer(my_id, address, keys.ed25519_private).start()
+
+
+# ============================
+# SENDER
+# ============================
+_failed: Dict[str, float] = {}  # peer_id -> time of the last failed push
+
+
+def resolve(peer_id: str) -> Optional[Address]:
+    """
+    The peer's verified direct address, from the discovery file or the relay.
+    """
+    peer = pairing.load_peer(peer_id)
+    if peer is None:
+        return None
+    for fetch in (lookup, server_api.lookup_announcement):
+        try:
+            record = fetch(peer_id)
+        except Exception:
+            record = None
+        if record:
+            address = verify_announcement(record, peer_id, peer["ed25519_public"])
+            if address is not None:
+                return address
+    return None
+
+
+def send(bundle: dict, peer_id: str) -> bool:
+    """
+    Try to deliver straight to the peer. False means: use the relay.
+    """
+    if time.monotonic() - _failed.get(peer_id, -FAILURE_BACKOFF) < FAILURE_BACKOFF:
+        return False
+    address = resolve(peer_id)
+    if address is not None and push(address, bundle):
+        _failed.pop(peer_id, None)
+        return True
+    _failed[peer_id] = time.monotonic()
+    return False
@@ -1,12 +1,20 @@
 import os
 import json
 import base64
-from typing import List, Dict
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import hashlib
+import threading
+import time
+from typing import List, Dict, Optional
+
+from client import tracing
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 HISTORY_FILE = os.path.join(DATA_DIR, "history.enc")
 HISTORY_KEY_FILE = os.path.join(DATA_DIR, "history_key.bin")
+MAX_ITEMS = 50
+
+# sends and receives run on different threads; both rewrite the file
+_lock = threading.RLock()
 
 
 def _ensure_dir():
@@ -14,6 +22,8 @@ def _ensure_dir():
 
 
 def _get_history_key() -> bytes:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
     _ensure_dir()
     if os.path.exists(HISTORY_KEY_FILE):
         with open(HISTORY_KEY_FILE, "rb") as f:
@@ -25,6 +35,8 @@ def _get_history_key() -> bytes:
 
 
 def _encrypt_json(obj: dict) -> bytes:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
     key = _get_history_key()
     aes = AESGCM(key)
     nonce = os.urandom(12)
@@ -34,6 +46,8 @@ def _encrypt_json(obj: dict) -> bytes:
 
 
 def _decrypt_json(blob: bytes) -> dict:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
     key = _get_history_key()
     aes = AESGCM(key)
     nonce = blob[:12]
@@ -45,21 +59,68 @@ def _decrypt_json(blob: bytes) -> dict:
 def load_history() -> List[Dict]:
     if not os.path.exists(HISTORY_FILE):
         return []
-    with open(HISTORY_FILE, "rb") as f:
-        blob = f.read()
-    data = _decrypt_json(blob)
+    with tracing.span("history.load"):
+        with open(HISTORY_FILE, "rb") as f:
+            blob = f.read()
+        data = _decrypt_json(blob)
     return data.get("items", [])
 
 
-def save_to_history(content: str, content_type: str):
+def entry_id(item: Dict) -> str:
+    """
+    Stable id of a history entry (used by history sync).
+
+    New entries carry a random id; older ones get one derived from their
+    content, so every device computes the same id for them.
+    """
+    if "id" in item:
+        return item["id"]
+    h = hashlib.sha256(f"{item['type']}\0{item['content']}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _save_items(items: List[Dict]):
+    _ensure_dir()
+    with tracing.span("history.save"):
+        blob = _encrypt_json({"items": items[:MAX_ITEMS]})   #last 50 only 
+        # readers never see a half-written file
+        tmp = HISTORY_FILE + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, HISTORY_FILE)
+
+
+def save_to_history(content: str, content_type: str) -> Optional[Dict]:
+    """
+    Prepend an entry and return it (None if nothing was saved), so the UI
+    can add it to the view without reloading the whole history.
+    """
     # we dont save the password 
     if content_type.lower() == "password":
-        return
+        return None
+
+    item = {"id": os.urandom(8).hex(), "ts": time.time(), "type": content_type, "content": content}
+    with _lock:
+        items = load_history()
+        items.insert(0, item)
+        _save_items(items)
+    return item
+
 
-    items = load_history()
-    items.insert(0, {"type": content_type, "content": content})
-    items = items[:50]   #last 50 only 
+def merge_entries(entries: List[Dict]) -> List[Dict]:
+    """
+    Add entries from another device that aren't here yet, keeping the
+    history newest first. Returns the entries that were added.
+    """
+    with _lock:
+        items = load_history()
+        known = {entry_id(i) for i in items}
+        added = [e for e in entries if entry_id(e) not in known]
+        if not added:
+            return []
 
-    blob = _encrypt_json({"items": items})
-    with open(HISTORY_FILE, "wb") as f:
-        f.write(blob)
+        items.extend(added)
+        items.sort(key=lambda i: i.get("ts", 0), reverse=True)
+        kept = {entry_id(i) for i in items[:MAX_ITEMS]}
+        _save_items(items)
+    return [e for e in added if entry_id(e) in kept]
@@ -0,0 +1,139 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+from client import pairing
+from client.history import entry_id
+
+# History sync between a user's own devices.
+#
+# Messages travel as "control" bundles over the relay, so they are end-to-end
+# encrypted and signed like everything else. Entry ids are spread over
+# BUCKETS buckets; each bucket has a digest of its sorted ids and the root is
+# a digest of the bucket digests (a two-level Merkle tree). The exchange is:
+#
+#   A -> B  sync-summary  root + bucket digests        (fixed size)
+#   B -> A  sync-diff     B's ids in buckets that differ
+#   A -> B  sync-entries  entries B lacks + ids A wants
+#   B -> A  sync-entries  the entries A asked for
+#
+# Equal roots end it after the first message. Otherwise only the ids of the
+# differing buckets and the missing entries are sent, so the cost follows
+# the size of the difference, not of the history.
+BUCKETS = 16
+DIGEST_CHARS = 16
+
+SUMMARY = "sync-summary"
+DIFF = "sync-diff"
+ENTRIES = "sync-entries"
+MESSAGE_TYPES = (SUMMARY, DIFF, ENTRIES)
+
+
+def _bucket(eid: str) -> int:
+    return hashlib.sha256(eid.encode("utf-8")).digest()[0] % BUCKETS
+
+
+def _digest(parts: List[str]) -> str:
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:DIGEST_CHARS]
+
+
+def _by_bucket(items: List[Dict]) -> Tuple[List[List[str]], Dict[str, Dict]]:
+    buckets: List[List[str]] = [[] for _ in range(BUCKETS)]
+    by_id = {}
+    for item in items:
+        eid = entry_id(item)
+        by_id[eid] = item
+        buckets[_bucket(eid)].append(eid)
+    for b in buckets:
+        b.sort()
+    return buckets, by_id
+
+
+def summary(items: List[Dict]) -> Dict:
+    """
+    First message of a sync: root and per-bucket digests of `items`.
+    """
+    buckets, _ = _by_bucket(items)
+    digests = [_digest(b) for b in buckets]
+    return {"type": SUMMARY, "root": _digest(digests), "buckets": digests}
+
+
+def _valid_entry(e) -> bool:
+    # 🔒 passwords are never part of history, so never accept them either
+    return (
+        isinstance(e, dict)
+        and isinstance(e.get("content"), str)
+        and isinstance(e.get("type"), str)
+        and e["type"].lower() != "password"
+        and isinstance(e.get("ts", 0), (int, float))
+    )
+
+
+def handle(message: Dict, items: List[Dict]) -> Tuple[Optional[Dict], List[Dict]]:
+    """
+    Process one sync message against the local history `items`.
+
+    Returns (reply, entries): the message to send back (None when the sync
+    is finished) and the entries to merge into the local history.
+    """
+    buckets, by_id = _by_bucket(items)
+    kind = message.get("type")
+
+    if kind == SUMMARY:
+        theirs = message.get("buckets") or []
+        mine = [_digest(b) for b in buckets]
+        if message.get("root") == _digest(mine) or len(theirs) != BUCKETS:
+            return None, []
+        differ = [i for i in range(BUCKETS) if theirs[i] != mine[i]]
+        return {"type": DIFF, "ids": {str(i): buckets[i] for i in differ}}, []
+
+    if kind == DIFF:
+        theirs = {int(i): set(ids) for i, ids in (message.get("ids") or {}).items()}
+        give, want = [], []
+        for i, their_ids in theirs.items():
+            if not 0 <= i < BUCKETS:
+                continue
+            mine = set(buckets[i])
+            give.extend(by_id[eid] for eid in sorted(mine - their_ids))
+            want.extend(sorted(their_ids - mine))
+        if not give and not want:
+            return None, []
+        return {"type": ENTRIES, "entries": give, "want": want}, []
+
+    if kind == ENTRIES:
+        entries = [e for e in message.get("entries") or [] if _valid_entry(e)]
+        give = [by_id[eid] for eid in message.get("want") or [] if eid in by_id]
+        reply = {"type": ENTRIES, "entries": give, "want": []} if give else None
+        return reply, entries
+
+    return None, []
+
+
+# ============================
+# OWN DEVICES
+# ============================
+def _devices_file() -> str:
+    return os.path.join(pairing.DATA_DIR, "sync_devices.json")
+
+
+def own_devices() -> List[str]:
+    """
+    Peers marked as this user's own devices (the only ones synced with).
+    """
+    try:
+        with open(_devices_file(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def set_own_device(peer_id: str, on: bool = True):
+    devices = [d for d in own_devices() if d != peer_id]
+    if on:
+        devices.append(peer_id)
+    os.makedirs(pairing.DATA_DIR, exist_ok=True)
+    tmp = _devices_file() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(devices, f)
+    os.replace(tmp, _devices_file())
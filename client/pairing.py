@@ -1,21 +1,54 @@
+from __future__ import annotations
+
 import os
 import json
 import base64
+import sqlite3
+import threading
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
 
-from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
-from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
-from cryptography.hazmat.primitives import serialization
+# cryptography is imported inside the functions that need it, so that
+# get_my_id()/list_peers() stay cheap during client startup.
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
 
 # DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 
 DEVICE_PROFILE = os.environ.get("SCCSE_DEVICE", "A")
 DATA_DIR = os.path.join(os.path.dirname(__file__), f"data_device_{DEVICE_PROFILE}") # For testing on same device
 
-KEYS_FILE = os.path.join(DATA_DIR, "keys.json")
-
-
+# Identity and peers live in SQLite: every write is an atomic transaction,
+# and peers are looked up by primary key instead of re-reading one big file.
+# A legacy keys.json next to it is migrated on first use.
+KEYS_DB = os.path.join(DATA_DIR, "keys.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS me (
+    id              INTEGER PRIMARY KEY CHECK (id = 1),
+    my_id           TEXT NOT NULL,
+    x25519_private  BLOB NOT NULL,
+    x25519_public   BLOB NOT NULL,
+    ed25519_private BLOB NOT NULL,
+    ed25519_public  BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS peers (
+    peer_id         TEXT PRIMARY KEY,
+    x25519_public   BLOB NOT NULL,
+    ed25519_public  BLOB NOT NULL,
+    aead            TEXT            -- advertised cipher speeds (JSON), NULL for older peers
+);
+"""
+
+# Columns added after the first release: (table, column, type).
+_COLUMNS = [
+    ("peers", "aead", "TEXT"),
+]
+
+_PEER_COLUMNS = "peer_id, x25519_public, ed25519_public, aead"
+
+_local = threading.local()
 
 def _b64e(b: bytes) -> str:
     return base64.b64encode(b).decode("utf-8")
@@ -29,6 +62,76 @@ def _ensure_dir():
     os.makedirs(DATA_DIR, exist_ok=True)
 
 
+def _db() -> sqlite3.Connection:
+    """
+    Per-thread connection to the key store (opened and migrated on first use).
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(KEYS_DB)
+    if conn is None:
+        os.makedirs(os.path.dirname(KEYS_DB), exist_ok=True)
+        conn = sqlite3.connect(KEYS_DB, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _migrate_schema(conn)
+        _migrate_json(conn)
+        conns[KEYS_DB] = conn
+    return conn
+
+
+def _migrate_schema(conn: sqlite3.Connection):
+    """
+    Add columns missing from a database created by an older version.
+    """
+    for table, column, kind in _COLUMNS:
+        have = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in have:
+            with conn:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+
+
+def _migrate_json(conn: sqlite3.Connection):
+    """
+    One-time import of a legacy keys.json into the database.
+
+    Runs in one BEGIN IMMEDIATE transaction, so threads and processes that
+    open the store at the same time migrate one after the other. Whoever
+    comes second finds the rows (or no file) and does nothing.
+    """
+    legacy = os.path.join(os.path.dirname(KEYS_DB), "keys.json")
+    if not os.path.exists(legacy):
+        return
+
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("SELECT 1 FROM me").fetchone() or conn.execute("SELECT 1 FROM peers LIMIT 1").fetchone():
+            return
+        try:
+            with open(legacy, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return  # migrated (and renamed) meanwhile
+
+        me = data.get("me")
+        if me:
+            conn.execute(
+                "INSERT OR REPLACE INTO me VALUES (1, ?, ?, ?, ?, ?)",
+                (me["my_id"], _b64d(me["x25519_private"]), _b64d(me["x25519_public"]),
+                 _b64d(me["ed25519_private"]), _b64d(me["ed25519_public"])),
+            )
+        conn.executemany(
+            f"INSERT OR REPLACE INTO peers ({_PEER_COLUMNS}) VALUES (?, ?, ?, NULL)",
+            [(pid, _b64d(p["x25519_public"]), _b64d(p["ed25519_public"]))
+             for pid, p in (data.get("peers") or {}).items()],
+        )
+    try:
+        os.replace(legacy, legacy + ".migrated")
+    except FileNotFoundError:
+        pass
+
+
 @dataclass
 class MyKeys:
     x25519_private: X25519PrivateKey
@@ -38,6 +141,9 @@ class MyKeys:
 
 
 def generate_keys() -> MyKeys:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
     x_priv = X25519PrivateKey.generate()
     x_pub = x_priv.public_key()
 
@@ -48,8 +154,9 @@ def generate_keys() -> MyKeys:
 
 
 def save_my_keys(my_id: str, keys: MyKeys):
+    from cryptography.hazmat.primitives import serialization
+
     _ensure_dir()
-    data = load_all()
 
     x_priv_raw = keys.x25519_private.private_bytes(
         encoding=serialization.Encoding.Raw,
@@ -71,76 +178,118 @@ def save_my_keys(my_id: str, keys: MyKeys):
         format=serialization.PublicFormat.Raw
     )
 
-    data["me"] = {
-        "my_id": my_id,
-        "x25519_private": _b64e(x_priv_raw),
-        "x25519_public": _b64e(x_pub_raw),
-        "ed25519_private": _b64e(e_priv_raw),
-        "ed25519_public": _b64e(e_pub_raw),
-    }
-    _write(data)
+    conn = _db()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO me VALUES (1, ?, ?, ?, ?, ?)",
+            (my_id, x_priv_raw, x_pub_raw, e_priv_raw, e_pub_raw),
+        )
 
 
 def load_my_keys() -> Optional[MyKeys]:
-    data = load_all()
-    me = data.get("me")
+    me = _db().execute(
+        "SELECT x25519_private, x25519_public, ed25519_private, ed25519_public FROM me"
+    ).fetchone()
     if not me:
         return None
 
-    x_priv = X25519PrivateKey.from_private_bytes(_b64d(me["x25519_private"]))
-    x_pub = X25519PublicKey.from_public_bytes(_b64d(me["x25519_public"]))
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+
+    x_priv = X25519PrivateKey.from_private_bytes(me[0])
+    x_pub = X25519PublicKey.from_public_bytes(me[1])
 
-    e_priv = Ed25519PrivateKey.from_private_bytes(_b64d(me["ed25519_private"]))
-    e_pub = Ed25519PublicKey.from_public_bytes(_b64d(me["ed25519_public"]))
+    e_priv = Ed25519PrivateKey.from_private_bytes(me[2])
+    e_pub = Ed25519PublicKey.from_public_bytes(me[3])
 
     return MyKeys(x_priv, x_pub, e_priv, e_pub)
 
 
 def get_my_id() -> Optional[str]:
-    data = load_all()
-    me = data.get("me")
-    return me.get("my_id") if me else None
+    row = _db().execute("SELECT my_id FROM me").fetchone()
+    return row[0] if row else None
 
 
-def save_peer(peer_id: str, peer_x25519_public_raw: bytes, peer_ed25519_public_raw: bytes):
+def save_peer(peer_id: str, peer_x25519_public_raw: bytes, peer_ed25519_public_raw: bytes,
+              aead_speeds: Optional[Dict[str, float]] = None):
     _ensure_dir()
-    data = load_all()
-    peers = data.setdefault("peers", {})
-    peers[peer_id] = {
-        "x25519_public": _b64e(peer_x25519_public_raw),
-        "ed25519_public": _b64e(peer_ed25519_public_raw),
-    }
-    _write(data)
+    conn = _db()
+    with conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO peers ({_PEER_COLUMNS}) VALUES (?, ?, ?, ?)",
+            (peer_id, peer_x25519_public_raw, peer_ed25519_public_raw, _aead_column(aead_speeds)),
+        )
 
 
 def load_peer(peer_id: str) -> Optional[Dict[str, bytes]]:
-    data = load_all()
-    peers = data.get("peers", {})
-    p = peers.get(peer_id)
+    """
+    The peer's public keys, and under "aead" the cipher speeds it advertised
+    when paired (None for peers paired with an older version).
+    """
+    p = _db().execute(
+        "SELECT x25519_public, ed25519_public, aead FROM peers WHERE peer_id = ?", (peer_id,)
+    ).fetchone()
     if not p:
         return None
     return {
-        "x25519_public": _b64d(p["x25519_public"]),
-        "ed25519_public": _b64d(p["ed25519_public"]),
+        "x25519_public": p[0],
+        "ed25519_public": p[1],
+        "aead": json.loads(p[2]) if p[2] else None,
     }
 
 
+def peer_revision(peer_id: str) -> Optional[tuple]:
+    """
+    The stored key material for sending to `peer_id` (our identity and the
+    peer's row), or None if either is missing. Pairing happens in another
+    process (python -m client.pairing), so cached key material
+    (crypto/peer_context.py) compares this, one primary-key lookup, on
+    every use and is rebuilt when it differs.
+    """
+    return _db().execute(
+        "SELECT m.my_id, m.x25519_private, m.ed25519_private, p.x25519_public, p.ed25519_public, p.aead"
+        " FROM me m, peers p WHERE p.peer_id = ?", (peer_id,)
+    ).fetchone()
+
+
+def _aead_column(speeds) -> Optional[str]:
+    from crypto.aead import parse_speeds
+
+    speeds = parse_speeds(speeds)
+    return json.dumps(speeds, sort_keys=True) if speeds else None
+
+
+def aead_speeds() -> Dict[str, float]:
+    """
+    This device's cipher speeds (benchmarked on first use, then cached).
+    """
+    from crypto.aead import local_speeds
+    return local_speeds(os.path.join(DATA_DIR, "aead_bench.json"))
+
+
+def cipher_for(peer: Dict) -> str:
+    """
+    Cipher to encrypt to `peer` (a load_peer() result) with.
+    """
+    from crypto.aead import choose
+    return choose(peer.get("aead"), aead_speeds())
+
+
 def list_peers():
-    data = load_all()
-    return sorted(list((data.get("peers", {}) or {}).keys()))
+    return [row[0] for row in _db().execute("SELECT peer_id FROM peers ORDER BY peer_id")]
 
 
 def export_my_public_bundle() -> Dict[str, str]:
     """هذا تستخدمينه في pairing: تعطيه للجهاز الثاني."""
-    data = load_all()
-    me = data.get("me")
+    me = _db().execute("SELECT my_id, x25519_public, ed25519_public FROM me").fetchone()
     if not me:
         raise RuntimeError("No keys found. Generate keys first.")
 
     return {
-        "my_id": me["my_id"],
-        "x25519_public": me["x25519_public"],
-        "ed25519_public": me["ed25519_public"],
+        "my_id": me[0],
+        "x25519_public": _b64e(me[1]),
+        "ed25519_public": _b64e(me[2]),
+        "aead": aead_speeds(),
     }
 
 
@@ -148,26 +297,73 @@ def import_peer_public_bundle(bundle: Dict[str, str]):
     peer_id = bundle["my_id"]
     x_pub = _b64d(bundle["x25519_public"])
     e_pub = _b64d(bundle["ed25519_public"])
-    save_peer(peer_id, x_pub, e_pub)
+    save_peer(peer_id, x_pub, e_pub, bundle.get("aead"))
 
 
-def load_all():
-    if not os.path.exists(KEYS_FILE):
-        return {}
-    with open(KEYS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+def import_peer_public_bundles(bundles: Iterable[Dict[str, str]]) -> int:
+    """
+    Import many peer bundles in one transaction (all or nothing).
+
+    Returns:
+        number of peers imported.
+    """
+    rows = [
+        (b["my_id"], _b64d(b["x25519_public"]), _b64d(b["ed25519_public"]),
+         _aead_column(b.get("aead")))
+        for b in bundles
+    ]
+    _ensure_dir()
+    conn = _db()
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO peers ({_PEER_COLUMNS}) VALUES (?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def _parse_bundles(raw: str):
+    """
+    Accept a JSON list of bundles, a single bundle, or one bundle per line.
+    """
+    raw = raw.strip()
+    if not raw:
+        return []
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return [json.loads(line) for line in raw.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
 
 
-def _write(data: dict):
-    with open(KEYS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+def load_all():
+    """
+    Whole store in the legacy keys.json shape (base64 strings).
+    """
+    conn = _db()
+    data = {}
+    me = conn.execute(
+        "SELECT my_id, x25519_private, x25519_public, ed25519_private, ed25519_public FROM me"
+    ).fetchone()
+    if me:
+        data["me"] = {
+            "my_id": me[0],
+            "x25519_private": _b64e(me[1]),
+            "x25519_public": _b64e(me[2]),
+            "ed25519_private": _b64e(me[3]),
+            "ed25519_public": _b64e(me[4]),
+        }
+    peers = conn.execute("SELECT peer_id, x25519_public, ed25519_public FROM peers").fetchall()
+    if peers:
+        data["peers"] = {
+            pid: {"x25519_public": _b64e(x), "ed25519_public": _b64e(e)}
+            for pid, x, e in peers
+        }
+    return data
 
 if __name__ == "__main__":
     import sys
     import json
 
     if len(sys.argv) < 2:
-        print("Usage: python -m client.pairing [export|import]")
+        print("Usage: python -m client.pairing [export|import|import-many [FILE]]")
         sys.exit(1)
 
     cmd = sys.argv[1].lower()
@@ -183,5 +379,15 @@ if __name__ == "__main__":
         import_peer_public_bundle(data)
         print("✔ Peer imported successfully")
 
+    elif cmd == "import-many":
+        if len(sys.argv) > 2:
+            with open(sys.argv[2], "r", encoding="utf-8") as f:
+                raw = f.read()
+        else:
+            print("Paste peer bundles (JSON list or one JSON object per line), then EOF:")
+            raw = sys.stdin.read()
+        n = import_peer_public_bundles(_parse_bundles(raw))
+        print(f"✔ {n} peers imported successfully")
+
     else:
         print("Unknown command:", cmd)
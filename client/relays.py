@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+# Several relays, ranked by how well they have been answering.
+#
+# Every relay keeps two exponentially weighted moving averages, fed by
+# /ready probes and by the real requests sent to it:
+#   rtt    round-trip time of successful requests, in seconds
+#   error  share of recent requests that failed (0..1)
+# A relay's score is  rtt + ERROR_PENALTY * error, plus DOWN_PENALTY while
+# its last request failed less than COOLDOWN seconds ago; lower is better.
+# A failing relay is thus skipped right away, but it is still tried as a
+# last resort and comes back as soon as a probe succeeds.
+#
+#   SCCSE_RELAYS   comma-separated relay URLs (default: server_api.SERVER_URL)
+ALPHA = 0.3  # weight of the newest sample
+INITIAL_RTT = 0.1  # seconds, assumed for relays not measured yet
+ERROR_PENALTY = 1.0  # seconds added at error rate 1.0
+DOWN_PENALTY = 10.0  # seconds
+COOLDOWN = 5.0  # seconds
+PROBE_INTERVAL = 10.0  # seconds between background /ready probes
+CONNECT_TIMEOUT = 0.25  # seconds; a dead relay must not delay the failover
+
+T = TypeVar("T")
+
+
+def configured(default: str) -> List[str]:
+    urls = os.environ.get("SCCSE_RELAYS", "")
+    urls = [u.strip().rstrip("/") for u in urls.split(",") if u.strip()]
+    return urls or [default]
+
+
+class RelayState:
+    __slots__ = ("url", "rtt", "error", "failed_at")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.rtt: Optional[float] = None
+        self.error = 0.0
+        self.failed_at: Optional[float] = None
+
+    def score(self, now: float) -> float:
+        score = (INITIAL_RTT if self.rtt is None else self.rtt) + ERROR_PENALTY * self.error
+        if self.failed_at is not None and now - self.failed_at < COOLDOWN:
+            score += DOWN_PENALTY
+        return score
+
+
+def is_failover_error(e: Exception) -> bool:
+    """
+    Errors another relay might not have: unreachable, timed out, or a 5xx
+    (down, draining, full). 4xx answers (replay, too large) would be the
+    same everywhere.
+    """
+    import requests
+
+    if isinstance(e, requests.HTTPError):
+        return e.response is None or e.response.status_code >= 500
+    return isinstance(e, requests.RequestException)
+
+
+class RelayPool:
+    """
+    Usage:
+        pool = RelayPool(["http://a:8000", "http://b:8000"])
+        pool.call(lambda url: requests.post(f"{url}/upload/bob", ...))
+        pool.each(lambda url: ...)      # every relay, in parallel
+    """
+
+    def __init__(self, urls: List[str]):
+        if not urls:
+            raise ValueError("at least one relay is required")
+        self.urls = list(urls)
+        self._state: Dict[str, RelayState] = {u: RelayState(u) for u in self.urls}
+        self._lock = threading.Lock()
+        self._prober: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ----------------------------
+    # scoring
+    # ----------------------------
+    def record(self, url: str, ok: bool, rtt: Optional[float] = None):
+        with self._lock:
+            s = self._state[url]
+            s.error = (1 - ALPHA) * s.error + ALPHA * (0.0 if ok else 1.0)
+            if ok:
+                s.failed_at = None
+                if rtt is not None:
+                    s.rtt = rtt if s.rtt is None else (1 - ALPHA) * s.rtt + ALPHA * rtt
+            else:
+                s.failed_at = time.monotonic()
+
+    def ranked(self) -> List[str]:
+        """
+        Relay URLs, best first (configuration order breaks ties).
+        """
+        now = time.monotonic()
+        with self._lock:
+            return sorted(self.urls, key=lambda u: self._state[u].score(now))
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {"url": s.url, "rtt": s.rtt, "error": s.error, "score": s.score(now)}
+                for s in (self._state[u] for u in self.urls)
+            ]
+
+    # ----------------------------
+    # requests
+    # ----------------------------
+    def attempt(self, url: str, fn: Callable[[str], T], sample_rtt: bool = True) -> T:
+        """
+        fn(url) on one relay, recording the outcome in its score.
+        """
+        t0 = time.perf_counter()
+        try:
+            result = fn(url)
+        except Exception as e:
+            # a 4xx still means the relay is up and answering
+            self.record(url, not is_failover_error(e))
+            raise
+        self.record(url, True, time.perf_counter() - t0 if sample_rtt else None)
+        return result
+
+    def call(self, fn: Callable[[str], T], sample_rtt: bool = True) -> T:
+        """
+        fn(url) on the best relay, failing over to the next one on
+        connection errors and 5xx answers. Other errors are raised at once;
+        if every relay fails, the last error is raised.
+
+        sample_rtt=False for requests whose duration is dominated by the
+        payload size (large uploads), so they don't skew the RTT.
+        """
+        error: Optional[Exception] = None
+        for url in self.ranked():
+            try:
+                return self.attempt(url, fn, sample_rtt)
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                error = e
+        raise error
+
+    def each(self, fn: Callable[[str], T],
+             errors: Optional[List[Tuple[str, Exception]]] = None) -> List[T]:
+        """
+        fn(url) on every relay in parallel. Results of the relays that
+        answered, best relay first. A relay that fails is left out and its
+        (url, exception) appended to `errors`; it never costs the results
+        of the others, which may already have been consumed (fetches).
+        """
+        def run(url):
+            try:
+                return self.attempt(url, fn), None
+            except Exception as e:
+                return None, e
+
+        urls = self.ranked()
+        if len(urls) == 1:
+            outcomes = [run(urls[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(urls)) as ex:
+                outcomes = list(ex.map(run, urls))
+        if errors is not None:
+            errors.extend((url, e) for url, (_, e) in zip(urls, outcomes) if e is not None)
+        return [result for result, e in outcomes if e is None]
+
+    # ----------------------------
+    # health probes
+    # ----------------------------
+    def probe(self, timeout: float = 1.0):
+        """
+        GET /ready on every relay, feeding the scores. A relay that is
+        draining or full answers 503 and counts as failed.
+        """
+        import requests
+
+        def ready(url):
+            r = requests.get(f"{url}/ready", timeout=(CONNECT_TIMEOUT, timeout))
+            r.raise_for_status()
+
+        self.each(ready)
+
+    def start_prober(self, interval: float = PROBE_INTERVAL) -> "RelayPool":
+        def loop():
+            while not self._stop.is_set():
+                self.probe()
+                self._stop.wait(interval)
+
+        if self._prober is None:
+            self._prober = threading.Thread(target=loop, daemon=True)
+            self._prober.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from client import pairing
+
+# Receiver-side record of the (sender, nonce) pairs already accepted, so a
+# bundle delivered twice (replayed from a relay, pushed again, fetched from
+# a second relay) is refused before any signature check or key agreement.
+# See crypto.hybrid_encrypt.check_bundle.
+#
+# An entry is only needed until its bundle's TTL runs out; after that the
+# TTL check rejects the bundle anyway. Expired entries are dropped, and past
+# MAX_ENTRIES the ones closest to expiry go first. Lookups are served from
+# memory; every entry is written through to SQLite (seen.db in the data
+# directory), so a restart doesn't reopen the window.
+MAX_ENTRIES = 20000
+FILE_NAME = "seen.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    sender_id   TEXT NOT NULL,
+    nonce       TEXT NOT NULL,
+    expires_at  REAL NOT NULL,
+    PRIMARY KEY (sender_id, nonce)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seen_expiry ON seen (expires_at);
+"""
+
+Key = Tuple[str, str]
+
+
+class ReplayCache:
+    """
+    Usage:
+        seen = ReplayCache("seen.db")      # or ReplayCache() for memory only
+        (sender_id, nonce) in seen
+        seen.add(sender_id, nonce, expires_at)
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: Dict[Key, float] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+            with self._db:
+                self._db.execute("DELETE FROM seen WHERE expires_at < ?", (time.time(),))
+            rows = self._db.execute(
+                "SELECT sender_id, nonce, expires_at FROM seen ORDER BY expires_at DESC LIMIT ?",
+                (max_entries,),
+            )
+            self._entries = {(sender, nonce): expires for sender, nonce, expires in rows}
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, sender_id: str, nonce: str, expires_at: float):
+        with self._lock:
+            self._entries[(sender_id, nonce)] = expires_at
+            if self._db is not None:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO seen VALUES (?, ?, ?)", (sender_id, nonce, expires_at)
+                    )
+            if len(self._entries) > self.max_entries:
+                self._prune()
+
+    def _prune(self):
+        """
+        Drop expired entries and, if that isn't enough, the ones expiring
+        soonest, down to 90% of the limit (so this doesn't run on every add).
+        """
+        now = time.time()
+        drop = [k for k, expires in self._entries.items() if expires < now]
+        keep = len(self._entries) - len(drop)
+        target = int(self.max_entries * 0.9)
+        if keep > target:
+            live = sorted((e, k) for k, e in self._entries.items() if e >= now)
+            drop.extend(k for _, k in live[:keep - target])
+        for k in drop:
+            del self._entries[k]
+        if self._db is not None:
+            with self._db:
+                self._db.executemany("DELETE FROM seen WHERE sender_id = ? AND nonce = ?", drop)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_default: Optional[ReplayCache] = None
+_default_lock = threading.Lock()
+
+
+def default() -> ReplayCache:
+    """
+    Process-wide cache in the client's data directory.
+    """
+    global _default
+    path = os.path.join(pairing.DATA_DIR, FILE_NAME)
+    with _default_lock:
+        if _default is None or _default.path != path:
+            _default = ReplayCache(path)
+        return _default
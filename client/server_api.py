@@ -1,20 +1,392 @@
-import requests
+import base64
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
+from client import pairing, relays, tracing
+
+# `requests` is imported on first use to keep client startup fast.
+
+# Default relay; SCCSE_RELAYS lists several (see client/relays.py).
 SERVER_URL = "http://127.0.0.1:8000"
+TIMEOUT = 10  # seconds to read a response
+
+# Bundles larger than this are uploaded in chunks through a resumable
+# upload session, and downloads are fetched in ranges of CHUNK_SIZE, so a
+# dropped connection only costs the chunk in flight.
+RESUMABLE_THRESHOLD = 4 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+MAX_RETRIES = 5  # consecutive failed chunk requests before giving up
+
+# Relays queue several bundles per recipient; fetch_all() takes at most this
+# many from each relay per call.
+MAX_DRAIN = 64
+
+# Fetching needs a bearer token from each relay (see server/auth.py),
+# obtained once by signing a challenge with this device's Ed25519 key and
+# renewed TOKEN_MARGIN seconds before it expires. A relay that has our id
+# bound to another key (403) isn't asked again for CLAIMED_RETRY seconds.
+TOKEN_MARGIN = 60
+CLAIMED_RETRY = 300
+_tokens: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}  # (relay, device) -> (token, valid until)
+_claimed: Dict[Tuple[str, str], float] = {}  # (relay, device) -> retry after
+_tokens_lock = threading.Lock()
+
+
+class MailboxClaimed(Exception):
+    """
+    A relay has this device id bound to another signing key, so it won't
+    hand out our mail; its operator can release the id (server/auth.py).
+    """
+
+
+_pool: Optional[relays.RelayPool] = None
+_pool_lock = threading.Lock()
+
+
+def pool() -> relays.RelayPool:
+    """
+    The relay pool for the configured relays (rebuilt if they change).
+    """
+    global _pool
+    urls = relays.configured(SERVER_URL)
+    with _pool_lock:
+        if _pool is None or _pool.urls != urls:
+            _pool = relays.RelayPool(urls)
+        return _pool
+
+
+def _timeout(read: float = TIMEOUT):
+    return (relays.CONNECT_TIMEOUT, read)
+
+
+def _retryable():
+    import requests
+    return (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+def _relay_headers(metadata: dict) -> dict:
+    """
+    Routing fields the relay needs, sent as headers. A resumable upload
+    needs them before any data is sent; the relay checks them against the
+    bundle body.
+    """
+    headers = {"Content-Type": "application/json"}
+    if metadata.get("sender_id") and metadata.get("nonce"):
+        headers["X-SCCSE-Sender"] = str(metadata["sender_id"])
+        headers["X-SCCSE-Nonce"] = str(metadata["nonce"])
+        headers["X-SCCSE-Content-Type"] = str(metadata.get("content_type", "text"))
+        if metadata.get("ttl") is not None:
+            headers["X-SCCSE-TTL"] = str(metadata["ttl"])
+    return headers
+
+
+def _backoff(attempt: int):
+    time.sleep(min(0.2 * 2 ** attempt, 5.0))
+
 
 def send_bundle(bundle: dict, recipient_id: str):
-    url = f"{SERVER_URL}/upload/{recipient_id}"
-    r = requests.post(url, json=bundle, timeout=10)
+    """
+    Upload to the best relay, failing over to the others.
+    """
+    import requests
+
+    metadata = bundle.get("metadata") or {}
+    body = json.dumps(bundle).encode("utf-8")
+    headers = _relay_headers(metadata)
+    if len(body) > RESUMABLE_THRESHOLD and "X-SCCSE-Nonce" in headers:
+        return pool().call(
+            lambda relay: send_resumable(body, recipient_id, headers, relay), sample_rtt=False
+        )
+
+    def post(relay):
+        with tracing.span("http.send", metadata.get("trace_id")):
+            r = requests.post(f"{relay}/upload/{recipient_id}", data=body,
+                              headers=headers, timeout=_timeout())
+        r.raise_for_status()
+        return r.json()
+
+    return pool().call(post)
+
+def _upload_status(http, url: str) -> dict:
+    """
+    Received ranges of an upload session. Raises for an error status (an
+    expired or unknown session is a 404) so the caller can fail over.
+    """
+    r = http.get(url, timeout=_timeout())
     r.raise_for_status()
     return r.json()
 
-def fetch_bundle(recipient_id: str):
-    url = f"{SERVER_URL}/fetch/{recipient_id}"
-    r = requests.get(url, timeout=10)
+def send_resumable(body: bytes, recipient_id: str, headers: dict, relay: Optional[str] = None):
+    """
+    Upload an encoded bundle in CHUNK_SIZE pieces. After a connection error
+    the client asks the relay which ranges arrived and only sends the rest.
+    """
+    import requests
+
+    relay = relay or pool().ranked()[0]
+    size = len(body)
+    with tracing.span("http.send_resumable"), requests.Session() as http:
+        r = http.post(f"{relay}/uploads/{recipient_id}",
+                      headers=dict(headers, **{"X-SCCSE-Length": str(size)}), timeout=_timeout())
+        r.raise_for_status()
+        status = r.json()
+        url = f"{relay}/uploads/{status['upload_id']}"
+
+        failures = 0
+        while not status["complete"]:
+            try:
+                pos = 0
+                for start, end in status["received"] + [[size, size]]:
+                    # send the gap before each received range
+                    for off in range(pos, start, CHUNK_SIZE):
+                        stop = min(off + CHUNK_SIZE, start)
+                        r = http.put(url, data=body[off:stop], timeout=_timeout(30), headers={
+                            "Content-Range": f"bytes {off}-{stop - 1}/{size}",
+                            "Content-Type": "application/octet-stream",
+                        })
+                        r.raise_for_status()
+                        failures = 0
+                    pos = end
+                status = _upload_status(http, url)
+            except _retryable():
+                failures += 1
+                if failures > MAX_RETRIES:
+                    raise
+                _backoff(failures)
+                try:
+                    status = _upload_status(http, url)
+                except _retryable():
+                    pass  # try again with what we knew
+
+        r = http.post(f"{url}/commit", timeout=_timeout(30))
+        r.raise_for_status()
+    return r.json()
+
+def send_batch(items):
+    """
+    Upload many bundles in one request.
+
+    items: [(bundle, recipient_id), ...]
+    Returns the relay's per-item results, in the same order.
+    """
+    import requests
+
+    payload = {"items": [{"recipient_id": rid, "bundle": b} for b, rid in items]}
+
+    def post(relay):
+        with tracing.span("http.send_batch"):
+            r = requests.post(f"{relay}/upload_batch", json=payload, timeout=_timeout(30))
+        r.raise_for_status()
+        return r.json()["results"]
+
+    return pool().call(post, sample_rtt=False)
+
+def authenticate(device_id: str, relay: str) -> Optional[str]:
+    """
+    Prove to `relay` that this device owns `device_id` and cache the fetch
+    token. None for relays that predate authentication.
+    """
+    import requests
+    from crypto.signature import relay_auth_message
+
+    keys = pairing.load_my_keys()
+    if keys is None:
+        raise RuntimeError("Keys not initialized")
+
+    with _tokens_lock:
+        retry_after = _claimed.get((relay, device_id), 0)
+    if retry_after > time.monotonic():
+        raise MailboxClaimed(f"{device_id} is bound to another key on {relay}")
+
+    r = requests.post(f"{relay}/auth/{device_id}/challenge", timeout=_timeout())
     if r.status_code == 404:
+        token, expires_in = None, 3600.0  # old relay: open fetches, ask again later
+    else:
+        r.raise_for_status()
+        challenge = r.json()["challenge"]
+        signature = keys.ed25519_private.sign(relay_auth_message(device_id, challenge))
+        r = requests.post(f"{relay}/auth/{device_id}/token", timeout=_timeout(), json={
+            "public_key": base64.b64encode(keys.ed25519_public.public_bytes_raw()).decode(),
+            "challenge": challenge,
+            "signature": base64.b64encode(signature).decode(),
+        })
+        if r.status_code == 403:
+            with _tokens_lock:
+                _claimed[(relay, device_id)] = time.monotonic() + CLAIMED_RETRY
+            raise MailboxClaimed(f"{device_id} is bound to another key on {relay}")
+        r.raise_for_status()
+        data = r.json()
+        token, expires_in = data["token"], data["expires_in"]
+
+    with _tokens_lock:
+        _tokens[(relay, device_id)] = (token, time.monotonic() + expires_in - TOKEN_MARGIN)
+    return token
+
+
+def authenticate_all(device_id: str) -> int:
+    """
+    Claim `device_id` on every reachable relay (the first key to do so is
+    bound to it) and get fetch tokens ready. Returns the number of relays.
+    """
+    return len(pool().each(lambda relay: authenticate(device_id, relay)))
+
+
+def _auth_header(device_id: str, relay: str, renew: bool = False) -> dict:
+    with _tokens_lock:
+        cached = _tokens.get((relay, device_id))
+    if renew or cached is None or cached[1] < time.monotonic():
+        token = authenticate(device_id, relay)
+    else:
+        token = cached[0]
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def fetch_bundle(recipient_id: str, relay: Optional[str] = None):
+    """
+    The pending bundle, or None. Bundles up to CHUNK_SIZE come back (and are
+    removed) in one request; larger ones are downloaded in ranges, resumed
+    after connection errors, and removed once complete.
+
+    Without `relay`, relays are asked in turn (best first) until one has a
+    bundle; fetch_all() collects from every relay at once.
+    """
+    import requests
+
+    if relay is None:
+        for relay in pool().ranked():
+            try:
+                bundle = pool().attempt(relay, lambda url: fetch_bundle(recipient_id, url))
+            except (requests.RequestException, MailboxClaimed):
+                continue
+            if bundle is not None:
+                return bundle
         return None
-    r.raise_for_status()
-    return r.json()
+
+    url = f"{relay}/fetch/{recipient_id}"
+    with tracing.span("http.fetch") as sp, requests.Session() as http:
+        http.headers.update(_auth_header(recipient_id, relay))
+        r = http.get(url, headers={"Range": f"bytes=0-{CHUNK_SIZE - 1}"}, timeout=_timeout())
+        if r.status_code == 401:
+            # token unknown to the relay (restarted): prove the key again, once
+            http.headers.update(_auth_header(recipient_id, relay, renew=True))
+            r = http.get(url, headers={"Range": f"bytes=0-{CHUNK_SIZE - 1}"}, timeout=_timeout())
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        body = _fetch_rest(http, url, r) if r.status_code == 206 else r.content
+        bundle = json.loads(body)
+        sp.set_trace((bundle.get("metadata") or {}).get("trace_id"))
+    return bundle
+
+def fetch_all(recipient_id: str, errors: Optional[list] = None) -> List[dict]:
+    """
+    Pending bundles on every relay (asked in parallel, each drained of up
+    to MAX_DRAIN bundles), oldest first.
+
+    A relay that fails doesn't cost the bundles already taken off it or
+    the others: its (url, exception) goes to `errors`. Only when no
+    bundle came back is the first error that isn't "relay unreachable"
+    raised, so a refused fetch isn't mistaken for an empty mailbox. A relay
+    that has our id bound to another key is only reported (MailboxClaimed).
+    """
+    import requests
+
+    failed = [] if errors is None else errors
+
+    def drain(relay):
+        got = []
+        try:
+            for _ in range(MAX_DRAIN):
+                try:
+                    bundle = fetch_bundle(recipient_id, relay)
+                except requests.HTTPError as e:
+                    if e.response is not None and e.response.status_code == 410:
+                        continue  # expired there; the next one may not be
+                    raise
+                if bundle is None:
+                    break
+                got.append(bundle)
+        except MailboxClaimed as e:
+            failed.append((relay, e))  # reported, not raised: the relay is fine
+        except Exception as e:
+            if not got:
+                raise
+            failed.append((relay, e))  # keep what was already taken off the relay
+        return got
+
+    bundles = [b for got in pool().each(drain, failed) for b in got]
+    if not bundles:
+        for _, e in failed:
+            if not (relays.is_failover_error(e) or isinstance(e, MailboxClaimed)):
+                raise e
+    return sorted(bundles, key=lambda b: (b.get("metadata") or {}).get("timestamp", 0))
+
+def _fetch_rest(http, url: str, first) -> bytearray:
+    import requests
+
+    size = int(first.headers["Content-Range"].rsplit("/", 1)[1])
+    etag = first.headers["ETag"]
+    body = bytearray(size)
+    pos = len(first.content)
+    body[:pos] = first.content
+
+    failures = 0
+    while pos < size:
+        last = min(pos + CHUNK_SIZE, size) - 1
+        try:
+            r = http.get(url, timeout=_timeout(30),
+                         headers={"Range": f"bytes={pos}-{last}", "If-Match": etag})
+            r.raise_for_status()
+        except _retryable():
+            failures += 1
+            if failures > MAX_RETRIES:
+                raise
+            _backoff(failures)
+            continue
+        chunk = r.content
+        body[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+        failures = 0
+
+    try:
+        http.delete(url, headers={"If-Match": etag}, timeout=_timeout())
+    except requests.RequestException:
+        pass  # left on the relay until its TTL runs out
+    return body
+
+def announce(device_id: str, record: dict):
+    """
+    Publish this device's signed direct-path announcement (see
+    client/direct.py) on every relay, so peers find it whichever they use.
+    Relays only take it with this device's token, as for a fetch.
+    """
+    import requests
+
+    def put(relay):
+        url = f"{relay}/announce/{device_id}"
+        r = requests.put(url, json=record, headers=_auth_header(device_id, relay), timeout=_timeout(5))
+        if r.status_code == 401:
+            r = requests.put(url, json=record, headers=_auth_header(device_id, relay, renew=True),
+                             timeout=_timeout(5))
+        r.raise_for_status()
+        return True
+
+    errors = []
+    if not pool().each(put, errors):
+        raise errors[0][1] if errors else requests.ConnectionError("no relay reachable")
+
+def lookup_announcement(device_id: str):
+    import requests
+
+    def get(relay):
+        r = requests.get(f"{relay}/announce/{device_id}", timeout=_timeout(2))
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.json()
+
+    return pool().call(get)
 
 def receive_bundle(my_id: str):
     """
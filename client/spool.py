@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+from typing import List, Optional, Tuple
+
+from client import pairing, server_api
+
+# Durable outbound spool of already-encrypted bundles.
+#
+# When the relay is down or slow, bundles are written here (one file each,
+# atomically) instead of being lost, and a background Flusher drains them
+# in batches through /upload_batch. While anything is spooled, new sends
+# are queued behind it so delivery order is preserved.
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 2.0  # seconds between checks when idle
+MAX_BACKOFF = 60.0  # seconds, while the relay keeps failing
+
+
+def _dir() -> str:
+    d = os.path.join(pairing.DATA_DIR, "spool")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def enqueue(bundle: dict, recipient_id: str) -> str:
+    """
+    Durably queue one bundle. Returns the spool file name.
+    """
+    name = f"{time.time_ns():020d}-{os.urandom(4).hex()}.json"
+    path = os.path.join(_dir(), name)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"recipient_id": recipient_id, "bundle": bundle}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _flusher_kick()
+    return name
+
+
+def pending(limit: Optional[int] = None) -> List[str]:
+    """
+    Spooled file names, oldest first.
+    """
+    names = sorted(n for n in os.listdir(_dir()) if n.endswith(".json"))
+    return names[:limit] if limit else names
+
+
+def _load(name: str) -> Optional[Tuple[dict, str]]:
+    try:
+        with open(os.path.join(_dir(), name), "r", encoding="utf-8") as f:
+            item = json.load(f)
+        return item["bundle"], item["recipient_id"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _remove(name: str):
+    try:
+        os.remove(os.path.join(_dir(), name))
+    except FileNotFoundError:
+        pass
+
+
+def _expired(bundle: dict) -> bool:
+    # the receiver would reject it anyway, so don't send it
+    meta = bundle.get("metadata") or {}
+    try:
+        return time.time() - float(meta["timestamp"]) > float(meta["ttl"])
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def flush_once(batch_size: int = BATCH_SIZE) -> int:
+    """
+    Send one batch of spooled bundles.
+
+    Returns the number of spool entries settled (delivered, or rejected by
+    the relay for good). Raises if the relay can't be reached.
+    """
+    names = pending(batch_size)
+    if not names:
+        return 0
+
+    batch, batch_names, settled = [], [], 0
+    for name in names:
+        item = _load(name)
+        if item is None or _expired(item[0]):
+            _remove(name)
+            settled += 1
+            continue
+        batch.append(item)
+        batch_names.append(name)
+
+    if not batch:
+        return settled
+
+    results = server_api.send_batch(batch)
+    for name, result in zip(batch_names, results):
+        # "replay" means an earlier attempt already got through; "full"
+        # (relay out of memory) stays spooled for the next round
+        if result.get("status") in ("ok", "replay", "invalid", "too_large"):
+            _remove(name)
+            settled += 1
+    return settled
+
+
+def send_or_spool(bundle: dict, recipient_id: str) -> bool:
+    """
+    Send now if the relay is reachable and nothing is queued; otherwise
+    spool the bundle for the background flusher.
+
+    Returns True if sent immediately, False if spooled.
+    """
+    import requests
+
+    if not pending(1):
+        try:
+            server_api.send_bundle(bundle, recipient_id)
+            return True
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code < 500:
+                raise  # rejected by the relay, retrying won't help
+        except requests.RequestException:
+            pass
+
+    enqueue(bundle, recipient_id)
+    return False
+
+
+class Flusher:
+    """
+    Background thread that drains the spool, backing off while the relay
+    is unreachable.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL, batch_size: int = BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def kick(self):
+        self._wake.set()
+
+    def _loop(self):
+        backoff = self.interval
+        while self._running:
+            try:
+                while self._running and flush_once(self.batch_size):
+                    pass
+                backoff = self.interval
+            except Exception:
+                backoff = min(backoff * 2, MAX_BACKOFF)
+
+            self._wake.wait(backoff if pending(1) else self.interval)
+            self._wake.clear()
+
+
+_flusher: Optional[Flusher] = None
+
+
+def start_flusher() -> Flusher:
+    """
+    Start the process-wide flusher (drains anything left from a previous run).
+    """
+    global _flusher
+    if _flusher is None:
+        _flusher = Flusher()
+        _flusher.start()
+    return _flusher
+
+
+def _flusher_kick():
+    if _flusher is not None:
+        _flusher.kick()
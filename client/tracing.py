@@ -0,0 +1,186 @@
+# client/tracing.py
+"""
+Lightweight phase timing for the client.
+
+Tracing is off by default. Turn it on with SCCSE_TRACE=1 or `enable()`.
+When off, `span()` returns a shared no-op object, so instrumented code pays
+only one function call and one attribute check.
+
+A trace ID is carried in the bundle metadata, so spans recorded by the
+sender and by the receiver can be joined into one end-to-end figure with
+`join_traces()`.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterable, List, Optional
+
+MAX_SPANS = 5000  # keep the last N spans in memory
+
+ENABLED = os.environ.get("SCCSE_TRACE", "") == "1"
+
+_spans: Deque[Dict] = deque(maxlen=MAX_SPANS)
+_lock = threading.Lock()
+_current_trace: ContextVar[Optional[str]] = ContextVar("sccse_trace_id", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_trace(self, trace_id):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "trace_id", "start", "_t0")
+
+    def __init__(self, name: str, trace_id: Optional[str]):
+        self.name = name
+        self.trace_id = trace_id
+
+    def __enter__(self):
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._t0) * 1000.0
+        record = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": duration_ms,
+            "ok": exc_type is None,
+        }
+        with _lock:
+            _spans.append(record)
+        return False
+
+    def set_trace(self, trace_id):
+        """
+        Attach the span to a trace discovered while it was running
+        (e.g. the trace ID inside a fetched bundle).
+        """
+        if trace_id:
+            self.trace_id = trace_id
+
+
+def enable(on: bool = True) -> None:
+    global ENABLED
+    ENABLED = on
+
+
+def is_enabled() -> bool:
+    return ENABLED
+
+
+def span(name: str, trace_id: Optional[str] = None):
+    """
+    Time a block of code:
+
+        with tracing.span("encrypt.aead"):
+            ...
+
+    The span is attached to `trace_id`, or to the current trace if not given.
+    """
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, trace_id or _current_trace.get())
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    return _current_trace.get()
+
+
+def set_trace_id(trace_id: Optional[str]):
+    """
+    Make `trace_id` the current trace. Returns a token for `reset_trace_id`.
+    """
+    return _current_trace.set(trace_id)
+
+
+def reset_trace_id(token) -> None:
+    _current_trace.reset(token)
+
+
+def get_spans() -> List[Dict]:
+    with _lock:
+        return list(_spans)
+
+
+def clear() -> None:
+    with _lock:
+        _spans.clear()
+
+
+def export_json(path: Optional[str] = None) -> str:
+    """
+    Serialize all recorded spans. If `path` is given, also write them there.
+    """
+    text = json.dumps({"spans": get_spans()}, indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return text
+
+
+def join_traces(*exports: Iterable[Dict]) -> Dict[str, float]:
+    """
+    Join span lists (e.g. sender export + receiver export) by trace ID.
+
+    Returns:
+        trace_id -> end-to-end latency in ms (first span start to last span end).
+    """
+    bounds: Dict[str, List[float]] = {}
+    for spans in exports:
+        for s in spans:
+            tid = s.get("trace_id")
+            if not tid:
+                continue
+            start = s["start"]
+            end = start + s["duration_ms"] / 1000.0
+            b = bounds.setdefault(tid, [start, end])
+            b[0] = min(b[0], start)
+            b[1] = max(b[1], end)
+    return {tid: (end - start) * 1000.0 for tid, (start, end) in bounds.items()}
+
+
+def summary() -> List[str]:
+    """
+    One line per phase: count, mean and max duration. Used by the UI.
+    """
+    phases: Dict[str, List[float]] = {}
+    for s in get_spans():
+        phases.setdefault(s["name"], []).append(s["duration_ms"])
+
+    lines = []
+    for name in sorted(phases):
+        d = phases[name]
+        lines.append(
+            f"{name:<22} n={len(d):<5} avg={sum(d) / len(d):8.2f} ms  max={max(d):8.2f} ms"
+        )
+
+    e2e = join_traces(get_spans())
+    if e2e:
+        vals = list(e2e.values())
+        lines.append(
+            f"{'end-to-end':<22} n={len(vals):<5} avg={sum(vals) / len(vals):8.2f} ms  max={max(vals):8.2f} ms"
+        )
+    return lines
@@ -1,11 +1,22 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+import json
+import os
+import queue
+import sys
+import threading
 import time
 
-from client.server_api import send_bundle, fetch_bundle
-from client.pairing import load_my_keys, load_peer, list_peers, get_my_id
-from client.history import load_history, save_to_history
-from crypto.hybrid_encrypt import encrypt_bundle, decrypt_bundle
+from client import autosend, direct, tracing, delta_store, history_sync, replay_cache, spool
+from client.widgets import VirtualList, preview_window
+from client.server_api import authenticate_all, fetch_all
+from client.pairing import aead_speeds, load_my_keys, load_peer, list_peers, get_my_id
+from client.history import MAX_ITEMS, load_history, merge_entries, save_to_history
+from crypto.delta import DeltaBaseMissing
+
+# crypto.hybrid_encrypt / crypto.session pull in the cryptography package;
+# they are imported where first used (and warmed up in the background
+# right after the window appears), so the window shows up fast.
 
 
 # ============================
@@ -39,6 +50,14 @@ class ClientUI:
 
         self.current_text = ""
         self.current_type = "text"
+        self._direct = None
+        self.my_keys = None  # loaded once by _background_init
+
+        # Tk calls from other threads (clipboard monitor, auto-send) are
+        # queued here and run on the UI thread
+        self._ui_calls = queue.Queue()
+        self.autosender = autosend.AutoSender(self._auto_send)
+        self.autosender.enabled = os.environ.get("SCCSE_AUTOSEND", "") == "1"
 
         self.my_id = get_my_id()
         if not self.my_id:
@@ -47,7 +66,56 @@ class ClientUI:
             return
 
         self._build_layout()
-        self.refresh_history()
+        self._auto_peer = self.peer_var.get()
+        self.root.after(50, self._poll_ui_calls)
+
+        # keys, history and heavy imports load in the background
+        self._init_results = queue.Queue()
+        threading.Thread(target=self._background_init, daemon=True).start()
+        self.root.after(30, self._poll_background_init)
+
+    def _background_init(self):
+        """
+        Runs off the UI thread; never touches Tk. Results go through a queue.
+        """
+        keys = None
+        try:
+            import crypto.hybrid_encrypt  # noqa: F401  (warm import)
+            import crypto.session  # noqa: F401
+            keys = load_my_keys()
+            aead_speeds()  # cipher benchmark (cached after the first run)
+            self._prepare_peer(self._auto_peer)
+            items = load_history()
+        except Exception as e:
+            items = e
+        if direct.enabled():
+            try:
+                # pushed bundles arrive on the listener thread
+                self._direct = direct.start(
+                    self.my_id, lambda b: self.call_in_ui(self._receive_bundle, b)
+                )
+            except Exception:
+                pass  # can't listen (port taken, no keys): relay only
+        try:
+            # claim our mailbox id on the relays and have fetch tokens ready
+            authenticate_all(self.my_id)
+        except Exception:
+            pass  # relay down or no keys yet: done on the first fetch
+        self._init_results.put((keys, items))
+
+    def _poll_background_init(self):
+        try:
+            keys, items = self._init_results.get_nowait()
+        except queue.Empty:
+            self.root.after(30, self._poll_background_init)
+            return
+
+        if keys is not None:
+            self.my_keys = keys
+        if isinstance(items, Exception):
+            self.toast(f"Startup: {items}", kind="warn")
+            items = []
+        self._render_history(items)
 
     # ============================
     # TOAST NOTIFICATION
@@ -156,6 +224,29 @@ class ClientUI:
         ttk.Combobox(f, values=peers, textvariable=self.peer_var, state="readonly")\
             .pack(padx=30, pady=8)
 
+        self.delta_var = tk.BooleanVar(value=bool(peers) and delta_store.is_enabled(self.peer_var.get()))
+        tk.Checkbutton(
+            f, text="Delta transfer for this peer",
+            variable=self.delta_var, command=self._toggle_delta,
+            bg=COLORS["bg"], fg=COLORS["muted"], selectcolor=COLORS["panel"],
+            activebackground=COLORS["bg"], font=FONT_S
+        ).pack(padx=30)
+        self.own_var = tk.BooleanVar(value=self.peer_var.get() in history_sync.own_devices())
+        tk.Checkbutton(
+            f, text="My own device (sync history)",
+            variable=self.own_var, command=self._toggle_own_device,
+            bg=COLORS["bg"], fg=COLORS["muted"], selectcolor=COLORS["panel"],
+            activebackground=COLORS["bg"], font=FONT_S
+        ).pack(padx=30)
+        self.auto_var = tk.BooleanVar(value=self.autosender.enabled)
+        tk.Checkbutton(
+            f, text="Auto-send copies to this peer",
+            variable=self.auto_var, command=self._toggle_autosend,
+            bg=COLORS["bg"], fg=COLORS["muted"], selectcolor=COLORS["panel"],
+            activebackground=COLORS["bg"], font=FONT_S
+        ).pack(padx=30)
+        self.peer_var.trace_add("write", lambda *_: self._sync_peer_toggles())
+
         btns = tk.Frame(f, bg=COLORS["bg"])
         btns.pack(padx=30, pady=10)
 
@@ -175,11 +266,28 @@ class ClientUI:
         tk.Label(f, text="Security Log", fg=COLORS["text"], bg=COLORS["bg"], font=FONT_H)\
             .pack(anchor="w", padx=30, pady=20)
 
-        self.history = tk.Listbox(
-            f, bg=COLORS["panel"], fg=COLORS["muted"],
-            relief="flat", height=20
+        # only visible rows are drawn, so long histories stay cheap
+        self.history = VirtualList(
+            f, formatter=self._history_row,
+            height=20 if not tracing.is_enabled() else 12,
+            empty_text="No secure transfers yet.",
+            bg=COLORS["panel"], fg=COLORS["muted"], font=FONT_S
         )
         self.history.pack(fill="both", padx=30, pady=10)
+        self._ghost_button(f, "⟳ Sync History", self.sync_history)\
+            .pack(anchor="e", padx=30)
+
+        # phase timings (only when tracing is on at startup)
+        self.trace_box = None
+        if tracing.is_enabled():
+            self.trace_box = tk.Text(
+                f, height=9,
+                bg=COLORS["panel"], fg=COLORS["muted"],
+                relief="flat", font=("Consolas", 9), padx=10, pady=6
+            )
+            self.trace_box.pack(fill="x", padx=30, pady=(0, 6))
+            self._ghost_button(f, "Export Trace", self.export_trace)\
+                .pack(anchor="e", padx=30)
         return f
 
     def _about_tab(self):
@@ -225,8 +333,10 @@ class ClientUI:
         self.current_text = text
         self.current_type = content_type
 
+        # multi-MB clips: show a bounded preview, keep the full text
+        preview, _ = preview_window(text)
         self.text_box.delete("1.0", tk.END)
-        self.text_box.insert(tk.END, text)
+        self.text_box.insert(tk.END, preview)
 
         if content_type == "password":
             self.sec_badge.config(text="HIGH SECURITY", fg=COLORS["danger"])
@@ -259,68 +369,321 @@ class ClientUI:
     # ============================
     # SEND / RECEIVE
     # ============================
+    def _build_bundle(self, peer_id, text, content_type, delta=False, delta_base=None):
+        from crypto import peer_context
+
+        # keys, parsed public keys and ephemeral pairs are ready if the peer
+        # was selected before (see _prepare_peer)
+        with tracing.span("keys.load"):
+            ctx = peer_context.get(peer_id)
+        return ctx.encrypt(text, content_type, delta=delta, delta_base=delta_base)
+
+    def _prepare_peer(self, peer_id):
+        if peer_id in list_peers():
+            from crypto import peer_context
+            peer_context.prepare(peer_id)
+
+    def _send(self, peer_id, text, content_type):
+        """
+        Encrypt, send (or spool) and log one item. Doesn't touch Tk, so it
+        can run off the UI thread. Returns (sent_now, history entries).
+        """
+        # 🔒 high-security content is never kept as a delta reference
+        delta = content_type not in ("password", autosend.MULTI) and delta_store.is_enabled(peer_id)
+
+        token = tracing.set_trace_id(tracing.new_trace_id()) if tracing.is_enabled() else None
+        try:
+            base = delta_store.load_reference(peer_id, delta_store.SENT) if delta else None
+            bundle = self._build_bundle(
+                peer_id, text, content_type, delta=delta, delta_base=base
+            )
+
+            sent_now = self._deliver(bundle, peer_id)
+            if delta:
+                delta_store.save_reference(peer_id, delta_store.SENT, text.encode(), content_type)
+            items = autosend.unpack(text) if content_type == autosend.MULTI else [(text, content_type)]
+            entries = [save_to_history(c, t) for c, t in items]
+        finally:
+            if token is not None:
+                tracing.reset_trace_id(token)
+        return sent_now, entries
+
     def send_current(self):
         if not self.current_text:
             return
 
-        peer = load_peer(self.peer_var.get())
-        keys = load_my_keys()
+        sent_now, entries = self._send(self.peer_var.get(), self.current_text, self.current_type)
 
-        bundle = encrypt_bundle(
-            content=self.current_text,
-            sender_signing_private=keys.ed25519_private,
-            recipient_public_key=peer["x25519_public"],
-            sender_id=self.my_id,
-            content_type=self.current_type
-        )
+        self._add_history(entries)
+        if sent_now:
+            self.toast("Encrypted & sent securely")
+        else:
+            self.toast("Relay unreachable — queued for sending", kind="warn")
 
-        send_bundle(bundle, self.peer_var.get())
-        save_to_history(self.current_text, self.current_type)
-        self.refresh_history()
-        self.toast("Encrypted & sent securely")
+    def _deliver(self, bundle, peer_id):
+        """
+        Direct to the peer when possible, else through the relay (spooled
+        if the relay is down). True if delivered or uploaded now.
+        """
+        if direct.enabled() and direct.send(bundle, peer_id):
+            return True
+        return spool.send_or_spool(bundle, peer_id)
 
     def receive(self):
-        keys = load_my_keys()
-        bundle = fetch_bundle(self.my_id)
-        if not bundle:
+        # every relay may hold a bundle for us; oldest first, so the
+        # clipboard ends up with the newest
+        errors = []
+        try:
+            bundles = fetch_all(self.my_id, errors)
+        except Exception as e:
+            self.toast(f"Receive failed: {e}", kind="warn")
+            return
+        for bundle in bundles:
+            # the relay has already dropped these: one bad bundle (bad
+            # signature, unknown sender) must not cost the others
+            try:
+                self._receive_bundle(bundle)
+            except Exception as e:
+                self.toast(f"Bundle rejected: {e}", kind="warn")
+        if errors:
+            self.toast(f"{len(errors)} relay(s) failed: {errors[0][1]}", kind="warn")
+
+    def _receive_bundle(self, bundle):
+        from crypto.hybrid_encrypt import BundleRejected, check_bundle, decrypt_bundle
+        from crypto.session import get_session_manager, is_session_bundle
+
+        # malformed, expired and already received bundles stop here,
+        # before any key is loaded or any crypto is done
+        seen = replay_cache.default()
+        try:
+            metadata = check_bundle(bundle, seen)
+        except BundleRejected as e:
+            self.toast(str(e), kind="warn")
             return
-
-        metadata = bundle.get("metadata", {})
         content_type = metadata.get("content_type", "text")
+        sender_id = metadata["sender_id"]
+        delta_meta = metadata.get("delta")
+
+        token = tracing.set_trace_id(metadata.get("trace_id")) if tracing.is_enabled() else None
+        try:
+            with tracing.span("keys.load"):
+                # our own keys are loaded once at startup; only a bundle
+                # that beats the background init loads them here
+                if self.my_keys is None:
+                    self.my_keys = load_my_keys()
+                keys = self.my_keys
+                peer = load_peer(sender_id)
+
+            base = None
+            if delta_meta and "base" in delta_meta:
+                base = delta_store.load_reference(sender_id, delta_store.RECEIVED)
+
+            try:
+                if is_session_bundle(bundle):
+                    plaintext = get_session_manager(self.my_id, keys).decrypt(
+                        bundle, peer["x25519_public"], peer["ed25519_public"],
+                        delta_base=base, seen=seen
+                    )
+                else:
+                    plaintext = decrypt_bundle(
+                        bundle,
+                        recipient_private_key=keys.x25519_private,
+                        sender_signing_public=peer["ed25519_public"],
+                        delta_base=base, seen=seen
+                    )
+            except DeltaBaseMissing:
+                # fall back: ask the sender for a full copy
+                self._send_control(sender_id, {"type": "delta-resync"})
+                self.toast("Delta base missing — full copy requested", kind="warn")
+                return
+
+            if content_type == "control":
+                self._handle_control(sender_id, plaintext)
+                return
+
+            if delta_meta is not None and content_type != "password":
+                delta_store.save_reference(sender_id, delta_store.RECEIVED, plaintext.encode(), content_type)
+
+            # a burst packed by the sender's auto-send: keep the newest item
+            if content_type == autosend.MULTI:
+                items = autosend.unpack(plaintext)
+            else:
+                items = [(plaintext, content_type)]
+            if not items:
+                return
+
+            # don't auto-send what we just received straight back
+            self.autosender.ignore(items[-1][0])
+            self.root.clipboard_clear()
+            self.root.clipboard_append(items[-1][0])
+
+            # 🔒 Do NOT log high-security content
+            entries = [save_to_history(c, t) for c, t in items]
+        finally:
+            if token is not None:
+                tracing.reset_trace_id(token)
+
+        self._add_history(entries)
+        self.toast("Decrypted & copied to clipboard")
 
-        peer = load_peer(metadata["sender_id"])
-        plaintext = decrypt_bundle(
-            bundle,
-            recipient_private_key=keys.x25519_private,
-            sender_signing_public=peer["ed25519_public"]
-        )
-
-        self.root.clipboard_clear()
-        self.root.clipboard_append(plaintext)
+    # ============================
+    # AUTO-SEND
+    # ============================
+    def on_clipboard_change(self, text, content_type):
+        """
+        ClipboardMonitor callback (runs on the monitor thread).
+        """
+        self.call_in_ui(self.update_clipboard_display, text, content_type)
+        self.autosender.push(text, content_type)
+
+    def call_in_ui(self, fn, *args):
+        self._ui_calls.put((fn, args))
+
+    def _poll_ui_calls(self):
+        try:
+            while True:
+                try:
+                    fn, args = self._ui_calls.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    fn(*args)
+                except Exception:
+                    # report it like any Tk callback error; the calls queued
+                    # behind it (and later ones) still run
+                    self.root.report_callback_exception(*sys.exc_info())
+        finally:
+            self.root.after(50, self._poll_ui_calls)
+
+    def _toggle_autosend(self):
+        self.autosender.enabled = self.auto_var.get()
+        if not self.autosender.enabled:
+            self.autosender.stop()
+
+    def _auto_send(self, items):
+        # runs on the auto-send timer thread: crypto and upload here,
+        # Tk updates are handed to the UI thread
+        peer_id = self._auto_peer
+        if peer_id not in list_peers():
+            return
+        for text, content_type in items:
+            try:
+                sent_now, entries = self._send(peer_id, text, content_type)
+            except Exception as e:
+                self.call_in_ui(self.toast, f"Auto-send failed: {e}", "warn")
+                continue
+            self.call_in_ui(self._add_history, entries)
+            if not sent_now:
+                self.call_in_ui(self.toast, "Relay unreachable — queued for sending", "warn")
 
-        # 🔒 Do NOT log high-security content
-        if content_type != "password":
-            save_to_history(plaintext, content_type)
+    # ============================
+    # DELTA MODE
+    # ============================
+    def _toggle_delta(self):
+        peer_id = self.peer_var.get()
+        if peer_id in list_peers():
+            delta_store.set_enabled(peer_id, self.delta_var.get())
+        else:
+            self.delta_var.set(False)
+
+    def _sync_peer_toggles(self):
+        peer_id = self.peer_var.get()
+        self._auto_peer = peer_id
+        self._prepare_peer(peer_id)
+        self.delta_var.set(delta_store.is_enabled(peer_id))
+        self.own_var.set(peer_id in history_sync.own_devices())
+
+    def _send_control(self, peer_id, message: dict):
+        bundle = self._build_bundle(peer_id, json.dumps(message), "control")
+        self._deliver(bundle, peer_id)
+
+    def _handle_control(self, sender_id, plaintext):
+        message = json.loads(plaintext)
+        if message.get("type") == "delta-resync":
+            # peer lost its base: re-send the last content in full
+            last = delta_store.load_reference_with_type(sender_id, delta_store.SENT)
+            if last is not None:
+                content, content_type = last
+                bundle = self._build_bundle(sender_id, content.decode(), content_type, delta=True)
+                self._deliver(bundle, sender_id)
+                self.toast("Full copy re-sent to peer")
+        elif message.get("type") in history_sync.MESSAGE_TYPES:
+            self._handle_sync(sender_id, message)
 
-        self.refresh_history()
-        self.toast("Decrypted & copied to clipboard")
+    # ============================
+    # HISTORY SYNC (OWN DEVICES)
+    # ============================
+    def _toggle_own_device(self):
+        peer_id = self.peer_var.get()
+        if peer_id in list_peers():
+            history_sync.set_own_device(peer_id, self.own_var.get())
+        else:
+            self.own_var.set(False)
 
+    def sync_history(self):
+        devices = history_sync.own_devices()
+        if not devices:
+            self.toast("Mark a peer as your own device first", kind="warn")
+            return
+        message = history_sync.summary(load_history())
+        for peer_id in devices:
+            self._send_control(peer_id, message)
+        self.toast("History sync started")
+
+    def _handle_sync(self, sender_id, message):
+        # only devices the user marked as their own may touch the history
+        if sender_id not in history_sync.own_devices():
+            return
+        reply, entries = history_sync.handle(message, load_history())
+        if entries and merge_entries(entries):
+            self.refresh_history()
+            self.toast("History synced")
+        if reply is not None:
+            self._send_control(sender_id, reply)
 
     # ============================
     # HISTORY (SAFE)
     # ============================
     def refresh_history(self):
-        self.history.delete(0, tk.END)
-        items = load_history()
+        self._render_history(load_history())
+
+    def _render_history(self, items):
+        self.refresh_trace_summary()
+        self.history.set_items(items)
+
+    def _add_history(self, entries):
+        # incremental: prepend new entries (oldest first) instead of reloading
+        self.refresh_trace_summary()
+        for entry in entries:
+            if entry is not None:
+                self.history.insert(0, entry)
+        self.history.truncate(MAX_ITEMS)
+
+    @staticmethod
+    def _history_row(i):
+        if i["type"] == "password":
+            return "✔ PASSWORD — [REDACTED]"
+        # slice first: entries can be multi-MB
+        first = i["content"][:60].split("\n", 1)[0]
+        return f"✔ {i['type'].upper()} — {first}"
 
-        if not items:
-            self.history.insert(tk.END, "No secure transfers yet.")
+    # ============================
+    # PHASE TIMINGS
+    # ============================
+    def refresh_trace_summary(self):
+        # tracing may have been turned on after the layout was built
+        if self.trace_box is None or not tracing.is_enabled():
             return
-
-        for i in items:
-            if i["type"] == "password":
-                entry = "✔ PASSWORD — [REDACTED]"
-            else:
-                entry = f"✔ {i['type'].upper()} — {i['content'][:60]}"
-            self.history.insert(tk.END, entry)
+        lines = tracing.summary() or ["No spans recorded yet."]
+        self.trace_box.delete("1.0", tk.END)
+        self.trace_box.insert(tk.END, "\n".join(lines))
+
+    def export_trace(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            initialfile=f"sccse_trace_{self.my_id}.json"
+        )
+        if path:
+            tracing.export_json(path)
+            self.toast("Trace exported")
 
@@ -0,0 +1,156 @@
+import tkinter as tk
+from typing import Any, Callable, List, Tuple
+
+# Large clipboard contents are only previewed: the Text widget gets at most
+# PREVIEW_CHARS characters, and no line longer than PREVIEW_LINE_CHARS
+# (Tk's text layout gets slow on very long lines). The full content is
+# still what gets sent.
+PREVIEW_CHARS = 20_000
+PREVIEW_LINE_CHARS = 2_000
+
+
+def preview_window(text: str, limit: int = PREVIEW_CHARS,
+                   line_limit: int = PREVIEW_LINE_CHARS) -> Tuple[str, bool]:
+    """
+    Bounded preview of `text`. Returns (preview, truncated).
+
+    Only the first `limit` characters are looked at, so the cost doesn't
+    depend on how large `text` is.
+    """
+    window = text[:limit]
+    truncated = len(text) > limit
+
+    if len(window) > line_limit:
+        lines = window.split("\n")
+        if any(len(line) > line_limit for line in lines):
+            lines = [line if len(line) <= line_limit else line[:line_limit] + " …" for line in lines]
+            window = "\n".join(lines)
+            truncated = True
+
+    if truncated:
+        window += f"\n\n… preview only — {len(text):,} characters in total"
+    return window, truncated
+
+
+class VirtualList(tk.Frame):
+    """
+    Scrollable list that only draws the rows that are visible.
+
+    Items are kept as given and turned into text by `formatter` only when
+    their row is on screen, so setting or growing the list costs the same
+    with 100 or 100k items. Changes are coalesced into one redraw per
+    idle cycle.
+    """
+
+    def __init__(self, parent, formatter: Callable[[Any], str] = str,
+                 height: int = 20, row_height: int = 20, empty_text: str = "",
+                 bg: str = "white", fg: str = "black", font=None):
+        super().__init__(parent, bg=bg)
+        self.formatter = formatter
+        self.row_height = row_height
+        self.empty_text = empty_text
+        self.fg = fg
+        self.font = font
+
+        self._items: List[Any] = []
+        self._top = 0
+        self._rows: List[int] = []  # canvas text ids, one per visible slot
+        self._shown: List[str] = []  # text currently in each slot
+        self._redraw_pending = False
+
+        self.canvas = tk.Canvas(
+            self, bg=bg, highlightthickness=0, height=height * row_height
+        )
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self._on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", lambda e: self._schedule_redraw())
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll(3))
+
+    # ---- data ----
+    def set_items(self, items: List[Any]):
+        """
+        Show `items` (the list is kept, not copied).
+        """
+        self._items = items
+        self._top = 0
+        self._schedule_redraw()
+
+    def insert(self, index: int, item: Any):
+        self._items.insert(index, item)
+        # keep the rows the user is looking at in place
+        if self._top and index <= self._top:
+            self._top += 1
+        self._schedule_redraw()
+
+    def truncate(self, size: int):
+        del self._items[size:]
+        self._schedule_redraw()
+
+    def __len__(self):
+        return len(self._items)
+
+    # ---- scrolling ----
+    def visible_rows(self) -> int:
+        h = self.canvas.winfo_height()
+        if h <= 1:  # not mapped yet
+            h = int(self.canvas["height"])
+        return max(1, h // self.row_height)
+
+    def scroll(self, rows: int):
+        self._set_top(self._top + rows)
+
+    def _set_top(self, top: int):
+        top = max(0, min(top, len(self._items) - self.visible_rows()))
+        if top != self._top:
+            self._top = top
+            self._schedule_redraw()
+
+    def _on_scroll(self, action, *args):
+        if action == "moveto":
+            self._set_top(int(float(args[0]) * len(self._items)))
+        elif action == "scroll":
+            n = int(args[0])
+            self.scroll(n * self.visible_rows() if args[1] == "pages" else n)
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    # ---- drawing ----
+    def _schedule_redraw(self):
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.after_idle(self.redraw)
+
+    def redraw(self):
+        self._redraw_pending = False
+        rows = self.visible_rows()
+
+        while len(self._rows) < rows:
+            y = len(self._rows) * self.row_height + 2
+            self._rows.append(self.canvas.create_text(
+                6, y, anchor="nw", text="", fill=self.fg, font=self.font
+            ))
+            self._shown.append("")
+
+        n = len(self._items)
+        self._top = max(0, min(self._top, n - rows))
+        for slot, row_id in enumerate(self._rows):
+            i = self._top + slot
+            if slot >= rows:
+                text = ""
+            elif i < n:
+                text = self.formatter(self._items[i])
+            else:
+                text = self.empty_text if n == 0 and slot == 0 else ""
+            if text != self._shown[slot]:
+                self.canvas.itemconfigure(row_id, text=text)
+                self._shown[slot] = text
+
+        if n:
+            self.scrollbar.set(self._top / n, min(1.0, (self._top + rows) / n))
+        else:
+            self.scrollbar.set(0.0, 1.0)
@@ -0,0 +1,200 @@
+"""
+AEAD registry: AES-256-GCM and ChaCha20-Poly1305.
+
+Both take a 32-byte key and a 12-byte nonce and produce ciphertext || 16-byte
+tag, so they are interchangeable in the bundle format. The cipher used for a
+bundle is named in its metadata ("cipher"), which is signed (hybrid mode) or
+bound as associated data (session mode). Bundles without the field are
+AES-256-GCM.
+
+AES-GCM is much faster on CPUs with AES instructions, ChaCha20-Poly1305 on
+CPUs without them. Each device measures both once (local_speeds(), cached per
+machine and library version) and advertises the result in its pairing bundle.
+The sender then picks the cipher with the best throughput on the slower of
+the two ends (choose()).
+"""
+import json
+import os
+import platform
+import time
+from typing import Dict, Optional
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+KEY_SIZE = 32
+
+AES_GCM = "aes-256-gcm"
+CHACHA20_POLY1305 = "chacha20-poly1305"
+DEFAULT = AES_GCM  # also what bundles without a "cipher" field use
+
+CIPHERS = {
+    AES_GCM: AESGCM,
+    CHACHA20_POLY1305: ChaCha20Poly1305,
+}
+
+BENCH_SIZE = 16 * 1024  # bytes per operation in the startup benchmark
+BENCH_TIME = 0.02  # seconds per cipher
+
+
+def _aead(cipher: str, key):
+    try:
+        return CIPHERS[cipher](key)
+    except KeyError:
+        raise ValueError(f"Unsupported cipher: {cipher!r}") from None
+
+
+def cipher_of(metadata: dict) -> str:
+    """
+    The cipher named by a bundle's metadata. Raises ValueError for unknown names.
+    """
+    cipher = metadata.get("cipher", DEFAULT)
+    if cipher not in CIPHERS:
+        raise ValueError(f"Unsupported cipher: {cipher!r}")
+    return cipher
+
+
+# encrypt_into/decrypt_into appeared in cryptography 47. With older versions
+# (requirements.txt allows 41+) the *_into functions still work, but encrypt
+# or decrypt into a new buffer and copy it into `out` once.
+HAS_INTO = hasattr(AESGCM, "decrypt_into")
+
+
+def encrypt_into(aead, nonce, data, aad, out) -> None:
+    if HAS_INTO:
+        aead.encrypt_into(nonce, data, aad, out)
+    else:
+        memoryview(out)[:] = aead.encrypt(nonce, data, aad)
+
+
+def decrypt_into(aead, nonce, sealed, aad, out) -> None:
+    if HAS_INTO:
+        aead.decrypt_into(nonce, sealed, aad, out)
+    else:
+        memoryview(out)[:] = aead.decrypt(nonce, sealed, aad)
+
+
+# Same conventions as crypto/aes_gcm.py: any bytes-like input, never copied,
+# ciphertext and tag kept together.
+def aead_seal(cipher: str, plaintext, key, aad=None):
+    """
+    Returns (nonce, ciphertext || tag).
+    """
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce, _aead(cipher, key).encrypt(nonce, plaintext, aad)
+
+
+def aead_open(cipher: str, nonce, sealed, key, aad=None) -> bytes:
+    return _aead(cipher, key).decrypt(nonce, sealed, aad)
+
+
+def aead_open_into(cipher: str, nonce, sealed, key, out, aad=None) -> memoryview:
+    """
+    Decrypt into a preallocated writable buffer of at least
+    len(sealed) - TAG_SIZE bytes. Returns a view of the plaintext in `out`.
+    """
+    view = memoryview(out)[:len(sealed) - TAG_SIZE]
+    decrypt_into(_aead(cipher, key), nonce, sealed, aad, view)
+    return view
+
+
+# ============================
+# CIPHER SELECTION
+# ============================
+def benchmark(size: int = BENCH_SIZE, duration: float = BENCH_TIME) -> Dict[str, float]:
+    """
+    Seal + open throughput of each cipher on this machine, in MB/s.
+    """
+    key = os.urandom(KEY_SIZE)
+    nonce = os.urandom(NONCE_SIZE)
+    data = os.urandom(size)
+    speeds = {}
+    for name, cls in CIPHERS.items():
+        aead = cls(key)
+        aead.decrypt(nonce, aead.encrypt(nonce, data, None), None)  # warm up
+        n = 0
+        t0 = time.perf_counter()
+        while True:
+            aead.decrypt(nonce, aead.encrypt(nonce, data, None), None)
+            n += 1
+            elapsed = time.perf_counter() - t0
+            if elapsed >= duration:
+                break
+        speeds[name] = round(n * size / elapsed / 1e6, 1)
+    return speeds
+
+
+def parse_speeds(raw) -> Optional[Dict[str, float]]:
+    """
+    Known ciphers and their speeds from an advertised (untrusted) mapping.
+    None if there are none.
+    """
+    if not isinstance(raw, dict):
+        return None
+    speeds = {}
+    for name, value in raw.items():
+        if name in CIPHERS and isinstance(value, (int, float)) and value > 0:
+            speeds[name] = float(value)
+    return speeds or None
+
+
+def _fingerprint() -> str:
+    # results only carry over to the same CPU and crypto library
+    from cryptography import __version__
+    from cryptography.hazmat.backends.openssl import backend
+    return "|".join([platform.machine(), platform.processor(), __version__,
+                     backend.openssl_version_text()])
+
+
+_local_speeds: Dict[str, Dict[str, float]] = {}
+
+
+def local_speeds(cache_path: Optional[str] = None) -> Dict[str, float]:
+    """
+    This machine's cipher speeds (MB/s). Measured once and cached in
+    `cache_path` until the CPU or the crypto library changes.
+    """
+    memo_key = cache_path or ""
+    if memo_key in _local_speeds:
+        return _local_speeds[memo_key]
+
+    fingerprint = _fingerprint()
+    speeds = None
+    if cache_path:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") == fingerprint:
+                speeds = parse_speeds(cached.get("speeds"))
+        except (OSError, ValueError, AttributeError):
+            speeds = None
+
+    if speeds is None or set(speeds) != set(CIPHERS):
+        speeds = benchmark()
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            tmp = cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"fingerprint": fingerprint, "speeds": speeds}, f)
+            os.replace(tmp, cache_path)
+
+    _local_speeds[memo_key] = speeds
+    return speeds
+
+
+def choose(peer_speeds: Optional[Dict[str, float]], my_speeds: Dict[str, float]) -> str:
+    """
+    Cipher for a bundle to a peer that advertised `peer_speeds` (None for
+    peers paired before cipher agility: they only know AES-256-GCM).
+
+    Throughput is limited by the slower end, so this picks the cipher with
+    the highest min(mine, theirs); ties go to the default.
+    """
+    peer_speeds = parse_speeds(peer_speeds)
+    if not peer_speeds:
+        return DEFAULT
+    common = [c for c in CIPHERS if c in peer_speeds and c in my_speeds]
+    if not common:
+        return DEFAULT
+    return max(common, key=lambda c: min(my_speeds[c], peer_speeds[c]))
@@ -1,17 +1,56 @@
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import os
 
+from crypto.aead import decrypt_into, encrypt_into
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+# All functions take any bytes-like object (bytes, bytearray, memoryview)
+# and never copy their input. The aes_gcm_seal/open functions keep the
+# ciphertext and tag together as one buffer (ciphertext || tag), which is
+# what AESGCM produces and expects, so no slicing or concatenation is done.
+
+def aes_gcm_seal(plaintext, key: bytes, aad=None):
+    """
+    Returns (nonce, ciphertext || tag).
+    """
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce, AESGCM(key).encrypt(nonce, plaintext, aad)
+
+def aes_gcm_seal_into(plaintext, key: bytes, out, aad=None) -> bytes:
+    """
+    Encrypt into a preallocated writable buffer of exactly
+    len(plaintext) + TAG_SIZE bytes. Returns the nonce.
+    """
+    nonce = os.urandom(NONCE_SIZE)
+    encrypt_into(AESGCM(key), nonce, plaintext, aad, out)
+    return nonce
+
+def aes_gcm_open(nonce, sealed, key: bytes, aad=None) -> bytes:
+    """
+    Decrypt ciphertext || tag as produced by aes_gcm_seal().
+    """
+    return AESGCM(key).decrypt(nonce, sealed, aad)
+
+def aes_gcm_open_into(nonce, sealed, key: bytes, out, aad=None) -> memoryview:
+    """
+    Decrypt into a preallocated writable buffer of at least
+    len(sealed) - TAG_SIZE bytes. Returns a view of the plaintext in `out`.
+    """
+    view = memoryview(out)[:len(sealed) - TAG_SIZE]
+    decrypt_into(AESGCM(key), nonce, sealed, aad, view)
+    return view
+
 def aes_gcm_encrypt(plaintext: bytes, key: bytes):
-    nonce = os.urandom(12)
-    aesgcm = AESGCM(key)
-    ciphertext = aesgcm.encrypt(nonce, plaintext, None)
+    nonce, sealed = aes_gcm_seal(plaintext, key)
 
     return {
-        "ciphertext": ciphertext[:-16],
-        "tag": ciphertext[-16:],
+        "ciphertext": sealed[:-TAG_SIZE],
+        "tag": sealed[-TAG_SIZE:],
         "nonce": nonce
     }
 
 def aes_gcm_decrypt(ciphertext: bytes, tag: bytes, nonce: bytes, key: bytes):
-    aesgcm = AESGCM(key)
-    return aesgcm.decrypt(nonce, ciphertext + tag, None)
+    # separate ciphertext and tag have to be joined once for AESGCM
+    return aes_gcm_open(nonce, b"".join((ciphertext, tag)), key)
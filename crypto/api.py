@@ -1,5 +1,7 @@
 from crypto.hybrid_encrypt import encrypt_bundle, decrypt_bundle
-from client.pairing import load_my_keys, load_peer
+from crypto.session import get_session_manager, is_session_bundle, session_mode_enabled
+from client.pairing import cipher_for, load_my_keys, load_peer, get_my_id
+from client import replay_cache
 
 
 def encrypt_for_peer(
@@ -7,6 +9,7 @@ def encrypt_for_peer(
     content_type: str,
     sender_id: str,
     recipient_id: str,
+    use_session: bool = None,
 ):
     # Load keys
     my_keys = load_my_keys()
@@ -15,12 +18,21 @@ def encrypt_for_peer(
     if not my_keys or not peer:
         raise RuntimeError("Keys not initialized or peer not paired")
 
+    cipher = cipher_for(peer)
+    if use_session is None:
+        use_session = session_mode_enabled()
+    if use_session:
+        return get_session_manager(sender_id, my_keys).encrypt(
+            plaintext, recipient_id, peer["x25519_public"], content_type, cipher=cipher
+        )
+
     return encrypt_bundle(
         content=plaintext,
         sender_signing_private=my_keys.ed25519_private,
         recipient_public_key=peer["x25519_public"],
         sender_id=sender_id,
-        content_type=content_type
+        content_type=content_type,
+        cipher=cipher
     )
 
 
@@ -32,8 +44,14 @@ def decrypt_from_peer(bundle: dict):
     if not my_keys or not peer:
         raise RuntimeError("Missing keys or peer")
 
+    if is_session_bundle(bundle):
+        return get_session_manager(get_my_id(), my_keys).decrypt(
+            bundle, peer["x25519_public"], peer["ed25519_public"], seen=replay_cache.default()
+        )
+
     return decrypt_bundle(
         bundle=bundle,
         recipient_private_key=my_keys.x25519_private,
-        sender_signing_public=peer["ed25519_public"]
+        sender_signing_public=peer["ed25519_public"],
+        seen=replay_cache.default()
     )
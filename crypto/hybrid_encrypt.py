@@ -1,13 +1,15 @@
-import base64
+import binascii
 import time
 
-def b64e(b: bytes) -> str:
-    return base64.b64encode(b).decode("utf-8")
+# binascii works on any bytes-like input and decodes ASCII str directly,
+# which saves the intermediate copies base64.b64encode/.encode() make.
+def b64e(b) -> str:
+    return binascii.b2a_base64(b, newline=False).decode("ascii")
 
-def b64d(s: str) -> bytes:
-    return base64.b64decode(s.encode("utf-8"))
+def b64d(s) -> bytes:
+    return binascii.a2b_base64(s)
 
-from crypto.aes_gcm import aes_gcm_encrypt, aes_gcm_decrypt
+from crypto.aead import DEFAULT as DEFAULT_CIPHER, TAG_SIZE, aead_seal, aead_open, aead_open_into, cipher_of
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
 
 from crypto.x25519_keys import (
@@ -18,66 +20,241 @@ from crypto.x25519_keys import (
     load_public_key
 )
 from crypto.metadata import create_metadata
+from crypto.delta import encode_payload, decode_payload
 from crypto.signature import sign_metadata, verify_metadata
+from client import tracing
 
-def encrypt_bundle(content: str,
+def _as_bytes(content):
+    # bytes-like content is used as is; only str has to be encoded
+    if isinstance(content, str):
+        return content.encode()
+    return content
+
+
+def sealed_ciphertext(bundle: dict) -> bytes:
+    """
+    ciphertext || tag of a bundle. Hybrid bundles carry the tag in a
+    separate "tag" field; session bundles carry both in "ciphertext".
+    """
+    if "tag" in bundle:
+        return b"".join((b64d(bundle["ciphertext"]), b64d(bundle["tag"])))
+    return b64d(bundle["ciphertext"])
+
+
+def encrypt_bundle(content,
                    sender_signing_private,
                    recipient_public_key,
                    sender_id: str,
-                   content_type: str):
+                   content_type: str,
+                   delta: bool = False,
+                   delta_base: bytes = None,
+                   cipher: str = DEFAULT_CIPHER,
+                   ephemeral=None):
+    """
+    `content` is a str or any bytes-like object (bytes-like input is
+    encrypted without being copied).
+
+    `cipher` is one of crypto.aead.CIPHERS; it is recorded in the signed
+    metadata. Only use a cipher the recipient advertised (crypto.aead.choose).
+
+    `ephemeral` is an optional precomputed (ephemeral public key bytes,
+    AEAD key) pair for this recipient, see crypto/peer_context.py. It must
+    never be used for more than one bundle.
+
+    delta=True marks the bundle for delta mode: if `delta_base` (the last
+    content delivered to this peer) is given and a delta pays off, only the
+    delta is encrypted. See crypto/delta.py.
+    """
 
-    eph_private, eph_public = generate_keypair()
+    trace_token = None
+    if tracing.is_enabled() and not tracing.current_trace_id():
+        trace_token = tracing.set_trace_id(tracing.new_trace_id())
 
-    recipient_pub = load_public_key(recipient_public_key)
-    shared_secret = derive_shared_secret(eph_private, recipient_pub)
-    aes_key = derive_aes_key(shared_secret)
+    try:
+        if ephemeral is not None:
+            eph_public_raw, aes_key = ephemeral
+        else:
+            with tracing.span("encrypt.keygen"):
+                eph_private, eph_public = generate_keypair()
 
-    encrypted = aes_gcm_encrypt(content.encode(), aes_key)
-    metadata = create_metadata(sender_id, content_type)
-    signature = sign_metadata(metadata, sender_signing_private)
+            with tracing.span("encrypt.ecdh_hkdf"):
+                recipient_pub = load_public_key(recipient_public_key)
+                shared_secret = derive_shared_secret(eph_private, recipient_pub)
+                aes_key = derive_aes_key(shared_secret)
+            eph_public_raw = serialize_public_key(eph_public)
 
+        payload = _as_bytes(content)
+        delta_meta = None
+        if delta:
+            with tracing.span("encrypt.delta"):
+                payload, delta_meta = encode_payload(payload, delta_base)
+
+        with tracing.span("encrypt.aead"):
+            nonce, sealed = aead_seal(cipher, payload, aes_key)
+
+        with tracing.span("encrypt.sign"):
+            metadata = create_metadata(sender_id, content_type)
+            metadata["cipher"] = cipher
+            if delta_meta is not None:
+                metadata["delta"] = delta_meta
+            if tracing.is_enabled():
+                metadata["trace_id"] = tracing.current_trace_id()
+            signature = sign_metadata(metadata, sender_signing_private)
+    finally:
+        if trace_token is not None:
+            tracing.reset_trace_id(trace_token)
+
+    # The tag stays a field of its own: older receivers read bundle["tag"]
+    # and decrypt ciphertext + tag. The two parts are views, not copies.
+    sealed = memoryview(sealed)
     return {
-    "ciphertext": b64e(encrypted["ciphertext"]),
-    "nonce": b64e(encrypted["nonce"]),
-    "tag": b64e(encrypted["tag"]),
-    "ephemeral_pubkey": b64e(serialize_public_key(eph_public)),
+    "ciphertext": b64e(sealed[:-TAG_SIZE]),
+    "tag": b64e(sealed[-TAG_SIZE:]),
+    "nonce": b64e(nonce),
+    "ephemeral_pubkey": b64e(eph_public_raw),
     "metadata": metadata,
     "signature": b64e(signature)
 }
 
 
+# ============================
+# RECEIVE CHECKS
+# ============================
+# Receiving runs from cheap to expensive, so junk, expired and replayed
+# bundles are refused in microseconds instead of costing an X25519 each:
+#   1. structure      types and sizes of the fields used below
+#   2. TTL            metadata timestamp + ttl
+#   3. duplicate      (sender, nonce) lookup in the receiver's cache
+#   4. signature      Ed25519 over the metadata
+#   5. key agreement  X25519 + HKDF, then AEAD
+# The (sender, nonce) pair is recorded only once the AEAD tag checked out,
+# so forged bundles can't fill the cache or block the real one.
+MAX_ID_LENGTH = 256  # sender ids and metadata nonces
+
+
+class BundleRejected(ValueError):
+    """
+    A bundle was refused before any key agreement: malformed, expired or
+    already received.
+    """
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def check_bundle(bundle, seen=None, now: float = None) -> dict:
+    """
+    Steps 1-3 above for any bundle (classic or session). `seen` is a
+    receiver cache supporting `(sender_id, nonce) in seen`, such as
+    client.replay_cache.ReplayCache.
+
+    Returns the metadata. Raises BundleRejected.
+    """
+    meta = bundle.get("metadata") if isinstance(bundle, dict) else None
+    if not isinstance(meta, dict):
+        raise BundleRejected("Malformed bundle: no metadata")
+    sender_id, nonce = meta.get("sender_id"), meta.get("nonce")
+    if not (isinstance(sender_id, str) and 0 < len(sender_id) <= MAX_ID_LENGTH):
+        raise BundleRejected("Malformed bundle: bad sender_id")
+    if not (isinstance(nonce, str) and 0 < len(nonce) <= MAX_ID_LENGTH):
+        raise BundleRejected("Malformed bundle: bad nonce")
+    issued, ttl = meta.get("timestamp"), meta.get("ttl")
+    if not (_is_number(issued) and _is_number(ttl) and ttl > 0):
+        raise BundleRejected("Malformed bundle: bad timestamp or ttl")
+    if not (isinstance(bundle.get("ciphertext"), str) and isinstance(bundle.get("nonce"), str)):
+        raise BundleRejected("Malformed bundle: missing ciphertext")
+    if "tag" in bundle and not isinstance(bundle["tag"], str):
+        raise BundleRejected("Malformed bundle: bad tag")
+
+    now = time.time() if now is None else now
+    if now - issued > ttl:
+        raise BundleRejected("Message expired (TTL exceeded)")
+
+    if seen is not None and (sender_id, nonce) in seen:
+        raise BundleRejected("Bundle already received (replay)")
+    return meta
+
+
+def remember(seen, metadata: dict):
+    """
+    Record an authenticated bundle in the receiver cache (until its TTL runs out).
+    """
+    if seen is not None:
+        seen.add(metadata["sender_id"], metadata["nonce"], metadata["timestamp"] + metadata["ttl"])
+
+
+def _decode_field(bundle: dict, name: str, size: int) -> bytes:
+    value = bundle.get(name)
+    try:
+        raw = b64d(value) if isinstance(value, str) else None
+    except binascii.Error:
+        raw = None
+    if raw is None or len(raw) != size:
+        raise BundleRejected(f"Malformed bundle: bad {name}")
+    return raw
+
+
 def decrypt_bundle(bundle: dict,
                    recipient_private_key,
-                   sender_signing_public):
+                   sender_signing_public,
+                   delta_base: bytes = None,
+                   raw: bool = False,
+                   out=None,
+                   seen=None):
+    """
+    For delta-mode bundles, `delta_base` is the last content received from
+    this sender. Raises crypto.delta.DeltaBaseMissing if it doesn't match.
 
-    eph_public = load_public_key(b64d(bundle["ephemeral_pubkey"]))
-    shared_secret = derive_shared_secret(recipient_private_key, eph_public)
-    aes_key = derive_aes_key(shared_secret)
+    `seen` is the receiver's duplicate cache (see check_bundle); the bundle
+    is added to it once decrypted. Malformed, expired and replayed bundles
+    raise BundleRejected before any key agreement.
 
+    Returns str, or the plaintext bytes when raw=True. With raw=True and a
+    writable `out` buffer (at least as large as the plaintext), the
+    plaintext is decrypted into `out` and a memoryview of it is returned.
+    Delta payloads are always rebuilt into a new buffer.
+    """
 
-    sender_pub = Ed25519PublicKey.from_public_bytes(sender_signing_public)
+    trace_token = None
+    if tracing.is_enabled() and isinstance(bundle, dict) and isinstance(bundle.get("metadata"), dict):
+        trace_token = tracing.set_trace_id(bundle["metadata"].get("trace_id"))
 
-    verify_metadata(
-        bundle["metadata"],
-        b64d(bundle["signature"]),
-        sender_pub
-    )
+    try:
+        with tracing.span("decrypt.check"):
+            metadata = check_bundle(bundle, seen)
+            eph_raw = _decode_field(bundle, "ephemeral_pubkey", 32)
+            signature = _decode_field(bundle, "signature", 64)
 
-    now = time.time()
-    issued = bundle["metadata"]["timestamp"]
-    ttl = bundle["metadata"]["ttl"]
+        with tracing.span("decrypt.verify"):
+            if isinstance(sender_signing_public, Ed25519PublicKey):
+                sender_pub = sender_signing_public
+            else:
+                sender_pub = Ed25519PublicKey.from_public_bytes(sender_signing_public)
 
-    if now - issued > ttl:
-        raise ValueError("Message expired (TTL exceeded)")
+            verify_metadata(metadata, signature, sender_pub)
 
-    plaintext = aes_gcm_decrypt(
-        b64d(bundle["ciphertext"]),
-        b64d(bundle["tag"]),
-        b64d(bundle["nonce"]),
-        aes_key
-    )
+        with tracing.span("decrypt.ecdh_hkdf"):
+            eph_public = load_public_key(eph_raw)
+            shared_secret = derive_shared_secret(recipient_private_key, eph_public)
+            aes_key = derive_aes_key(shared_secret)
 
-    return plaintext.decode()
+        with tracing.span("decrypt.aead"):
+            cipher = cipher_of(metadata)  # signed, checked above
+            nonce = b64d(bundle["nonce"])
+            sealed = sealed_ciphertext(bundle)
+            if raw and out is not None and "delta" not in metadata:
+                plaintext = aead_open_into(cipher, nonce, sealed, aes_key, out)
+            else:
+                plaintext = aead_open(cipher, nonce, sealed, aes_key)
+            del sealed
+        remember(seen, metadata)
 
+        if "delta" in metadata:
+            with tracing.span("decrypt.delta"):
+                plaintext = decode_payload(plaintext, metadata["delta"], delta_base)
+    finally:
+        if trace_token is not None:
+            tracing.reset_trace_id(trace_token)
 
-    
\ No newline at end of file
+    return plaintext if raw else plaintext.decode()
@@ -0,0 +1,206 @@
+"""
+Per-peer crypto context, prepared before the first send.
+
+Building a bundle from scratch means loading both key sets, parsing the
+peer's public key, generating an ephemeral X25519 keypair and doing the
+ECDH + HKDF for it. None of that depends on the content, so a PeerContext
+does it ahead of time, as soon as a peer is selected:
+
+  - keys are loaded and parsed once, and the cipher is chosen once
+  - a small pool of (ephemeral public key, AEAD key) pairs is kept ready;
+    the ephemeral private key is discarded as soon as its pair is derived
+
+Each pair is handed out exactly once and the pool is refilled on a
+background thread, so a send only costs the AEAD and the signature. When the
+pool is empty (a burst of sends) a pair is made inline, as before. Pairs
+older than MAX_AGE are dropped unused.
+
+Contexts are rebuilt when the key store changes (new keys, re-paired peer),
+also when another process such as the pairing CLI changed it; see
+client.pairing.peer_revision().
+"""
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from crypto.aead import DEFAULT as DEFAULT_CIPHER
+from crypto.hybrid_encrypt import encrypt_bundle
+from crypto.x25519_keys import (
+    generate_keypair,
+    derive_shared_secret,
+    derive_aes_key,
+    serialize_public_key,
+    load_public_key,
+)
+
+POOL_SIZE = 4  # ephemeral pairs kept ready per peer
+MAX_AGE = 600  # seconds a prepared pair may wait before it is discarded
+
+
+class PeerContext:
+    """
+    Parsed keys and prepared ephemeral pairs for sending to one peer.
+
+    `peer` is a client.pairing.load_peer() record, `keys` a MyKeys.
+    """
+
+    def __init__(self, my_id: str, peer_id: str, peer: dict, keys,
+                 cipher: str = DEFAULT_CIPHER, pool_size: int = POOL_SIZE, revision: tuple = None):
+        self.my_id = my_id
+        self.peer_id = peer_id
+        self.peer = peer
+        self.keys = keys
+        self.cipher = cipher
+        self.revision = revision
+        self.recipient_public = load_public_key(peer["x25519_public"])
+        self.signing_public = Ed25519PublicKey.from_public_bytes(peer["ed25519_public"])
+        self.pool_size = pool_size
+
+        self._pool: "deque[Tuple[float, bytes, bytes]]" = deque()
+        self._lock = threading.Lock()
+        self._refilling = False
+
+    def _make(self) -> Tuple[float, bytes, bytes]:
+        eph_private, eph_public = generate_keypair()
+        aes_key = derive_aes_key(derive_shared_secret(eph_private, self.recipient_public))
+        return time.monotonic(), serialize_public_key(eph_public), aes_key
+
+    def _fill(self):
+        try:
+            while True:
+                with self._lock:
+                    if len(self._pool) >= self.pool_size:
+                        return
+                item = self._make()
+                with self._lock:
+                    self._pool.append(item)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def refill(self):
+        """
+        Top the pool up in the background (no-op if full or already queued).
+        """
+        with self._lock:
+            if self._refilling or len(self._pool) >= self.pool_size:
+                return
+            self._refilling = True
+        _refill_later(self)
+
+    def ready(self) -> int:
+        with self._lock:
+            return len(self._pool)
+
+    def take(self) -> Tuple[bytes, bytes]:
+        """
+        A fresh (ephemeral public key bytes, AEAD key) pair, never handed
+        out before.
+        """
+        item = None
+        now = time.monotonic()
+        with self._lock:
+            while self._pool:
+                made, eph_public_raw, aes_key = self._pool.popleft()
+                if now - made <= MAX_AGE:
+                    item = (eph_public_raw, aes_key)
+                    break
+        self.refill()
+        if item is None:
+            _, eph_public_raw, aes_key = self._make()
+            item = (eph_public_raw, aes_key)
+        return item
+
+    def encrypt(self, content, content_type: str, delta: bool = False, delta_base: bytes = None) -> dict:
+        from crypto.session import get_session_manager, session_mode_enabled
+
+        if session_mode_enabled():
+            return get_session_manager(self.my_id, self.keys).encrypt(
+                content, self.peer_id, self.recipient_public, content_type,
+                delta=delta, delta_base=delta_base, cipher=self.cipher
+            )
+        return encrypt_bundle(
+            content=content,
+            sender_signing_private=self.keys.ed25519_private,
+            recipient_public_key=self.recipient_public,
+            sender_id=self.my_id,
+            content_type=content_type,
+            delta=delta,
+            delta_base=delta_base,
+            cipher=self.cipher,
+            ephemeral=self.take(),
+        )
+
+
+# One long-lived thread refills every context's pool. Handing it work is a
+# non-blocking queue put; starting a thread per refill would block the send
+# until the new thread had run.
+_refill_queue: "queue.SimpleQueue[PeerContext]" = queue.SimpleQueue()
+_refiller: Optional[threading.Thread] = None
+_refiller_lock = threading.Lock()
+
+
+def _refill_loop():
+    while True:
+        _refill_queue.get()._fill()
+
+
+def _refill_later(ctx: PeerContext):
+    global _refiller
+    if _refiller is None:
+        with _refiller_lock:
+            if _refiller is None:
+                _refiller = threading.Thread(target=_refill_loop, daemon=True)
+                _refiller.start()
+    _refill_queue.put(ctx)
+
+
+_contexts: Dict[str, PeerContext] = {}
+_contexts_lock = threading.Lock()
+
+
+def get(peer_id: str) -> PeerContext:
+    """
+    The context for a paired peer, built (and its pool started) if needed.
+    Raises RuntimeError if keys or the peer are missing.
+    """
+    from client import pairing
+
+    revision = pairing.peer_revision(peer_id)
+    with _contexts_lock:
+        ctx = _contexts.get(peer_id)
+    if ctx is not None and revision is not None and ctx.revision == revision:
+        return ctx
+
+    keys = pairing.load_my_keys()
+    peer = pairing.load_peer(peer_id)
+    if keys is None or peer is None:
+        raise RuntimeError("Keys not initialized or peer not paired")
+    ctx = PeerContext(pairing.get_my_id(), peer_id, peer, keys,
+                      cipher=pairing.cipher_for(peer), revision=revision)
+    ctx.refill()
+    with _contexts_lock:
+        _contexts[peer_id] = ctx
+    return ctx
+
+
+def prepare(peer_id: str) -> None:
+    """
+    Build the peer's context on a background thread (e.g. when it is selected).
+    """
+    def build():
+        try:
+            get(peer_id)
+        except Exception:
+            pass  # not paired (yet): the send path reports it
+
+    threading.Thread(target=build, daemon=True).start()
+
+
+def clear() -> None:
+    with _contexts_lock:
+        _contexts.clear()
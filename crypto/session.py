@@ -0,0 +1,353 @@
+"""
+Session mode for high-rate streams between two paired devices.
+
+`encrypt_bundle` does a fresh X25519 exchange, HKDF and Ed25519 signature
+for every message. In session mode that asymmetric work is done once per
+peer pair:
+
+  handshake (once):
+    E        = new X25519 keypair
+    root     = HKDF( X25519(E, R) || X25519(S, R) ), salt = session id
+    header   = session id, E.pub, Ed25519-sign(S_sign, id || E.pub || S || R)
+
+  per message n (symmetric only):
+    msg_key || chain_key = HMAC-SHA512(chain_key, 0x01)   # old chain key is discarded
+
+The header rides along with every message of the session, so a receiver
+that missed the first message can still join; it verifies the signature
+only the first time it sees a session id. Message keys are used once and
+the chain only moves forward, so a leaked chain state does not expose
+earlier messages. Sessions are rotated after MAX_SESSION_MESSAGES or
+SESSION_LIFETIME seconds.
+
+The metadata (including the "cipher" name, see crypto/aead.py) is not
+signed per message; it is bound to the ciphertext as AEAD associated data
+instead.
+"""
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from crypto.aead import DEFAULT as DEFAULT_CIPHER, aead_seal, aead_open, cipher_of
+from crypto.hybrid_encrypt import BundleRejected, b64e, b64d, check_bundle, remember, sealed_ciphertext
+from crypto.metadata import create_metadata
+from crypto.delta import encode_payload, decode_payload
+from crypto.x25519_keys import (
+    generate_keypair,
+    derive_shared_secret,
+    serialize_public_key,
+    load_public_key,
+)
+from client import tracing
+
+SESSION_VERSION = b"sccse-session-v1"
+MAX_SESSION_MESSAGES = 10000  # rotate the session after this many messages
+SESSION_LIFETIME = 3600  # seconds
+MAX_SKIP = 1000  # how far ahead of the chain a message counter may jump
+MAX_RECV_SESSIONS = 256  # receive sessions kept in memory
+
+
+class SessionError(ValueError):
+    pass
+
+
+def _transcript(session_id: bytes, eph_pub: bytes, sender_id: str, recipient_id: str) -> bytes:
+    return b"|".join([
+        SESSION_VERSION, session_id, eph_pub,
+        sender_id.encode("utf-8"), recipient_id.encode("utf-8"),
+    ])
+
+
+def _root_key(dh1: bytes, dh2: bytes, session_id: bytes, sender_id: str, recipient_id: str) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=session_id,
+        info=SESSION_VERSION + b"|" + sender_id.encode("utf-8") + b"|" + recipient_id.encode("utf-8"),
+    ).derive(dh1 + dh2)
+
+
+def _step(chain_key: bytes):
+    """
+    Advance the chain by one message. Returns (message_key, next_chain_key).
+    """
+    out = hmac.digest(chain_key, b"\x01", "sha512")
+    return out[:32], out[32:]
+
+
+def _aad(metadata: dict, session: dict) -> bytes:
+    # The handshake fields are already bound through the session id: the
+    # receiver derives the root key from the first header it verified.
+    return b"|".join([
+        json.dumps(metadata, sort_keys=True, separators=(",", ":")).encode(),
+        session["id"].encode(),
+        str(session["counter"]).encode(),
+    ])
+
+
+class _SendSession:
+    __slots__ = ("header", "chain_key", "counter", "created")
+
+    def __init__(self, header: dict, root: bytes):
+        self.header = header
+        self.chain_key = root
+        self.counter = 0
+        self.created = time.time()
+
+    def expired(self) -> bool:
+        return (self.counter >= MAX_SESSION_MESSAGES
+                or time.time() - self.created > SESSION_LIFETIME)
+
+
+class _RecvSession:
+    """
+    Receive chain of one session. Keys are worked out by key_for() without
+    touching the state; commit() applies them once the message has been
+    authenticated, so a forged message can't advance the chain.
+    """
+    __slots__ = ("chain_key", "next_counter", "skipped", "created")
+
+    def __init__(self, root: bytes):
+        self.chain_key = root
+        self.next_counter = 0
+        # counter -> message key, for out-of-order arrival; oldest first
+        self.skipped: "OrderedDict[int, bytes]" = OrderedDict()
+        self.created = time.time()
+
+    def key_for(self, counter: int):
+        """
+        (message key, keys skipped on the way, chain key after `counter`),
+        worked out without changing anything. Only a key skipped earlier is
+        read from the state (caller holds the manager lock); the chain
+        steps for a new counter are left to the returned `advance()`, which
+        runs without it.
+        """
+        if counter < self.next_counter:
+            key = self.skipped.get(counter)
+            if key is None:
+                raise SessionError("Session message replayed or too old")
+            return lambda: (key, [], None)
+
+        if counter - self.next_counter > MAX_SKIP:
+            raise SessionError("Session counter too far ahead")
+        chain_key, start = self.chain_key, self.next_counter
+
+        def advance():
+            ck, skipped = chain_key, []
+            for n in range(start, counter):
+                mk, ck = _step(ck)
+                skipped.append((n, mk))
+            mk, ck = _step(ck)
+            return mk, skipped, ck
+        return advance
+
+    def commit(self, counter: int, skipped, chain_key: Optional[bytes]) -> None:
+        """
+        Use up the key of `counter` (caller holds the manager lock). The
+        chain may have moved on since key_for(); the chain is deterministic,
+        so only the part still ahead of it is applied.
+        """
+        if counter < self.next_counter:
+            if self.skipped.pop(counter, None) is None:
+                raise SessionError("Session message replayed or too old")
+            return
+        for n, mk in skipped:
+            if n >= self.next_counter:
+                self.skipped[n] = mk
+        self.chain_key = chain_key
+        self.next_counter = counter + 1
+        while len(self.skipped) > MAX_SKIP:
+            self.skipped.popitem(last=False)
+
+
+class SessionManager:
+    """
+    Holds session state for one local device.
+
+    Usage:
+        sessions = SessionManager(my_id, keys.x25519_private, keys.ed25519_private)
+        bundle = sessions.encrypt(text, peer_id, peer["x25519_public"], "text")
+        text = sessions.decrypt(bundle, peer["x25519_public"], peer["ed25519_public"])
+    """
+
+    def __init__(self, my_id: str, x25519_private, ed25519_private):
+        self.my_id = my_id
+        self._x_priv = x25519_private
+        self._e_priv = ed25519_private
+        self._send: Dict[str, _SendSession] = {}
+        self._recv: Dict[bytes, _RecvSession] = {}
+        self._lock = threading.Lock()
+
+    # ----------------------------
+    # sender side
+    # ----------------------------
+    def _new_send_session(self, recipient_id: str, recipient_public_key) -> _SendSession:
+        recipient_pub = load_public_key(recipient_public_key)
+        eph_private, eph_public = generate_keypair()
+        eph_raw = serialize_public_key(eph_public)
+        session_id = os.urandom(16)
+
+        root = _root_key(
+            derive_shared_secret(eph_private, recipient_pub),
+            derive_shared_secret(self._x_priv, recipient_pub),
+            session_id, self.my_id, recipient_id,
+        )
+        signature = self._e_priv.sign(_transcript(session_id, eph_raw, self.my_id, recipient_id))
+
+        header = {
+            "id": b64e(session_id),
+            "ephemeral_pubkey": b64e(eph_raw),
+            "signature": b64e(signature),
+            "recipient_id": recipient_id,
+        }
+        return _SendSession(header, root)
+
+    def encrypt(self, content: str, recipient_id: str, recipient_public_key, content_type: str,
+                delta: bool = False, delta_base: bytes = None,
+                cipher: str = DEFAULT_CIPHER) -> dict:
+        with self._lock:
+            s = self._send.get(recipient_id)
+            if s is None or s.expired():
+                with tracing.span("session.handshake"):
+                    s = self._send[recipient_id] = self._new_send_session(
+                        recipient_id, recipient_public_key
+                    )
+            counter = s.counter
+            mk, s.chain_key = _step(s.chain_key)
+            s.counter += 1
+            header = s.header
+
+        with tracing.span("session.encrypt"):
+            metadata = create_metadata(self.my_id, content_type)
+            metadata["cipher"] = cipher
+            if tracing.is_enabled():
+                metadata["trace_id"] = tracing.current_trace_id() or tracing.new_trace_id()
+            payload = content.encode() if isinstance(content, str) else content
+            if delta:
+                payload, metadata["delta"] = encode_payload(payload, delta_base)
+            session = dict(header, counter=counter)
+            nonce, ct = aead_seal(cipher, payload, mk, _aad(metadata, session))
+
+        return {
+            "ciphertext": b64e(ct),  # ciphertext || tag
+            "nonce": b64e(nonce),
+            "metadata": metadata,
+            "session": session,
+        }
+
+    # ----------------------------
+    # receiver side
+    # ----------------------------
+    def _open_recv_session(self, session: dict, sender_id: str, sender_x25519_public,
+                           sender_signing_public, trace_id: Optional[str] = None) -> _RecvSession:
+        session_id = b64d(session["id"])
+        rs = self._recv.get(session_id)
+        if rs is not None:
+            return rs
+        with tracing.span("session.handshake", trace_id):
+            return self._new_recv_session(session, session_id, sender_id,
+                                          sender_x25519_public, sender_signing_public)
+
+    def _new_recv_session(self, session: dict, session_id: bytes, sender_id: str,
+                          sender_x25519_public, sender_signing_public) -> _RecvSession:
+        if session.get("recipient_id") != self.my_id:
+            raise SessionError("Session is addressed to another device")
+
+        eph_raw = b64d(session["ephemeral_pubkey"])
+        if isinstance(sender_signing_public, Ed25519PublicKey):
+            sender_pub = sender_signing_public
+        else:
+            sender_pub = Ed25519PublicKey.from_public_bytes(sender_signing_public)
+        sender_pub.verify(
+            b64d(session["signature"]),
+            _transcript(session_id, eph_raw, sender_id, self.my_id),
+        )
+
+        root = _root_key(
+            derive_shared_secret(self._x_priv, load_public_key(eph_raw)),
+            derive_shared_secret(self._x_priv, load_public_key(sender_x25519_public)),
+            session_id, sender_id, self.my_id,
+        )
+        if len(self._recv) >= MAX_RECV_SESSIONS:
+            oldest = min(self._recv, key=lambda k: self._recv[k].created)
+            del self._recv[oldest]
+        rs = self._recv[session_id] = _RecvSession(root)
+        return rs
+
+    def decrypt(self, bundle: dict, sender_x25519_public, sender_signing_public,
+                delta_base: bytes = None, seen=None) -> str:
+        """
+        `seen` is the receiver's duplicate cache, as for decrypt_bundle. It
+        also covers messages of sessions no longer held in memory (e.g.
+        after a restart), which the chain counters can't catch.
+        """
+        metadata = check_bundle(bundle, seen)
+        session = bundle.get("session")
+        if not (isinstance(session, dict) and isinstance(session.get("id"), str)
+                and isinstance(session.get("counter"), (int, str))):
+            raise BundleRejected("Malformed bundle: bad session header")
+        cipher = cipher_of(metadata)
+
+        trace_id = metadata.get("trace_id")
+        counter = int(session["counter"])
+        if counter < 0:
+            raise SessionError("Invalid session counter")
+        with self._lock:
+            rs = self._open_recv_session(
+                session, metadata["sender_id"], sender_x25519_public, sender_signing_public, trace_id
+            )
+            advance = rs.key_for(counter)
+        # the chain steps (up to MAX_SKIP) and the AEAD run outside the lock;
+        # nothing is kept unless the message authenticates
+        mk, skipped, chain_key = advance()
+
+        with tracing.span("session.decrypt", trace_id):
+            plaintext = aead_open(
+                cipher,
+                b64d(bundle["nonce"]),
+                sealed_ciphertext(bundle),
+                mk,
+                _aad(metadata, session),
+            )
+        with self._lock:
+            rs.commit(counter, skipped, chain_key)
+        remember(seen, metadata)
+
+        if "delta" in metadata:
+            plaintext = decode_payload(plaintext, metadata["delta"], delta_base)
+        return plaintext.decode()
+
+
+def is_session_bundle(bundle: dict) -> bool:
+    return "session" in bundle
+
+
+def session_mode_enabled() -> bool:
+    """
+    Senders use session mode when SCCSE_SESSIONS=1. Receivers always accept it.
+    """
+    return os.environ.get("SCCSE_SESSIONS", "") == "1"
+
+
+_default: Optional[SessionManager] = None
+_default_lock = threading.Lock()
+
+
+def get_session_manager(my_id: str, keys) -> SessionManager:
+    """
+    Process-wide SessionManager for this device (created on first use).
+    `keys` is a client.pairing.MyKeys.
+    """
+    global _default
+    with _default_lock:
+        if _default is None or _default.my_id != my_id:
+            _default = SessionManager(my_id, keys.x25519_private, keys.ed25519_private)
+        return _default
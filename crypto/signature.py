@@ -14,3 +14,10 @@ def sign_metadata(metadata: dict, private_key):
 def verify_metadata(metadata: dict, signature: bytes, public_key):
     data = json.dumps(metadata, sort_keys=True).encode()
     public_key.verify(signature, data)
+
+def relay_auth_message(device_id: str, challenge: str) -> bytes:
+    """
+    What a device signs to prove to a relay that it owns `device_id`
+    (see server/auth.py).
+    """
+    return b"|".join([b"sccse-relay-auth-v1", device_id.encode("utf-8"), challenge.encode("ascii")])
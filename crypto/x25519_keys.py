@@ -16,6 +16,9 @@ def serialize_public_key(public_key):
     )
 
 def load_public_key(raw_bytes):
+    # already-parsed keys are passed through unchanged
+    if isinstance(raw_bytes, X25519PublicKey):
+        return raw_bytes
     return X25519PublicKey.from_public_bytes(raw_bytes)
 
 def derive_shared_secret(private_key, peer_public_key):
@@ -0,0 +1,151 @@
+# server/app.py
+"""
+Launcher for the relay:
+
+    python -m server.app [--host 127.0.0.1] [--port 8000] [--workers 1]
+                         [--loop auto|asyncio|uvloop] [--http auto|h11|httptools]
+                         [--backlog 2048] [--keep-alive 5] [--graceful-timeout 10]
+                         [--drain-delay 0]
+
+Bundles, replay windows and auth tokens live in process memory, so workers
+can't share a port: an upload and the fetch for it would land on random
+workers. With --workers N the launcher instead starts N single-worker relays
+on --port, --port + 1, ... --port + N - 1, each a relay of its own. List
+them all in the client's SCCSE_RELAYS (uploads go to one, fetches ask every
+one), or put a proxy in front that sends each recipient id to a fixed port.
+
+Shutdown: on SIGTERM/SIGINT the relay first reports "draining" on /ready for
+--drain-delay seconds while still serving (so a load balancer stops sending
+new traffic), then stops accepting connections and gives in-flight requests
+up to --graceful-timeout seconds. A second signal exits at once.
+"""
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import signal
+import sys
+import threading
+
+import uvicorn
+
+from . import main as relay
+
+logger = logging.getLogger("sccse.relay")
+
+APP = "server.main:app"
+
+
+def _check_installed(option: str, value: str, module: str):
+    if value == module and importlib.util.find_spec(module) is None:
+        sys.exit(f"--{option} {value} needs the '{module}' package (pip install {module})")
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    uvicorn.Server that marks the relay as draining before shutting down.
+    """
+
+    def __init__(self, config: uvicorn.Config, drain_delay: float = 0):
+        super().__init__(config)
+        self.drain_delay = drain_delay
+
+    def handle_exit(self, sig, frame):
+        if self.drain_delay > 0 and not relay.is_draining():
+            relay.begin_drain()
+            logger.info("Draining for %ss before shutdown", self.drain_delay)
+            timer = threading.Timer(self.drain_delay, super().handle_exit, (sig, frame))
+            timer.daemon = True
+            timer.start()
+            return
+        relay.begin_drain()
+        super().handle_exit(sig, frame)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="python -m server.app", description="SCCSE relay server")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--workers", type=int, default=1,
+                   help="worker processes, one port each from --port up "
+                        "(each has its own in-memory store)")
+    p.add_argument("--loop", choices=("auto", "asyncio", "uvloop"), default="auto",
+                   help="event loop; 'auto' uses uvloop when installed")
+    p.add_argument("--http", choices=("auto", "h11", "httptools"), default="auto",
+                   help="HTTP parser; 'auto' uses httptools when installed")
+    p.add_argument("--backlog", type=int, default=2048,
+                   help="listen backlog (pending connections)")
+    p.add_argument("--keep-alive", type=int, default=5,
+                   help="seconds an idle keep-alive connection is kept open")
+    p.add_argument("--limit-concurrency", type=int, default=None,
+                   help="answer 503 above this many concurrent connections/tasks")
+    p.add_argument("--graceful-timeout", type=int, default=10,
+                   help="seconds to let in-flight requests finish on shutdown")
+    p.add_argument("--drain-delay", type=float, default=0,
+                   help="seconds /ready reports 'draining' before shutdown starts")
+    p.add_argument("--log-level", default="info")
+    return p.parse_args(argv)
+
+
+def _serve(options: dict, drain_delay: float):
+    logging.basicConfig(level=options["log_level"].upper(), format="%(levelname)s: %(message)s")
+    DrainingServer(uvicorn.Config(APP, **options), drain_delay=drain_delay).run()
+
+
+def _run_workers(workers: int, options: dict, drain_delay: float):
+    """
+    One single-worker relay per port, from options["port"] up; returns once
+    all have exited. SIGTERM is passed on to every worker; Ctrl-C reaches
+    them through the process group.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(target=_serve, name=f"relay-{options['port'] + i}",
+                    args=(dict(options, port=options["port"] + i), drain_delay))
+        for i in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    logger.info("Started %d relays on ports %d-%d; list them all in the clients' SCCSE_RELAYS",
+                workers, options["port"], options["port"] + workers - 1)
+
+    def forward(sig, frame):
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for proc in procs:
+        proc.join()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    _check_installed("loop", args.loop, "uvloop")
+    _check_installed("http", args.http, "httptools")
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s: %(message)s")
+    options = dict(
+        host=args.host,
+        port=args.port,
+        loop=args.loop,
+        http=args.http,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        limit_concurrency=args.limit_concurrency,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+        # per-request access logs cost more than the requests themselves
+        access_log=False,
+    )
+
+    if args.workers > 1:
+        _run_workers(args.workers, options, args.drain_delay)
+        return
+
+    DrainingServer(uvicorn.Config(APP, **options), drain_delay=args.drain_delay).run()
+
+
+if __name__ == "__main__":
+    main()
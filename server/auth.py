@@ -0,0 +1,278 @@
+# server/auth.py
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from crypto.signature import relay_auth_message
+
+# Mailbox ownership for /fetch.
+#
+# A device proves once that it holds its Ed25519 signing key and gets a
+# short-lived bearer token for its own mailbox. Every fetch after that
+# costs one dict lookup and one HMAC instead of a signature check:
+#
+#   POST /auth/{device_id}/challenge   -> random challenge, single use
+#   POST /auth/{device_id}/token       public key, challenge and an Ed25519
+#        signature over crypto.signature.relay_auth_message(device_id, challenge)
+#                                      -> token, valid for TOKEN_TTL seconds
+#   GET/DELETE /fetch/{device_id}      Authorization: Bearer <token>
+#
+# The first key that proves a device id is bound to it (trust on first
+# use); later proofs for that id must come from the same key. Clients claim
+# their id when they start. Bindings are kept in SQLite (SCCSE_RELAY_AUTH_DB),
+# so a restart doesn't hand unclaimed mailboxes to whoever logs in first, and
+# workers on the same host share them. Challenges and tokens live in process
+# memory like the bundles; after a restart clients get a 401 and log in again.
+# An operator can release a binding (a device that lost its key):
+#
+#   python -m server.auth release DEVICE_ID
+#
+# token = "<id>.<expires>.<mac>", mac = HMAC-SHA256(secret, "<id>.<expires>.<device_id>")
+# The MAC is compared in constant time. Issued tokens are also kept by id,
+# which bounds how many are live and lets /cleanup drop the expired ones.
+#
+# Challenges are handed to anyone, so both tables are bounded per device id
+# (a new one replaces that id's oldest) and, when full, drop the oldest
+# entry overall instead of refusing: a flood can't lock everyone out of
+# renewing their token. A client that loses a token gets a 401 and logs in
+# again.
+#
+#   SCCSE_RELAY_AUTH      "required" (default), or "off" to serve fetches without
+#                         a token (older clients; not safe on a shared relay)
+#   SCCSE_RELAY_AUTH_DB   key bindings (default server/data/auth.db)
+REQUIRED = os.environ.get("SCCSE_RELAY_AUTH", "required").lower() != "off"
+DB_PATH = os.environ.get("SCCSE_RELAY_AUTH_DB") or os.path.join(os.path.dirname(__file__), "data", "auth.db")
+TOKEN_TTL = 900  # seconds
+CHALLENGE_TTL = 60  # seconds
+MAX_TOKENS = 100_000
+MAX_CHALLENGES = 10_000
+MAX_TOKENS_PER_DEVICE = 4
+MAX_CHALLENGES_PER_DEVICE = 4
+MAX_DEVICES = 100_000
+
+_secret = os.urandom(32)
+_lock = threading.Lock()
+_keys: Dict[str, bytes] = {}  # device_id -> bound Ed25519 public key (cache of the db)
+_challenges: Dict[str, Tuple[str, float]] = {}  # challenge -> (device_id, expires)
+_tokens: Dict[str, Tuple[str, int]] = {}  # token id -> (device_id, expires)
+# device_id -> its challenges / token ids, oldest first
+_device_challenges: Dict[str, List[str]] = {}
+_device_tokens: Dict[str, List[str]] = {}
+
+
+class AuthError(Exception):
+    """
+    A challenge or token request is refused; `status` is the HTTP status.
+    """
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[str] = None
+
+
+def _db() -> sqlite3.Connection:
+    """
+    The bindings database (caller holds _lock); reopened if DB_PATH changed.
+    """
+    global _conn, _conn_path
+    if _conn is None or _conn_path != DB_PATH:
+        if _conn is not None:
+            _conn.close()
+        os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+        _conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS bindings (device_id TEXT PRIMARY KEY, public_key BLOB NOT NULL)"
+        )
+        _conn_path = DB_PATH
+        _keys.clear()
+    return _conn
+
+
+def _bound_key(device_id: str) -> Optional[bytes]:
+    key = _keys.get(device_id)
+    if key is None:
+        row = _db().execute("SELECT public_key FROM bindings WHERE device_id = ?", (device_id,)).fetchone()
+        if row is not None:
+            key = _keys[device_id] = row[0]
+    return key
+
+
+def _bind(device_id: str, public_key: bytes) -> bytes:
+    """
+    Bind `device_id` to `public_key` unless it is bound already (possibly
+    by another worker just now); returns the key it is bound to.
+    """
+    bound = _bound_key(device_id)
+    if bound is None:
+        conn = _db()
+        if conn.execute("SELECT COUNT(*) FROM bindings").fetchone()[0] >= MAX_DEVICES:
+            raise AuthError(507, "Too many devices")
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO bindings VALUES (?, ?)", (device_id, public_key))
+        _keys.pop(device_id, None)
+        bound = _bound_key(device_id)
+    return bound
+
+
+def _mac(token_id: str, expires: str, device_id: str) -> bytes:
+    return hmac.digest(_secret, f"{token_id}.{expires}.{device_id}".encode("utf-8"), "sha256").hex().encode()
+
+
+def _drop(table: Dict[str, tuple], index: Dict[str, List[str]], key: str):
+    entry = table.pop(key, None)
+    if entry is None:
+        return None
+    keys = index[entry[0]]
+    keys.remove(key)
+    if not keys:
+        del index[entry[0]]
+    return entry
+
+
+def _purge(table: Dict[str, tuple], index: Dict[str, List[str]], now: float) -> None:
+    for key in [k for k, (_, expires) in table.items() if expires < now]:
+        _drop(table, index, key)
+
+
+def _add(table: Dict[str, tuple], index: Dict[str, List[str]], key: str, device_id: str,
+         expires: float, per_device: int, limit: int) -> None:
+    """
+    Add an entry (caller holds _lock), making room by dropping the device's
+    oldest entry, then expired ones, then the oldest overall.
+    """
+    while len(index.get(device_id, ())) >= per_device:
+        _drop(table, index, index[device_id][0])
+    if len(table) >= limit:
+        _purge(table, index, time.time())
+        while len(table) >= limit:
+            _drop(table, index, next(iter(table)))
+    table[key] = (device_id, expires)
+    index.setdefault(device_id, []).append(key)
+
+
+def challenge(device_id: str) -> str:
+    """
+    A fresh single-use challenge for `device_id`.
+    """
+    value = os.urandom(16).hex()
+    with _lock:
+        _add(_challenges, _device_challenges, value, device_id, time.time() + CHALLENGE_TTL,
+             MAX_CHALLENGES_PER_DEVICE, MAX_CHALLENGES)
+    return value
+
+
+def issue(device_id: str) -> str:
+    """
+    A token for `device_id`, without any proof; login() calls this once
+    the proof checked out.
+    """
+    token_id = os.urandom(12).hex()
+    expires = int(time.time()) + TOKEN_TTL
+    with _lock:
+        _add(_tokens, _device_tokens, token_id, device_id, expires, MAX_TOKENS_PER_DEVICE, MAX_TOKENS)
+    return f"{token_id}.{expires}.{_mac(token_id, str(expires), device_id).decode()}"
+
+
+def login(device_id: str, public_key: bytes, challenge_value: str, signature: bytes) -> str:
+    """
+    Check a signed challenge and return a token. The first key to log in
+    as `device_id` is bound to it.
+    """
+    with _lock:
+        pending = _drop(_challenges, _device_challenges, challenge_value)
+        bound = _bound_key(device_id)
+    if pending is None or pending[0] != device_id or pending[1] < time.time():
+        raise AuthError(401, "Unknown or expired challenge")
+    if bound is not None and not hmac.compare_digest(bound, public_key):
+        raise AuthError(403, "Device id is bound to another key")
+
+    try:
+        Ed25519PublicKey.from_public_bytes(public_key).verify(
+            signature, relay_auth_message(device_id, challenge_value)
+        )
+    except (InvalidSignature, ValueError):
+        raise AuthError(401, "Bad signature")
+
+    with _lock:
+        bound = _bind(device_id, public_key)
+    if bound != public_key:  # another key won a concurrent first login
+        raise AuthError(403, "Device id is bound to another key")
+    return issue(device_id)
+
+
+def verify(device_id: str, token: str) -> bool:
+    """
+    Whether `token` is a live token for `device_id`.
+    """
+    parts = token.split(".")
+    if len(parts) != 3:
+        return False
+    token_id, expires, mac = parts
+    entry = _tokens.get(token_id)
+    if entry is None or entry[1] < time.time():
+        return False
+    return hmac.compare_digest(_mac(token_id, expires, device_id), mac.encode("utf-8"))
+
+
+def cleanup_expired() -> int:
+    """
+    Drop expired tokens and challenges. Returns how many were removed.
+    """
+    now = time.time()
+    with _lock:
+        before = len(_tokens) + len(_challenges)
+        _purge(_tokens, _device_tokens, now)
+        _purge(_challenges, _device_challenges, now)
+        return before - len(_tokens) - len(_challenges)
+
+
+def count() -> int:
+    return len(_tokens)
+
+
+def release(device_id: str) -> bool:
+    """
+    Forget the key bound to `device_id`; the next login binds anew.
+    """
+    with _lock:
+        conn = _db()
+        with conn:
+            removed = conn.execute("DELETE FROM bindings WHERE device_id = ?", (device_id,)).rowcount
+        _keys.pop(device_id, None)
+        for token_id in list(_device_tokens.get(device_id, ())):
+            _drop(_tokens, _device_tokens, token_id)
+    return bool(removed)
+
+
+def clear() -> None:
+    """
+    Drop what a restart loses: challenges, tokens and cached bindings.
+    """
+    with _lock:
+        _keys.clear()
+        _challenges.clear()
+        _tokens.clear()
+        _device_challenges.clear()
+        _device_tokens.clear()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3 or sys.argv[1] != "release":
+        sys.exit("Usage: python -m server.auth release DEVICE_ID")
+    if not release(sys.argv[2]):
+        sys.exit(f"{sys.argv[2]} is not bound")
+    print(f"Released {sys.argv[2]}; the next key to log in is bound to it")
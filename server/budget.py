@@ -0,0 +1,229 @@
+# server/budget.py
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from . import ttl_manager
+
+# Memory budget for stored bundles, in payload bytes (StoredBundle.size).
+#
+#   SCCSE_RELAY_MAX_BYTES            global budget, 0 = unlimited
+#   SCCSE_RELAY_MAX_RECIPIENT_BYTES  per-recipient budget, 0 = unlimited: bytes
+#                                    that may wait for one recipient, summed
+#                                    over their whole queue
+#   SCCSE_RELAY_EVICTION             what to do when the global budget is hit:
+#       "oldest"   evict the oldest bundles first
+#       "largest"  evict the largest bundles first
+#       "priority" evict by content type (see EVICTION_PRIORITY), oldest first
+#       "reject"   never evict live bundles; reject the upload with 507
+#
+# Expired bundles are always dropped before anything live is touched.
+MAX_BYTES = int(os.environ.get("SCCSE_RELAY_MAX_BYTES", str(256 * 1024 * 1024)))
+MAX_RECIPIENT_BYTES = int(os.environ.get("SCCSE_RELAY_MAX_RECIPIENT_BYTES", "0"))
+POLICY = os.environ.get("SCCSE_RELAY_EVICTION", "oldest").lower()
+
+POLICIES = ("oldest", "largest", "priority", "reject")
+if POLICY not in POLICIES:
+    raise ValueError(f"SCCSE_RELAY_EVICTION must be one of {', '.join(POLICIES)}")
+
+# Per-recipient overrides of MAX_RECIPIENT_BYTES (recipient_id -> bytes).
+RECIPIENT_BUDGETS: Dict[str, int] = {}
+
+# Lower number = evicted first under the "priority" policy.
+EVICTION_PRIORITY = {
+    "file": 0,
+    "text": 1,
+    "url": 1,
+    "password": 2,
+}
+
+# bounds for the Retry-After hint, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 300
+QUEUE_RETRY_AFTER = 60  # recipient's queue is full: wait for them to fetch
+
+_stats = {"evicted": 0, "evicted_bytes": 0, "rejected": 0}
+_stats_lock = threading.Lock()
+
+
+class OverBudget(Exception):
+    """
+    The bundle can't be stored.
+
+    `permanent` means it can never fit (larger than a budget), so retrying
+    is pointless; otherwise `retry_after` is a hint in seconds.
+    """
+
+    def __init__(self, detail: str, permanent: bool = False, retry_after: int = MIN_RETRY_AFTER):
+        super().__init__(detail)
+        self.detail = detail
+        self.permanent = permanent
+        self.retry_after = retry_after
+
+
+def recipient_budget(recipient_id: str) -> int:
+    """
+    Budget for one recipient, 0 if unlimited: how many bytes may wait for
+    them in total (see database.save_bundle_within).
+    """
+    return RECIPIENT_BUDGETS.get(recipient_id, MAX_RECIPIENT_BYTES)
+
+
+def _count(key: str, n: int = 1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def _eviction_key(policy: str):
+    if policy == "largest":
+        return lambda item: (-item[1].size, item[1].stored_at)
+    if policy == "priority":
+        return lambda item: (
+            EVICTION_PRIORITY.get(item[1].content_type, 1),
+            item[1].stored_at,
+        )
+    return lambda item: item[1].stored_at
+
+
+def evict(db, needed: int, policy: Optional[str] = None) -> int:
+    """
+    Evict live bundles by policy until at least `needed` bytes are freed
+    (or nothing is left).
+
+    Returns:
+        number of bytes freed.
+    """
+    policy = policy or POLICY
+    freed = 0
+    for rid, record in sorted(db.get_all_items(), key=_eviction_key(policy)):
+        if freed >= needed:
+            break
+        # skip bundles that were fetched or replaced in the meantime
+        if db.delete_bundle_if(rid, record):
+            freed += record.size
+            _count("evicted")
+            _count("evicted_bytes", record.size)
+    return freed
+
+
+def retry_after(db) -> int:
+    """
+    Seconds until the next stored bundle expires, i.e. when space frees up
+    on its own, clamped to [MIN_RETRY_AFTER, MAX_RETRY_AFTER].
+    """
+    now = time.time()
+    soonest = min(
+        (r.stored_at + ttl_manager.ttl_seconds(r.content_type, r.ttl) - now
+         for _, r in db.get_all_items()),
+        default=MIN_RETRY_AFTER,
+    )
+    return int(min(max(soonest, MIN_RETRY_AFTER), MAX_RETRY_AFTER))
+
+
+def size_limit(recipient_id: Optional[str] = None) -> int:
+    """
+    Largest body that could ever be stored (for `recipient_id`, if given),
+    0 if unlimited. Uploads are refused above it before they are read.
+    """
+    limits = [MAX_BYTES, recipient_budget(recipient_id) if recipient_id is not None else 0]
+    return min((n for n in limits if n), default=0)
+
+
+def check_size(recipient_id: str, size: int) -> None:
+    """
+    Raises a permanent OverBudget if a bundle of `size` bytes can never be
+    stored for this recipient (also used before a resumable upload starts).
+    """
+    limit = recipient_budget(recipient_id)
+    if limit and size > limit:
+        _count("rejected")
+        raise OverBudget(f"Bundle exceeds the per-recipient limit of {limit} bytes", permanent=True)
+    if MAX_BYTES and size > MAX_BYTES:
+        _count("rejected")
+        raise OverBudget(f"Bundle exceeds the relay limit of {MAX_BYTES} bytes", permanent=True)
+
+
+def store(db, recipient_id: str, record) -> None:
+    """
+    Store a bundle within the configured budgets.
+
+    When the global budget is full, expired bundles are dropped first, then
+    live ones are evicted according to POLICY.
+
+    The recipient's budget is never made room for by eviction: their queue
+    is theirs to drain.
+
+    Raises:
+        OverBudget if the bundle can't be stored, also when the recipient's
+        queue is full, by count or by their budget (retry once they have
+        fetched).
+    """
+    check_size(recipient_id, record.size)
+    try:
+        _store(db, recipient_id, record)
+    except db.QueueFull:
+        # expired bundles may be what fills the queue
+        ttl_manager.cleanup_expired(db)
+        try:
+            _store(db, recipient_id, record)
+        except db.QueueFull as e:
+            _count("rejected")
+            raise OverBudget(str(e), retry_after=QUEUE_RETRY_AFTER)
+
+
+def _store(db, recipient_id: str, record) -> None:
+    limit = recipient_budget(recipient_id)
+    if not MAX_BYTES:
+        db.save_bundle(recipient_id, record, limit)
+        return
+
+    if db.save_bundle_within(recipient_id, record, MAX_BYTES, limit):
+        return
+
+    ttl_manager.cleanup_expired(db)
+    if db.save_bundle_within(recipient_id, record, MAX_BYTES, limit):
+        return
+
+    if POLICY != "reject":
+        # a few rounds, in case concurrent uploads take the freed space
+        for _ in range(3):
+            evict(db, db.used_bytes() + record.size - MAX_BYTES)
+            if db.save_bundle_within(recipient_id, record, MAX_BYTES, limit):
+                return
+
+    _count("rejected")
+    raise OverBudget("Relay storage is full", retry_after=retry_after(db))
+
+
+def is_full(db) -> bool:
+    """
+    True if new uploads would be rejected for lack of space (only possible
+    with the "reject" policy; the others make room by evicting).
+    """
+    return POLICY == "reject" and bool(MAX_BYTES) and db.used_bytes() >= MAX_BYTES
+
+
+def stats(db) -> dict:
+    """
+    Current footprint and budget counters, for operators.
+    """
+    with _stats_lock:
+        counters = dict(_stats)
+    return {
+        "bundles": db.count(),
+        "used_bytes": db.used_bytes(),
+        "max_bytes": MAX_BYTES,
+        "max_recipient_bytes": MAX_RECIPIENT_BYTES,
+        "policy": POLICY,
+        **counters,
+    }
+
+
+def reset_stats() -> None:
+    """
+    Zero the counters (used by tests).
+    """
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
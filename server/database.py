@@ -1,40 +1,256 @@
 # server/database.py
-from datetime import datetime
-from typing import Dict, Tuple, List, Optional, Any
+import threading
+import time
+from typing import Dict, Tuple, List, Optional
 
-# recipient_id -> (bundle_dict, stored_at)
-_store: Dict[str, Tuple[Dict[str, Any], datetime]] = {}
+# The store is split into stripes. Each stripe has its own lock and its own
+# dict, so operations on different recipients don't contend, and every
+# operation on one recipient is atomic.
+#
+# Each recipient has a queue of pending bundles, oldest first, so bundles
+# sent back to back (a spool flush, an auto-send burst) are all delivered.
+# A full queue refuses new bundles (QueueFull) rather than dropping old ones.
+# A queue is full at MAX_PENDING bundles, or when the caller's per-recipient
+# byte limit would be exceeded; each queue keeps its own byte total for that.
+NUM_STRIPES = 64
+MAX_PENDING = 64  # bundles queued per recipient
 
 
-def save_bundle(recipient_id: str, bundle: Dict[str, Any]) -> None:
+class StoredBundle:
     """
-    Save (or overwrite) a bundle for the given recipient.
+    One stored bundle.
+
+    The relay never decrypts anything, so the request body is kept as the
+    raw bytes it arrived in and returned unchanged on fetch. Only the few
+    fields the relay needs (replay check, TTL, ranged fetch) are kept next
+    to it. `data` is bytes, or a read-only memoryview for bundles assembled
+    from a resumable upload.
+    """
+    __slots__ = ("data", "stored_at", "sender_id", "content_type", "ttl", "nonce")
+
+    def __init__(
+        self,
+        data: bytes,
+        sender_id: str,
+        content_type: str = "text",
+        ttl: Optional[float] = None,
+        stored_at: Optional[float] = None,
+        nonce: Optional[str] = None,
+    ):
+        self.data = data
+        self.sender_id = sender_id
+        self.content_type = content_type
+        self.ttl = ttl  # seconds, as requested by the sender (may be None)
+        self.stored_at = time.time() if stored_at is None else stored_at
+        self.nonce = nonce
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+class QueueFull(Exception):
+    """
+    The recipient already has MAX_PENDING bundles, or as many bytes as
+    their limit allows, waiting.
     """
-    _store[recipient_id] = (bundle, datetime.utcnow())
 
 
-def get_bundle_with_timestamp(
-    recipient_id: str,
-) -> Optional[Tuple[Dict[str, Any], datetime]]:
+class _Queue(list):
     """
-    Return (bundle, stored_at) for the recipient, or None if not found.
+    One recipient's pending bundles, oldest first, and their total size.
     """
-    return _store.get(recipient_id)
+    __slots__ = ("bytes",)
+
+    def __init__(self):
+        super().__init__()
+        self.bytes = 0
+
+
+# recipient_id -> pending StoredBundles (oldest first), one dict per stripe
+_shards: List[Dict[str, _Queue]] = [{} for _ in range(NUM_STRIPES)]
+_locks: List[threading.Lock] = [threading.Lock() for _ in range(NUM_STRIPES)]
+
+# Total payload bytes held across all stripes. Only changed while holding
+# the stripe lock of the bundle involved, then _usage_lock (always in that
+# order), so it is exact at every point in time.
+_used = 0
+_usage_lock = threading.Lock()
+
+
+def _stripe(recipient_id: str) -> int:
+    return hash(recipient_id) % NUM_STRIPES
+
+
+def _account(delta: int) -> None:
+    global _used
+    with _usage_lock:
+        _used += delta
+
+
+def _queue_for(i: int, recipient_id: str, size: int, max_recipient_bytes: int) -> _Queue:
+    queue = _shards[i].get(recipient_id)
+    if queue is None:
+        queue = _Queue()
+    if len(queue) >= MAX_PENDING:
+        raise QueueFull(f"{MAX_PENDING} bundles are already waiting for this recipient")
+    if max_recipient_bytes and queue.bytes + size > max_recipient_bytes:
+        raise QueueFull(
+            f"{queue.bytes} of this recipient's {max_recipient_bytes} bytes are already waiting"
+        )
+    return queue
+
+
+def _append(i: int, recipient_id: str, queue: _Queue, record: StoredBundle) -> None:
+    queue.append(record)
+    queue.bytes += record.size
+    _shards[i][recipient_id] = queue
+
+
+def _remove(i: int, recipient_id: str, queue: _Queue, n: int) -> StoredBundle:
+    record = queue.pop(n)
+    queue.bytes -= record.size
+    if not queue:
+        del _shards[i][recipient_id]
+    _account(-record.size)
+    return record
+
+
+def save_bundle(recipient_id: str, record: StoredBundle, max_recipient_bytes: int = 0) -> None:
+    """
+    Queue a bundle for the given recipient. Raises QueueFull, also when the
+    recipient would hold more than max_recipient_bytes (0 = no limit).
+    """
+    i = _stripe(recipient_id)
+    with _locks[i]:
+        queue = _queue_for(i, recipient_id, record.size, max_recipient_bytes)
+        _append(i, recipient_id, queue, record)
+        _account(record.size)
+
+
+def save_bundle_within(recipient_id: str, record: StoredBundle, max_bytes: int,
+                       max_recipient_bytes: int = 0) -> bool:
+    """
+    Queue a bundle only if total usage stays <= max_bytes.
+
+    The checks and the store are one atomic step, so concurrent uploads
+    can't overshoot either budget together. Returns True if stored; raises
+    QueueFull as save_bundle() does.
+    """
+    global _used
+    i = _stripe(recipient_id)
+    with _locks[i]:
+        queue = _queue_for(i, recipient_id, record.size, max_recipient_bytes)
+        with _usage_lock:
+            if _used + record.size > max_bytes:
+                return False
+            _used += record.size
+        _append(i, recipient_id, queue, record)
+        return True
+
+
+def get_bundle(recipient_id: str) -> Optional[StoredBundle]:
+    """
+    Return the recipient's oldest pending bundle, or None if there is none.
+
+    Does not remove the bundle; use pop_bundle() for one-time delivery.
+    """
+    i = _stripe(recipient_id)
+    with _locks[i]:
+        queue = _shards[i].get(recipient_id)
+        return queue[0] if queue else None
+
+
+def pop_bundle(recipient_id: str) -> Optional[StoredBundle]:
+    """
+    Atomically remove and return the recipient's oldest pending bundle.
+
+    Two concurrent callers can never both receive the same bundle.
+    """
+    i = _stripe(recipient_id)
+    with _locks[i]:
+        queue = _shards[i].get(recipient_id)
+        if not queue:
+            return None
+        return _remove(i, recipient_id, queue, 0)
 
 
 def delete_bundle(recipient_id: str) -> None:
     """
-    Delete bundle for this recipient if it exists.
+    Delete every pending bundle for this recipient.
+    """
+    i = _stripe(recipient_id)
+    with _locks[i]:
+        queue = _shards[i].pop(recipient_id, None)
+        if queue is not None:
+            _account(-queue.bytes)
+
+
+def delete_bundle_if(recipient_id: str, record: StoredBundle) -> bool:
+    """
+    Delete `record` from the recipient's queue if it is still there
+    (it may have been fetched, expired or evicted in the meantime).
+
+    Returns True if something was deleted.
+    """
+    i = _stripe(recipient_id)
+    with _locks[i]:
+        queue = _shards[i].get(recipient_id)
+        if not queue:
+            return False
+        for n, pending in enumerate(queue):
+            if pending is record:
+                _remove(i, recipient_id, queue, n)
+                return True
+        return False
+
+
+def recipient_bytes(recipient_id: str) -> int:
     """
-    _store.pop(recipient_id, None)
+    Payload bytes currently waiting for one recipient.
+    """
+    i = _stripe(recipient_id)
+    with _locks[i]:
+        queue = _shards[i].get(recipient_id)
+        return queue.bytes if queue else 0
 
 
-def get_all_items() -> List[Tuple[str, Dict[str, Any], datetime]]:
+def get_all_items() -> List[Tuple[str, StoredBundle]]:
     """
-    Return list of (recipient_id, bundle, stored_at) for all stored bundles.
+    Return list of (recipient_id, record) for all stored bundles.
     Used by the TTL manager during cleanup.
     """
-    return [
-        (rid, bundle, ts)
-        for rid, (bundle, ts) in _store.items()
-    ]
+    items = []
+    for shard, lock in zip(_shards, _locks):
+        with lock:
+            items.extend((rid, record) for rid, queue in shard.items() for record in queue)
+    return items
+
+
+def count() -> int:
+    """
+    Number of bundles currently stored.
+    """
+    total = 0
+    for shard, lock in zip(_shards, _locks):
+        with lock:
+            total += sum(len(queue) for queue in shard.values())
+    return total
+
+
+def used_bytes() -> int:
+    """
+    Total payload bytes currently stored (sum of StoredBundle.size).
+    """
+    with _usage_lock:
+        return _used
+
+
+def clear() -> None:
+    """
+    Remove everything (used by tests).
+    """
+    for shard, lock in zip(_shards, _locks):
+        with lock:
+            _account(-sum(queue.bytes for queue in shard.values()))
+            shard.clear()
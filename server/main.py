@@ -1,15 +1,28 @@
 # server/main.py
-from typing import Any, Dict
+import binascii
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, Mapping, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 
 from .schemas import (
-    Bundle,
+    AuthChallengeResponse,
+    AuthTokenRequest,
+    AuthTokenResponse,
+    BatchItemResult,
+    BatchUploadResponse,
     UploadResponse,
     CleanupResponse,
     HealthResponse,
+    ReadyResponse,
+    StatsResponse,
+    UploadSessionResponse,
 )
-from . import database, ttl_manager, replay_protection
+from . import auth, budget, database, ttl_manager, replay_protection, uploads
 
 app = FastAPI(
     title="Secure Clipboard Relay Server",
@@ -20,6 +33,43 @@ app = FastAPI(
     version="1.0.0",
 )
 
+# Headers a client sends with each bundle. Resumable uploads need them
+# before any data has arrived. The relay still takes its routing fields from
+# the body and refuses a body whose sender or nonce differs from the headers,
+# so a replayed body can't pass the replay check under a fresh header nonce.
+HEADER_SENDER = "x-sccse-sender"
+HEADER_NONCE = "x-sccse-nonce"
+HEADER_CONTENT_TYPE = "x-sccse-content-type"
+HEADER_TTL = "x-sccse-ttl"
+HEADER_LENGTH = "x-sccse-length"  # total bundle size, for resumable uploads
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)$")
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+MAX_BATCH_ITEMS = 500
+
+# Direct-path announcements (client/direct.py): device_id -> (body, stored_at).
+# They are signed by the device and verified by its peers; the relay only
+# keeps them, small and for a limited time.
+MAX_ANNOUNCEMENT_BYTES = 2048
+MAX_ANNOUNCEMENTS = 10000
+ANNOUNCEMENT_TTL = 900  # seconds
+_announcements: Dict[str, Tuple[bytes, float]] = {}
+
+BundleMeta = Tuple[Optional[str], Optional[str], str, Optional[float]]
+
+# Set when shutdown has begun (see server/app.py); /ready then reports 503.
+_draining = False
+
+
+def begin_drain() -> None:
+    global _draining
+    _draining = True
+
+
+def is_draining() -> bool:
+    return _draining
+
 
 def _extract_sender_and_nonce(bundle: Dict[str, Any]):
     """
@@ -37,28 +87,153 @@ def _extract_sender_and_nonce(bundle: Dict[str, Any]):
     return sender_id, nonce
 
 
+def _parse_ttl(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="ttl must be a number")
+
+
+def _extract_meta(headers: Mapping[str, str], body: bytes) -> BundleMeta:
+    """
+    Get (sender_id, nonce, content_type, ttl) for a bundle.
+
+    The JSON body is decoded once with json.loads (no model validation, no
+    copies kept). X-SCCSE-Sender / -Nonce headers, when sent, must match it.
+    """
+    meta = _body_meta(body)
+    _check_headers(meta, headers.get(HEADER_SENDER), headers.get(HEADER_NONCE))
+    return meta
+
+
+def _body_meta(body: bytes) -> BundleMeta:
+    try:
+        bundle = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON bundle")
+    if not isinstance(bundle, dict):
+        raise HTTPException(status_code=400, detail="Body must be a JSON bundle")
+    return _meta_from_bundle(bundle)
+
+
+def _check_headers(meta: BundleMeta, sender_id: Optional[str], nonce: Optional[str]) -> None:
+    if sender_id is not None and sender_id != meta[0]:
+        raise HTTPException(status_code=400, detail="X-SCCSE-Sender doesn't match the bundle")
+    if nonce is not None and nonce != meta[1]:
+        raise HTTPException(status_code=400, detail="X-SCCSE-Nonce doesn't match the bundle")
+
+
+def _meta_from_bundle(bundle: Dict[str, Any]) -> BundleMeta:
+    sender_id, nonce = _extract_sender_and_nonce(bundle)
+    meta = bundle.get("metadata") or {}
+    ctype = meta.get("content_type") or bundle.get("content_type") or "text"
+    return sender_id, nonce, str(ctype).lower(), _parse_ttl(meta.get("ttl"))
+
+
+async def _read_body(request: Request, limit: int) -> bytes:
+    """
+    The request body, or 413 as soon as it is known to be over `limit` bytes
+    (0 = no limit): from Content-Length before anything is read, otherwise
+    while a chunked body streams in, so an oversized upload is never held
+    in memory whole.
+    """
+    if not limit:
+        return await request.body()
+    length = request.headers.get("content-length")
+    if length is not None:
+        try:
+            declared = int(length)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        if declared > limit:
+            raise HTTPException(status_code=413, detail=f"Body exceeds the limit of {limit} bytes")
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=413, detail=f"Body exceeds the limit of {limit} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _store(recipient_id: str, record: database.StoredBundle, nonce: str) -> None:
+    """
+    Store within the memory budget. If the bundle is rejected, its nonce
+    is forgotten again so the sender can retry the same bundle later.
+    """
+    try:
+        budget.store(database, recipient_id, record)
+    except budget.OverBudget:
+        replay_protection.discard(record.sender_id, nonce)
+        raise
+
+
+def _over_budget_error(e: budget.OverBudget) -> HTTPException:
+    if e.permanent:
+        return HTTPException(status_code=413, detail=e.detail)
+    return HTTPException(
+        status_code=507, detail=e.detail, headers={"Retry-After": str(e.retry_after)}
+    )
+
+
 @app.get("/health", response_model=HealthResponse)
-def health() -> HealthResponse:
+async def health() -> HealthResponse:
     """
-    Simple endpoint to check that the server is running.
+    Liveness: the server is running. Also reports the store size.
     """
-    return HealthResponse(status="ok")
+    return HealthResponse(
+        status="ok", bundles=database.count(), used_bytes=database.used_bytes()
+    )
+
+
+@app.get("/ready", response_model=ReadyResponse)
+async def ready():
+    """
+    Readiness: whether new uploads should be sent here.
+
+    503 while shutting down ("draining"), or when the store is full and the
+    eviction policy rejects new uploads ("full").
+    """
+    if _draining:
+        status = "draining"
+    elif budget.is_full(database):
+        status = "full"
+    else:
+        status = "ready"
+    body = ReadyResponse(
+        status=status, bundles=database.count(), used_bytes=database.used_bytes()
+    )
+    return JSONResponse(body.model_dump(), status_code=200 if status == "ready" else 503)
 
 
 @app.post("/upload/{recipient_id}", response_model=UploadResponse)
-def upload_bundle(recipient_id: str, bundle: Bundle) -> UploadResponse:
+async def upload_bundle(recipient_id: str, request: Request) -> UploadResponse:
     """
     Receive an encrypted bundle for a given recipient.
 
+    The body is the JSON bundle described by schemas.Bundle, but the relay
+    treats it as opaque bytes.
+
     Steps:
-      1. Convert to raw dict (we accept arbitrary crypto fields).
-      2. Extract sender_id + nonce for replay protection.
-      3. If replay -> 409 error.
-      4. Save bundle in in-memory database.
+      0. Refuse a body larger than could ever be stored with 413, from
+         Content-Length before reading it, or while it streams in.
+      1. Read sender_id + nonce (+ content_type, ttl) from the body; 400 if
+         the X-SCCSE-* headers disagree with it.
+      2. Atomically check-and-record the nonce; if replay -> 409 error.
+      3. Store the raw body bytes in the in-memory database, within the
+         memory budget (see budget.py), behind any bundles already queued
+         for the recipient. If it doesn't fit: 413 when the bundle is too
+         large to ever fit, else 507 with Retry-After (also when the
+         recipient's queue is full).
+
+    Handlers are async and never await while touching the store, and every
+    store operation is atomic, so concurrent requests can't interleave.
     """
-    data = bundle.dict()
+    body = await _read_body(request, budget.size_limit(recipient_id))
 
-    sender_id, nonce = _extract_sender_and_nonce(data)
+    sender_id, nonce, content_type, ttl = _extract_meta(request.headers, body)
     if not sender_id or not nonce:
         # This forces the crypto code to provide proper metadata.
         raise HTTPException(
@@ -66,45 +241,453 @@ def upload_bundle(recipient_id: str, bundle: Bundle) -> UploadResponse:
             detail="metadata.sender_id and metadata.nonce are required",
         )
 
+    if not replay_protection.check_and_store(sender_id, nonce):
+        raise HTTPException(status_code=409, detail="Replay detected")
+
+    try:
+        record = database.StoredBundle(body, sender_id, content_type, ttl, nonce=nonce)
+        _store(recipient_id, record, nonce)
+    except budget.OverBudget as e:
+        raise _over_budget_error(e)
+    return UploadResponse(status="ok", stored_for=recipient_id)
+
+
+@app.post("/upload_batch", response_model=BatchUploadResponse)
+async def upload_batch(request: Request) -> BatchUploadResponse:
+    """
+    Receive many encrypted bundles, for any number of recipients, in one
+    request:
+
+        {"items": [{"recipient_id": "...", "bundle": {...}}, ...]}
+
+    Every item gets the same checks as /upload (required metadata, replay)
+    and its own result, in request order. One bad item doesn't fail the
+    others. Several items for one recipient are queued in order, like
+    separate /upload calls.
+
+    Items that don't fit the memory budget get status "full" (retry later)
+    or "too_large" (will never fit).
+    """
+    try:
+        items = json.loads(await _read_body(request, budget.size_limit()))["items"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail='Body must be {"items": [...]}')
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail='Body must be {"items": [...]}')
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_BATCH_ITEMS} items per batch"
+        )
+
+    results = []
+    for item in items:
+        recipient_id = item.get("recipient_id") if isinstance(item, dict) else None
+        bundle = item.get("bundle") if isinstance(item, dict) else None
+        if not isinstance(recipient_id, str) or not recipient_id or not isinstance(bundle, dict):
+            results.append(BatchItemResult(
+                status="invalid", detail="recipient_id and bundle are required",
+            ))
+            continue
+
+        try:
+            sender_id, nonce, content_type, ttl = _meta_from_bundle(bundle)
+        except HTTPException as e:
+            sender_id = nonce = None
+            detail = e.detail
+        else:
+            detail = "metadata.sender_id and metadata.nonce are required"
+        if not sender_id or not nonce:
+            results.append(BatchItemResult(
+                recipient_id=recipient_id, status="invalid", detail=detail
+            ))
+            continue
+
+        if not replay_protection.check_and_store(sender_id, nonce):
+            results.append(BatchItemResult(
+                recipient_id=recipient_id, nonce=nonce, status="replay",
+                detail="Replay detected",
+            ))
+            continue
+
+        record = database.StoredBundle(
+            json.dumps(bundle).encode(), sender_id, content_type, ttl, nonce=nonce
+        )
+        try:
+            _store(recipient_id, record, nonce)
+        except budget.OverBudget as e:
+            results.append(BatchItemResult(
+                recipient_id=recipient_id, nonce=nonce,
+                status="too_large" if e.permanent else "full", detail=e.detail,
+            ))
+            continue
+        results.append(BatchItemResult(recipient_id=recipient_id, nonce=nonce, status="ok"))
+
+    return BatchUploadResponse(
+        status="ok",
+        stored=sum(r.status == "ok" for r in results),
+        results=results,
+    )
+
+
+# ----------------------------
+# Mailbox authentication (see auth.py)
+# ----------------------------
+def _auth_error(e: auth.AuthError) -> HTTPException:
+    headers = {"WWW-Authenticate": "Bearer"} if e.status == 401 else None
+    return HTTPException(status_code=e.status, detail=e.detail, headers=headers)
+
+
+def _require_owner(recipient_id: str, request: Request) -> None:
+    """
+    401 unless the request carries a live token for this mailbox.
+    """
+    if not auth.REQUIRED:
+        return
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not auth.verify(recipient_id, token.strip()):
+        raise HTTPException(
+            status_code=401, detail="A token for this mailbox is required",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@app.post("/auth/{device_id}/challenge", response_model=AuthChallengeResponse)
+async def auth_challenge(device_id: str) -> AuthChallengeResponse:
+    """
+    Start proving ownership of a device id: sign the returned challenge.
+    """
+    try:
+        value = auth.challenge(device_id)
+    except auth.AuthError as e:
+        raise _auth_error(e)
+    return AuthChallengeResponse(challenge=value, expires_in=auth.CHALLENGE_TTL)
+
+
+@app.post("/auth/{device_id}/token", response_model=AuthTokenResponse)
+async def auth_token(device_id: str, body: AuthTokenRequest) -> AuthTokenResponse:
+    """
+    Exchange a signed challenge for a fetch token. The only signature
+    check in the fetch path; the token is then checked with an HMAC.
+    """
+    try:
+        public_key = binascii.a2b_base64(body.public_key)
+        signature = binascii.a2b_base64(body.signature)
+    except binascii.Error:
+        raise HTTPException(status_code=400, detail="Bad base64")
+    try:
+        token = auth.login(device_id, public_key, body.challenge, signature)
+    except auth.AuthError as e:
+        raise _auth_error(e)
+    return AuthTokenResponse(token=token, expires_in=auth.TOKEN_TTL)
+
+
+# ----------------------------
+# Resumable uploads (see uploads.py)
+# ----------------------------
+def _upload_session(upload_id: str) -> uploads.UploadSession:
+    session = uploads.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="No such upload (unknown or expired)")
+    return session
+
+
+@app.post("/uploads/{recipient_id}", response_model=UploadSessionResponse)
+async def create_upload(recipient_id: str, request: Request) -> UploadSessionResponse:
+    """
+    Open a resumable upload for one bundle.
+
+    Needs the X-SCCSE-Sender / -Nonce headers (plus -Content-Type and -TTL,
+    as for /upload) and X-SCCSE-Length, the total bundle size. Bundles that
+    could never fit the memory budget are refused here with 413, before any
+    data is sent.
+    """
+    headers = request.headers
+    sender_id, nonce = headers.get(HEADER_SENDER), headers.get(HEADER_NONCE)
+    if not sender_id or not nonce:
+        raise HTTPException(
+            status_code=400, detail="X-SCCSE-Sender and X-SCCSE-Nonce headers are required"
+        )
+    try:
+        size = int(headers.get(HEADER_LENGTH, ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-SCCSE-Length header is required")
     if replay_protection.is_replay(sender_id, nonce):
         raise HTTPException(status_code=409, detail="Replay detected")
 
-    replay_protection.store_nonce(sender_id, nonce)
+    try:
+        budget.check_size(recipient_id, size)
+        session = uploads.create(
+            recipient_id, sender_id, nonce, size,
+            (headers.get(HEADER_CONTENT_TYPE) or "text").lower(),
+            _parse_ttl(headers.get(HEADER_TTL)),
+        )
+    except budget.OverBudget as e:
+        raise _over_budget_error(e)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    return UploadSessionResponse(**session.status())
 
-    database.save_bundle(recipient_id, data)
-    return UploadResponse(status="ok", stored_for=recipient_id)
+
+@app.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def put_chunk(upload_id: str, request: Request) -> UploadSessionResponse:
+    """
+    Write one chunk. The body goes at the offset given by
+    `Content-Range: bytes <first>-<last>/<size>`. Chunks may arrive in any
+    order and may overlap (a retried chunk just overwrites the same bytes).
+    """
+    session = _upload_session(upload_id)
+    match = _CONTENT_RANGE.match(request.headers.get("content-range", ""))
+    if match is None:
+        raise HTTPException(status_code=400, detail="Content-Range: bytes first-last/size is required")
+    first, last, total = match.groups()
+    first, last = int(first), int(last)
+    if total != "*" and int(total) != session.size:
+        raise HTTPException(status_code=400, detail=f"Upload size is {session.size}")
+    if last - first + 1 > uploads.MAX_CHUNK:
+        raise HTTPException(status_code=413, detail=f"Chunks are at most {uploads.MAX_CHUNK} bytes")
+
+    body = await _read_body(request, last - first + 1)
+    if len(body) != last - first + 1:
+        raise HTTPException(status_code=400, detail="Body length doesn't match Content-Range")
+    try:
+        session.write(first, body)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    return UploadSessionResponse(**session.status())
+
+
+@app.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_status(upload_id: str) -> UploadSessionResponse:
+    """
+    Which byte ranges have arrived, so a client can resume after a drop.
+    """
+    return UploadSessionResponse(**_upload_session(upload_id).status())
+
+
+@app.post("/uploads/{upload_id}/commit", response_model=UploadResponse)
+async def commit_upload(upload_id: str) -> UploadResponse:
+    """
+    Store the assembled bundle, with the same replay and budget checks as
+    /upload. 409 while ranges are missing. 400 (and the session is dropped)
+    if the bundle's sender or nonce differs from the headers the session was
+    opened with. After a 507 the session is kept, so the commit can simply
+    be retried.
+
+    The session is sealed before the checks, so chunks arriving during or
+    after the commit get 409 instead of changing the stored bytes. As for
+    /upload, content_type and ttl are taken from the bundle itself.
+    """
+    session = _upload_session(upload_id)
+    try:
+        session.seal()
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    missing = session.missing()
+    if missing:
+        session.unseal()
+        raise HTTPException(
+            status_code=409, detail=f"Upload incomplete: {len(missing)} range(s) missing"
+        )
+    try:
+        meta = _body_meta(session.buffer)
+        _check_headers(meta, session.sender_id, session.nonce)
+    except HTTPException:
+        uploads.remove(upload_id)
+        raise
+    sender_id, nonce, content_type, ttl = meta
+
+    if not replay_protection.check_and_store(sender_id, nonce):
+        uploads.remove(upload_id)
+        raise HTTPException(status_code=409, detail="Replay detected")
+
+    # the buffer becomes the stored bundle as is, without a copy
+    record = database.StoredBundle(
+        memoryview(session.buffer).toreadonly(), sender_id, content_type, ttl, nonce=nonce,
+    )
+    try:
+        _store(session.recipient_id, record, nonce)
+    except budget.OverBudget as e:
+        if e.permanent:
+            uploads.remove(upload_id)
+        else:
+            session.unseal()
+        raise _over_budget_error(e)
+    uploads.remove(upload_id)
+    return UploadResponse(status="ok", stored_for=session.recipient_id)
+
+
+@app.delete("/uploads/{upload_id}", status_code=204)
+async def abort_upload(upload_id: str):
+    uploads.remove(upload_id)
+    return Response(status_code=204)
+
+
+# ----------------------------
+# Fetch
+# ----------------------------
+def _etag(record: database.StoredBundle) -> str:
+    key = f"{record.sender_id}|{record.nonce}|{record.stored_at}".encode()
+    return '"' + hashlib.sha256(key).hexdigest()[:16] + '"'
+
+
+def _parse_range(value: str, size: int) -> Tuple[int, int]:
+    """
+    (first, last) byte positions for a single `bytes=` range. Raises 416
+    if the range is malformed or outside the bundle.
+    """
+    match = _RANGE.match(value.strip())
+    if match is not None:
+        first, last = match.groups()
+        if first:
+            first = int(first)
+            last = min(int(last), size - 1) if last else size - 1
+        elif last:
+            first, last = max(size - int(last), 0), size - 1
+        else:
+            first = last = -1
+        if 0 <= first <= last:
+            return first, last
+    raise HTTPException(
+        status_code=416, detail="Range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"},
+    )
 
 
 @app.get("/fetch/{recipient_id}")
-def fetch_bundle(recipient_id: str):
+async def fetch_bundle(recipient_id: str, request: Request):
     """
-    Fetch the pending bundle for a recipient.
+    Fetch the oldest pending bundle for a recipient; fetch again for the
+    next one (see database.py).
 
     - If nothing stored: 404
-    - If expired: delete and return 410
-    - If valid: delete and return the raw JSON bundle
+    - If only expired ones: delete them and return 410
+    - Otherwise: delete and return the oldest live bundle, bytes exactly
+      as uploaded
+
+    The bundle is removed with a single atomic pop, so each bundle is
+    delivered at most once even under concurrent fetches.
+
+    With a `Range: bytes=...` header, only that part is returned (206) and
+    the bundle stays stored, so a dropped download can continue where it
+    stopped. The client then deletes it with DELETE /fetch/{id} and the
+    ETag as If-Match (or lets it expire). A range that covers the whole
+    bundle is answered like a plain fetch (200, bundle removed).
+
+    Needs a token for the mailbox (Authorization: Bearer, see auth.py).
     """
-    stored = database.get_bundle_with_timestamp(recipient_id)
-    if stored is None:
+    _require_owner(recipient_id, request)
+    range_header = request.headers.get("range")
+    if range_header is None:
+        expired = False
+        while True:
+            record = database.pop_bundle(recipient_id)
+            if record is None:
+                if expired:
+                    raise HTTPException(status_code=410, detail="Bundle expired")
+                raise HTTPException(status_code=404, detail="No bundle for this recipient")
+            if not ttl_manager.is_expired(record):
+                return Response(content=record.data, media_type="application/json")
+            expired = True
+
+    record = database.get_bundle(recipient_id)
+    if record is None:
         raise HTTPException(status_code=404, detail="No bundle for this recipient")
+    if ttl_manager.is_expired(record):
+        database.delete_bundle_if(recipient_id, record)
+        raise HTTPException(status_code=410, detail="Bundle expired")
 
-    bundle, stored_at = stored
+    etag = _etag(record)
+    if_match = request.headers.get("if-match")
+    if if_match is not None and if_match != etag:
+        raise HTTPException(status_code=412, detail="Bundle is no longer the oldest pending one")
+
+    first, last = _parse_range(range_header, record.size)
+    if first == 0 and last == record.size - 1:
+        if not database.delete_bundle_if(recipient_id, record):
+            raise HTTPException(status_code=404, detail="No bundle for this recipient")
+        return Response(content=record.data, media_type="application/json")
+
+    return Response(
+        content=memoryview(record.data)[first:last + 1],
+        status_code=206,
+        media_type="application/json",
+        headers={
+            "Content-Range": f"bytes {first}-{last}/{record.size}",
+            "ETag": etag,
+            "Accept-Ranges": "bytes",
+        },
+    )
+
+
+@app.delete("/fetch/{recipient_id}", status_code=204)
+async def ack_bundle(recipient_id: str, request: Request):
+    """
+    Remove a bundle after a ranged download. If-Match must carry the ETag
+    from the download, so a newer bundle is never deleted by mistake.
+    """
+    _require_owner(recipient_id, request)
+    record = database.get_bundle(recipient_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="No bundle for this recipient")
+    if request.headers.get("if-match") != _etag(record):
+        raise HTTPException(status_code=412, detail="Bundle is no longer the oldest pending one")
+    database.delete_bundle_if(recipient_id, record)
+    return Response(status_code=204)
+
+
+@app.get("/stats", response_model=StatsResponse)
+async def stats() -> StatsResponse:
+    """
+    Current memory footprint of stored bundles and the budget settings,
+    so operators can size hosts.
+    """
+    return StatsResponse(
+        **budget.stats(database),
+        uploads=uploads.count(),
+        upload_bytes=uploads.pending_bytes(),
+        tokens=auth.count(),
+    )
+
+
+@app.put("/announce/{device_id}", response_model=UploadResponse)
+async def announce(device_id: str, request: Request) -> UploadResponse:
+    """
+    Store a device's signed direct-path announcement (opaque to the relay).
+
+    Only the device itself may publish it: like a fetch, this needs a token
+    for `device_id`, so nobody can overwrite (and so disable) another
+    device's direct path or fill the table with made-up ids.
+    """
+    _require_owner(device_id, request)
+    body = await _read_body(request, MAX_ANNOUNCEMENT_BYTES)
+
+    now = time.time()
+    if device_id not in _announcements and len(_announcements) >= MAX_ANNOUNCEMENTS:
+        for key in [k for k, (_, ts) in _announcements.items() if now - ts > ANNOUNCEMENT_TTL]:
+            del _announcements[key]
+        if len(_announcements) >= MAX_ANNOUNCEMENTS:
+            raise HTTPException(status_code=507, detail="Too many announcements")
+    _announcements[device_id] = (body, now)
+    return UploadResponse(status="ok", stored_for=device_id)
 
-    if ttl_manager.is_expired(bundle, stored_at):
-        database.delete_bundle(recipient_id)
-        raise HTTPException(status_code=410, detail="Bundle expired")
 
-    # one-time delivery: delete then return
-    database.delete_bundle(recipient_id)
-    return bundle  # FastAPI returns this as JSON directly
+@app.get("/announce/{device_id}")
+async def get_announcement(device_id: str):
+    item = _announcements.get(device_id)
+    if item is None or time.time() - item[1] > ANNOUNCEMENT_TTL:
+        raise HTTPException(status_code=404, detail="No announcement for this device")
+    return Response(content=item[0], media_type="application/json")
 
 
 @app.post("/cleanup", response_model=CleanupResponse)
-def manual_cleanup() -> CleanupResponse:
+async def manual_cleanup() -> CleanupResponse:
     """
-    Manually trigger cleanup of expired bundles.
+    Manually trigger cleanup of expired bundles and upload sessions.
 
     (You could also schedule this as a background job.)
     """
     removed = ttl_manager.cleanup_expired(database)
-    return CleanupResponse(status="cleanup_done", removed=removed)
+    return CleanupResponse(
+        status="cleanup_done", removed=removed, uploads_removed=uploads.cleanup_expired(),
+        auth_removed=auth.cleanup_expired(),
+    )
@@ -1,27 +1,83 @@
 # server/replay_protection.py
-from collections import defaultdict, deque
-from typing import Deque, Dict
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Set, Tuple
 
 
 MAX_NONCES_PER_SENDER = 100  # keep last N nonces for each sender
+NUM_STRIPES = 64
 
-# sender_id -> deque of nonces
-_sender_nonces: Dict[str, Deque[str]] = defaultdict(
-    lambda: deque(maxlen=MAX_NONCES_PER_SENDER)
-)
+# sender_id -> (deque of nonces in arrival order, set of the same nonces)
+_Window = Tuple[Deque[str], Set[str]]
+_shards: List[Dict[str, _Window]] = [{} for _ in range(NUM_STRIPES)]
+_locks: List[threading.Lock] = [threading.Lock() for _ in range(NUM_STRIPES)]
+
+
+def _stripe(sender_id: str) -> int:
+    return hash(sender_id) % NUM_STRIPES
+
+
+def _window(shard: Dict[str, _Window], sender_id: str) -> _Window:
+    w = shard.get(sender_id)
+    if w is None:
+        w = shard[sender_id] = (deque(), set())
+    return w
 
 
 def is_replay(sender_id: str, nonce: str) -> bool:
     """
     Return True if we have already seen this nonce for this sender.
     """
-    return nonce in _sender_nonces[sender_id]
+    i = _stripe(sender_id)
+    with _locks[i]:
+        w = _shards[i].get(sender_id)
+        return w is not None and nonce in w[1]
 
 
 def store_nonce(sender_id: str, nonce: str) -> None:
     """
     Store a new nonce for a sender.
     """
-    dq = _sender_nonces[sender_id]
-    if nonce not in dq:
-        dq.append(nonce)
+    check_and_store(sender_id, nonce)
+
+
+def check_and_store(sender_id: str, nonce: str) -> bool:
+    """
+    Atomically record the nonce for this sender.
+
+    Returns:
+        True if the nonce is new (and is now stored),
+        False if it was already seen (a replay).
+    """
+    i = _stripe(sender_id)
+    with _locks[i]:
+        order, seen = _window(_shards[i], sender_id)
+        if nonce in seen:
+            return False
+        order.append(nonce)
+        seen.add(nonce)
+        if len(order) > MAX_NONCES_PER_SENDER:
+            seen.discard(order.popleft())
+        return True
+
+
+def discard(sender_id: str, nonce: str) -> None:
+    """
+    Forget a nonce that was recorded for an upload which was then not
+    stored (e.g. the relay was full), so the sender can retry it.
+    """
+    i = _stripe(sender_id)
+    with _locks[i]:
+        w = _shards[i].get(sender_id)
+        if w is not None and nonce in w[1]:
+            w[1].discard(nonce)
+            w[0].remove(nonce)
+
+
+def clear() -> None:
+    """
+    Forget every nonce (used by tests).
+    """
+    for shard, lock in zip(_shards, _locks):
+        with lock:
+            shard.clear()
@@ -1,5 +1,5 @@
 # server/schemas.py
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -7,12 +7,16 @@ class Bundle(BaseModel):
     """
     Generic bundle model.
 
+    Documents the shape of an upload body. The relay itself does not
+    validate bodies against this model: it stores them as opaque bytes and
+    only reads sender_id, nonce, content_type and ttl (see main._extract_meta).
+
     We don't fix fields here because the crypto code may add anything it wants.
     We only *expect* (but do not strictly enforce) that the JSON has:
         {
-          "ciphertext": "...",
+          "ciphertext": "...",          # ciphertext || auth tag
           "nonce": "...",               # AEAD nonce (optional, can also be inside metadata)
-          "tag": "...",                 # auth tag (optional)
+          "tag": "...",                 # separate auth tag (older clients only)
           "ephemeral_pubkey": "...",    # optional
           "metadata": {
               "sender_id": "...",
@@ -33,10 +37,72 @@ class UploadResponse(BaseModel):
     stored_for: str = Field(..., description="Recipient ID this bundle was stored for")
 
 
+class BatchItemResult(BaseModel):
+    recipient_id: Optional[str] = Field(None, description="Recipient ID of this item")
+    nonce: Optional[str] = Field(None, description="metadata.nonce of this item")
+    status: str = Field(..., description="'ok', 'replay', 'invalid', 'full' or 'too_large'")
+    detail: Optional[str] = Field(None, description="Reason when status is not 'ok'")
+
+
+class BatchUploadResponse(BaseModel):
+    status: str = Field(..., description="Status string, e.g. 'ok'")
+    stored: int = Field(..., description="Number of items stored")
+    results: List[BatchItemResult] = Field(..., description="Per-item results, in request order")
+
+
 class CleanupResponse(BaseModel):
     status: str = Field(..., description="Status string, e.g. 'cleanup_done'")
     removed: int = Field(..., description="Number of expired bundles removed")
+    uploads_removed: int = Field(0, description="Number of expired upload sessions removed")
+    auth_removed: int = Field(0, description="Number of expired fetch tokens and challenges removed")
+
+
+class AuthChallengeResponse(BaseModel):
+    challenge: str = Field(..., description="Single-use value to sign (see server/auth.py)")
+    expires_in: int = Field(..., description="Seconds the challenge stays valid")
+
+
+class AuthTokenRequest(BaseModel):
+    public_key: str = Field(..., description="Base64 Ed25519 public key of the device")
+    challenge: str = Field(..., description="Challenge from POST /auth/{device_id}/challenge")
+    signature: str = Field(..., description="Base64 Ed25519 signature over the auth message")
+
+
+class AuthTokenResponse(BaseModel):
+    token: str = Field(..., description="Bearer token for GET/DELETE /fetch/{device_id}")
+    token_type: str = Field("bearer", description="Always 'bearer'")
+    expires_in: int = Field(..., description="Seconds the token stays valid")
+
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str = Field(..., description="Id to PUT chunks to and commit")
+    size: int = Field(..., description="Total bundle size in bytes")
+    received: List[List[int]] = Field(..., description="Byte ranges received so far, as [start, end)")
+    complete: bool = Field(..., description="True when every byte has arrived")
+    expires_at: float = Field(..., description="Unix time after which the session is dropped")
+
+
+class StatsResponse(BaseModel):
+    bundles: int = Field(..., description="Number of bundles currently stored")
+    used_bytes: int = Field(..., description="Payload bytes currently stored")
+    max_bytes: int = Field(..., description="Global budget in bytes (0 = unlimited)")
+    max_recipient_bytes: int = Field(..., description="Default per-recipient budget in bytes (0 = unlimited)")
+    policy: str = Field(..., description="Eviction policy when the global budget is hit")
+    evicted: int = Field(..., description="Live bundles evicted so far")
+    evicted_bytes: int = Field(..., description="Payload bytes evicted so far")
+    rejected: int = Field(..., description="Uploads rejected for lack of space so far")
+    uploads: int = Field(0, description="Resumable upload sessions in progress")
+    upload_bytes: int = Field(0, description="Bytes reserved by upload sessions in progress")
+    tokens: int = Field(0, description="Fetch tokens issued and not yet cleaned up")
 
 
 class HealthResponse(BaseModel):
     status: str = Field(..., description="Server health status, e.g. 'ok'")
+    bundles: int = Field(..., description="Number of bundles currently stored")
+    used_bytes: int = Field(..., description="Payload bytes currently stored")
+
+
+class ReadyResponse(BaseModel):
+    status: str = Field(..., description="'ready', 'draining' or 'full'")
+    bundles: int = Field(..., description="Number of bundles currently stored")
+    used_bytes: int = Field(..., description="Payload bytes currently stored")
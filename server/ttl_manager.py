@@ -1,6 +1,7 @@
 # server/ttl_manager.py
-from datetime import datetime, timedelta
-from typing import Dict, Any, Protocol
+import time
+from datetime import timedelta
+from typing import Optional, Protocol
 
 # Time-to-live settings per content type
 TTL_MAP = {
@@ -10,35 +11,35 @@ TTL_MAP = {
     "file": timedelta(hours=2),
 }
 
+# same table in seconds, so the hot path doesn't touch datetime
+_TTL_SECONDS = {ctype: ttl.total_seconds() for ctype, ttl in TTL_MAP.items()}
 
-def _extract_content_type(bundle: Dict[str, Any]) -> str:
+
+def ttl_seconds(content_type: str, requested_ttl: Optional[float] = None) -> float:
     """
-    Try to find the content_type inside the bundle.
-
-    Expected:
-        bundle["metadata"]["content_type"]
-    Fallbacks:
-        bundle["content_type"]
-    Default:
-        "text"
+    Effective relay TTL for a bundle.
+
+    The per-type limit above is the upper bound; if the sender asked for a
+    shorter TTL (metadata.ttl), the bundle is dropped at that point instead,
+    because the receiver would reject it afterwards anyway.
     """
-    meta = bundle.get("metadata") or {}
-    ctype = meta.get("content_type") or bundle.get("content_type") or "text"
-    return str(ctype).lower()
+    ttl = _TTL_SECONDS.get(str(content_type).lower(), _TTL_SECONDS["text"])
+    if requested_ttl is not None and 0 < requested_ttl < ttl:
+        return requested_ttl
+    return ttl
 
 
-def is_expired(bundle: Dict[str, Any], stored_at: datetime) -> bool:
+def is_expired(record, now: Optional[float] = None) -> bool:
     """
-    Returns True if this bundle is past its TTL.
+    Returns True if this stored bundle is past its TTL.
     """
-    ctype = _extract_content_type(bundle)
-    ttl = TTL_MAP.get(ctype, TTL_MAP["text"])
-    return datetime.utcnow() > stored_at + ttl
+    now = time.time() if now is None else now
+    return now > record.stored_at + ttl_seconds(record.content_type, record.ttl)
 
 
 class DatabaseLike(Protocol):
     def get_all_items(self): ...
-    def delete_bundle(self, recipient_id: str): ...
+    def delete_bundle_if(self, recipient_id: str, record) -> bool: ...
 
 
 def cleanup_expired(db) -> int:
@@ -49,9 +50,11 @@ def cleanup_expired(db) -> int:
         number of deleted bundles.
     """
     removed = 0
+    now = time.time()
     # copy to list() so we can modify during iteration
-    for rid, bundle, ts in list(db.get_all_items()):
-        if is_expired(bundle, ts):
-            db.delete_bundle(rid)
+    for rid, record in list(db.get_all_items()):
+        # only delete the exact bundle we looked at; a fresh one may have
+        # been stored for the same recipient since get_all_items()
+        if is_expired(record, now) and db.delete_bundle_if(rid, record):
             removed += 1
     return removed
@@ -0,0 +1,222 @@
+# server/uploads.py
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from . import ttl_manager
+
+# Resumable uploads for large bundles.
+#
+# A client opens a session with the bundle's total size and routing fields,
+# PUTs chunks at any offsets (in any order, retrying after a dropped
+# connection), asks which byte ranges have arrived, and commits. Only then
+# is the bundle checked against replay protection and the memory budget and
+# stored like a normal upload.
+#
+# Sessions carry the bundle's content_type / ttl and a stored_at time, so
+# ttl_manager.is_expired() and ttl_manager.cleanup_expired(uploads) apply to
+# them exactly as to stored bundles.
+#
+#   SCCSE_RELAY_MAX_UPLOAD_BYTES   bytes held by open sessions, 0 = unlimited
+MAX_PENDING_BYTES = int(os.environ.get("SCCSE_RELAY_MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))
+MAX_SESSIONS = 1000
+MAX_CHUNK = 8 * 1024 * 1024  # bytes per PUT
+
+Range = Tuple[int, int]  # [start, end)
+
+
+class UploadError(Exception):
+    """
+    A session or chunk request can't be served; `status` is the HTTP status.
+    """
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class UploadSession:
+    """
+    One upload in progress. The buffer is allocated once at full size and
+    chunks are written into it in place.
+
+    A commit seals the session first. From then on write() refuses, so a
+    chunk still in flight can't change a bundle that has been checked and
+    stored (the stored record is a view of the buffer, not a copy).
+    """
+    __slots__ = ("upload_id", "recipient_id", "sender_id", "nonce", "content_type",
+                 "ttl", "stored_at", "buffer", "received", "sealed", "lock")
+
+    def __init__(self, upload_id: str, recipient_id: str, sender_id: str, nonce: str,
+                 size: int, content_type: str = "text", ttl: Optional[float] = None):
+        self.upload_id = upload_id
+        self.recipient_id = recipient_id
+        self.sender_id = sender_id
+        self.nonce = nonce
+        self.content_type = content_type
+        self.ttl = ttl
+        self.stored_at = time.time()
+        self.buffer = bytearray(size)
+        self.received: List[Range] = []  # sorted, non-overlapping, merged
+        self.sealed = False
+        self.lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self.buffer)
+
+    def write(self, offset: int, chunk) -> None:
+        end = offset + len(chunk)
+        if offset < 0 or end > self.size:
+            raise UploadError(416, f"Chunk outside 0-{self.size}")
+        with self.lock:
+            if self.sealed:
+                raise UploadError(409, "Upload is being committed")
+            self.buffer[offset:end] = chunk
+            self.received = _merge(self.received, (offset, end))
+
+    def seal(self) -> None:
+        """
+        Stop taking chunks, for a commit. Raises UploadError 409 if a
+        commit already has the session.
+        """
+        with self.lock:
+            if self.sealed:
+                raise UploadError(409, "Upload is being committed")
+            self.sealed = True
+
+    def unseal(self) -> None:
+        """
+        Take chunks again after a commit that can be retried (e.g. 507).
+        """
+        with self.lock:
+            self.sealed = False
+
+    def complete(self) -> bool:
+        with self.lock:
+            return self.received == [(0, self.size)] or self.size == 0
+
+    def missing(self) -> List[Range]:
+        with self.lock:
+            gaps, pos = [], 0
+            for start, end in self.received:
+                if start > pos:
+                    gaps.append((pos, start))
+                pos = end
+            if pos < self.size:
+                gaps.append((pos, self.size))
+            return gaps
+
+    def status(self) -> dict:
+        with self.lock:
+            received = [list(r) for r in self.received]
+        return {
+            "upload_id": self.upload_id,
+            "size": self.size,
+            "received": received,
+            "complete": self.complete(),
+            "expires_at": self.stored_at + ttl_manager.ttl_seconds(self.content_type, self.ttl),
+        }
+
+
+def _merge(ranges: List[Range], new: Range) -> List[Range]:
+    out = []
+    start, end = new
+    for a, b in ranges:
+        if b < start or a > end:
+            out.append((a, b))
+        else:
+            start, end = min(a, start), max(b, end)
+    out.append((start, end))
+    out.sort()
+    return out
+
+
+_sessions: Dict[str, UploadSession] = {}
+_lock = threading.Lock()
+
+
+def pending_bytes() -> int:
+    with _lock:
+        return sum(s.size for s in _sessions.values())
+
+
+def create(recipient_id: str, sender_id: str, nonce: str, size: int,
+           content_type: str = "text", ttl: Optional[float] = None) -> UploadSession:
+    """
+    Open a session for a bundle of `size` bytes.
+
+    Raises:
+        UploadError 507 when too many sessions or bytes are already open
+        (after expired sessions have been dropped).
+    """
+    if size < 0:
+        raise UploadError(400, "size must be >= 0")
+    for attempt in range(2):
+        with _lock:
+            used = sum(s.size for s in _sessions.values())
+            fits = len(_sessions) < MAX_SESSIONS and (
+                not MAX_PENDING_BYTES or used + size <= MAX_PENDING_BYTES
+            )
+            if fits:
+                session = UploadSession(os.urandom(16).hex(), recipient_id, sender_id,
+                                        nonce, size, content_type, ttl)
+                _sessions[session.upload_id] = session
+                return session
+        if attempt == 0:
+            cleanup_expired()
+    raise UploadError(507, "Too many uploads in progress")
+
+
+def get(upload_id: str) -> Optional[UploadSession]:
+    """
+    The session, or None if unknown or expired.
+    """
+    with _lock:
+        session = _sessions.get(upload_id)
+    if session is not None and ttl_manager.is_expired(session):
+        delete_bundle_if(upload_id, session)
+        return None
+    return session
+
+
+def remove(upload_id: str) -> Optional[UploadSession]:
+    with _lock:
+        return _sessions.pop(upload_id, None)
+
+
+# ttl_manager.cleanup_expired() interface
+def get_all_items() -> List[Tuple[str, UploadSession]]:
+    with _lock:
+        return list(_sessions.items())
+
+
+def delete_bundle_if(upload_id: str, session: UploadSession) -> bool:
+    with _lock:
+        if _sessions.get(upload_id) is not session:
+            return False
+        del _sessions[upload_id]
+        return True
+
+
+def cleanup_expired() -> int:
+    """
+    Drop expired sessions. Returns how many were dropped.
+    """
+    return ttl_manager.cleanup_expired(sys.modules[__name__])
+
+
+def count() -> int:
+    with _lock:
+        return len(_sessions)
+
+
+def clear() -> None:
+    """
+    Drop all sessions (used by tests).
+    """
+    with _lock:
+        _sessions.clear()
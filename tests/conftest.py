@@ -0,0 +1,35 @@
+import pytest
+
+from client import pairing, server_api
+from server import auth
+
+
+@pytest.fixture(autouse=True)
+def auth_db(tmp_path_factory, monkeypatch):
+    """
+    Relay key bindings in a fresh file per test, also for relays started
+    as subprocesses, so no test finds an id bound by another.
+    """
+    path = str(tmp_path_factory.mktemp("relay") / "auth.db")
+    monkeypatch.setenv("SCCSE_RELAY_AUTH_DB", path)
+    monkeypatch.setattr(auth, "DB_PATH", path)
+    auth.clear()
+    return path
+
+
+@pytest.fixture
+def my_keys(tmp_path, monkeypatch):
+    """
+    A fresh identity in a private key store, for tests that fetch through
+    server_api (fetching needs a token, and a token needs our signing key).
+    """
+    from client.pairing import generate_keys
+
+    monkeypatch.setattr(pairing, "KEYS_DB", str(tmp_path / "keys.db"))
+    monkeypatch.setattr(pairing, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(pairing, "_local", type(pairing._local)())
+    monkeypatch.setattr(server_api, "_tokens", {})
+    monkeypatch.setattr(server_api, "_claimed", {})
+    keys = generate_keys()
+    pairing.save_my_keys("me", keys)
+    return keys
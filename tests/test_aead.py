@@ -0,0 +1,98 @@
+import json
+import sqlite3
+
+import pytest
+
+from client import pairing
+from client.pairing import generate_keys
+from crypto import aead
+from crypto.hybrid_encrypt import decrypt_bundle, encrypt_bundle
+from crypto.session import SessionManager
+
+
+@pytest.mark.parametrize("cipher", list(aead.CIPHERS))
+def test_bundle_roundtrip_per_cipher(cipher):
+    alice, bob = generate_keys(), generate_keys()
+    bundle = encrypt_bundle("hello", alice.ed25519_private, bob.x25519_public,
+                            "alice", "text", cipher=cipher)
+    assert bundle["metadata"]["cipher"] == cipher
+    assert decrypt_bundle(bundle, bob.x25519_private, alice.ed25519_public) == "hello"
+
+    a = SessionManager("alice", alice.x25519_private, alice.ed25519_private)
+    b = SessionManager("bob", bob.x25519_private, bob.ed25519_private)
+    s = a.encrypt("stream", "bob", bob.x25519_public, "text", cipher=cipher)
+    assert b.decrypt(s, alice.x25519_public, alice.ed25519_public) == "stream"
+
+
+def test_cipher_field_is_authenticated():
+    alice, bob = generate_keys(), generate_keys()
+    bundle = encrypt_bundle("hello", alice.ed25519_private, bob.x25519_public,
+                            "alice", "text", cipher=aead.CHACHA20_POLY1305)
+    bundle["metadata"]["cipher"] = aead.AES_GCM
+    with pytest.raises(Exception):
+        decrypt_bundle(bundle, bob.x25519_private, alice.ed25519_public)
+
+    # bundles from older senders have no "cipher" field and are AES-GCM
+    old = encrypt_bundle("hello", alice.ed25519_private, bob.x25519_public, "alice", "text")
+    del old["metadata"]["cipher"]
+    assert aead.cipher_of(old["metadata"]) == aead.AES_GCM
+    with pytest.raises(ValueError):
+        aead.cipher_of({"cipher": "rot13"})
+
+
+def test_choose_uses_the_slower_end():
+    fast_aes = {aead.AES_GCM: 3000.0, aead.CHACHA20_POLY1305: 1000.0}
+    no_aesni = {aead.AES_GCM: 150.0, aead.CHACHA20_POLY1305: 600.0}
+    assert aead.choose(fast_aes, fast_aes) == aead.AES_GCM
+    assert aead.choose(no_aesni, fast_aes) == aead.CHACHA20_POLY1305
+    assert aead.choose(fast_aes, no_aesni) == aead.CHACHA20_POLY1305
+    # legacy peers and junk advertisements fall back to the default
+    assert aead.choose(None, no_aesni) == aead.AES_GCM
+    assert aead.choose({"rot13": 1e9, aead.CHACHA20_POLY1305: "fast"}, no_aesni) == aead.AES_GCM
+
+
+def test_local_speeds_are_cached(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(aead, "_local_speeds", {})
+    monkeypatch.setattr(aead, "benchmark", lambda: calls.append(1) or {c: 100.0 for c in aead.CIPHERS})
+    path = str(tmp_path / "aead_bench.json")
+
+    assert aead.local_speeds(path) == {c: 100.0 for c in aead.CIPHERS}
+    aead._local_speeds.clear()
+    aead.local_speeds(path)
+    assert len(calls) == 1
+
+    # another CPU / library version: measure again
+    with open(path) as f:
+        cached = json.load(f)
+    cached["fingerprint"] = "elsewhere"
+    with open(path, "w") as f:
+        json.dump(cached, f)
+    aead._local_speeds.clear()
+    aead.local_speeds(path)
+    assert len(calls) == 2
+
+
+def test_pairing_advertises_and_migrates(tmp_path, monkeypatch):
+    db = str(tmp_path / "keys.db")
+    conn = sqlite3.connect(db)
+    conn.executescript("""
+        CREATE TABLE peers (peer_id TEXT PRIMARY KEY, x25519_public BLOB NOT NULL,
+                            ed25519_public BLOB NOT NULL);
+        INSERT INTO peers VALUES ('old', x'00', x'00');
+    """)
+    conn.close()
+    monkeypatch.setattr(pairing, "KEYS_DB", db)
+    monkeypatch.setattr(pairing, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(pairing, "_local", type(pairing._local)())
+
+    assert pairing.load_peer("old")["aead"] is None
+
+    keys = generate_keys()
+    pairing.save_my_keys("me", keys)
+    bundle = pairing.export_my_public_bundle()
+    assert set(bundle["aead"]) == set(aead.CIPHERS)
+
+    pairing.import_peer_public_bundles([dict(bundle, my_id="new")])
+    assert pairing.load_peer("new")["aead"] == bundle["aead"]
+    assert pairing.cipher_for(pairing.load_peer("old")) == aead.AES_GCM
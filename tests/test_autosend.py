@@ -0,0 +1,64 @@
+import threading
+import time
+
+from client import autosend
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+        self.event = threading.Event()
+
+    def __call__(self, items):
+        self.calls.append(items)
+        self.event.set()
+
+
+def _burst(sender, values):
+    for text, ctype in values:
+        sender.push(text, ctype)
+
+
+def test_burst_sends_only_last_value():
+    rec = _Recorder()
+    sender = autosend.AutoSender(rec, debounce=0.05, policy="last")
+    _burst(sender, [(f"copy {i}", "text") for i in range(30)])
+    assert rec.event.wait(2)
+    time.sleep(0.1)
+    assert rec.calls == [[("copy 29", "text")]]
+
+
+def test_batch_packs_burst_and_keeps_passwords_apart():
+    rec = _Recorder()
+    sender = autosend.AutoSender(rec, debounce=0.05, policy="batch")
+    _burst(sender, [("a", "text"), ("pw1!secret", "password"), ("https://x", "url")])
+    assert rec.event.wait(2)
+    time.sleep(0.1)
+
+    [items] = rec.calls
+    assert items[0] == ("pw1!secret", "password")
+    packed, ctype = items[1]  # holds the last copy, so it is delivered last
+    assert ctype == autosend.MULTI
+    assert autosend.unpack(packed) == [("a", "text"), ("https://x", "url")]
+
+    assert autosend.coalesce([("a", "text"), ("pw", "password")], "batch") == [("a", "text"), ("pw", "password")]
+
+
+def test_max_wait_bounds_a_continuous_burst():
+    rec = _Recorder()
+    sender = autosend.AutoSender(rec, debounce=0.2, policy="last", max_wait=0.3)
+    t0 = time.monotonic()
+    while not rec.event.is_set() and time.monotonic() - t0 < 2:
+        sender.push(f"v{time.monotonic()}", "text")
+        time.sleep(0.02)
+    assert rec.event.is_set()
+    assert time.monotonic() - t0 < 0.6
+
+
+def test_received_content_is_not_echoed():
+    rec = _Recorder()
+    sender = autosend.AutoSender(rec, debounce=0.01)
+    sender.ignore("from peer")
+    sender.push("from peer", "text")
+    time.sleep(0.1)
+    assert rec.calls == []
@@ -0,0 +1,46 @@
+import pytest
+
+from client.pairing import generate_keys
+from crypto import aead
+from crypto.aes_gcm import aes_gcm_decrypt, aes_gcm_encrypt, aes_gcm_open_into, aes_gcm_seal_into
+from crypto.hybrid_encrypt import b64d, b64e, decrypt_bundle, encrypt_bundle
+
+
+def _keys():
+    return generate_keys(), generate_keys()
+
+
+@pytest.mark.parametrize("has_into", [True, False])
+def test_bytes_roundtrip_into_preallocated_buffer(monkeypatch, has_into):
+    # False: what cryptography < 47 (no encrypt_into/decrypt_into) runs
+    monkeypatch.setattr(aead, "HAS_INTO", has_into and aead.HAS_INTO)
+    alice, bob = _keys()
+    data = bytearray(b"\x00\xffpayload" * 1000)
+    bundle = encrypt_bundle(memoryview(data), alice.ed25519_private, bob.x25519_public, "alice", "file")
+    assert len(b64d(bundle["tag"])) == 16  # what older receivers read
+
+    out = bytearray(len(data) + 100)
+    view = decrypt_bundle(bundle, bob.x25519_private, alice.ed25519_public, raw=True, out=out)
+    assert isinstance(view, memoryview) and view.obj is out
+    assert view == data
+
+
+def test_bundles_with_tag_in_ciphertext_decrypt():
+    alice, bob = _keys()
+    bundle = encrypt_bundle("hello", alice.ed25519_private, bob.x25519_public, "alice", "text")
+    bundle["ciphertext"] = b64e(b64d(bundle["ciphertext"]) + b64d(bundle.pop("tag")))
+    assert decrypt_bundle(bundle, bob.x25519_private, alice.ed25519_public) == "hello"
+
+
+@pytest.mark.parametrize("has_into", [True, False])
+def test_aes_gcm_helpers(monkeypatch, has_into):
+    monkeypatch.setattr(aead, "HAS_INTO", has_into and aead.HAS_INTO)
+    key, data = bytes(32), b"payload" * 100
+    encrypted = aes_gcm_encrypt(data, key)
+    assert all(type(v) is bytes for v in encrypted.values())
+    assert aes_gcm_decrypt(encrypted["ciphertext"], encrypted["tag"], encrypted["nonce"], key) == data
+
+    sealed = bytearray(len(data) + 16)
+    nonce = aes_gcm_seal_into(data, key, sealed)
+    out = bytearray(len(data))
+    assert aes_gcm_open_into(nonce, sealed, key, out) == data and out == data
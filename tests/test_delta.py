@@ -0,0 +1,58 @@
+import os
+import random
+
+import pytest
+
+from client.pairing import generate_keys
+from crypto.delta import DeltaBaseMissing, apply_delta, make_delta
+from crypto.hybrid_encrypt import encrypt_bundle, decrypt_bundle
+
+
+def test_delta_roundtrip_random_edits():
+    rnd = random.Random(7)
+    for _ in range(200):
+        a = os.urandom(rnd.randint(0, 400))
+        b = bytearray(a)
+        for _ in range(rnd.randint(0, 6)):
+            i = rnd.randint(0, len(b))
+            b[i:i + rnd.randint(0, 12)] = os.urandom(rnd.randint(0, 12))
+        assert apply_delta(a, make_delta(a, bytes(b))) == bytes(b)
+
+
+def test_small_edit_to_large_document_sends_a_small_delta():
+    alice, bob = generate_keys(), generate_keys()
+    base = "\n".join(f"paragraph {i}: lorem ipsum dolor sit amet" for i in range(20000))
+    edited = base.replace("paragraph 12345:", "paragraph 12345 (edited):")
+
+    bundle = encrypt_bundle(edited, alice.ed25519_private, bob.x25519_public, "alice", "text",
+                            delta=True, delta_base=base.encode())
+    assert len(bundle["ciphertext"]) < 200
+
+    out = decrypt_bundle(bundle, bob.x25519_private, alice.ed25519_public, delta_base=base.encode())
+    assert out == edited
+
+    with pytest.raises(DeltaBaseMissing):
+        decrypt_bundle(bundle, bob.x25519_private, alice.ed25519_public, delta_base=b"stale")
+
+
+def test_resync_resends_with_the_original_content_type(tmp_path, monkeypatch):
+    pytest.importorskip("tkinter")
+    from types import SimpleNamespace
+
+    from client import delta_store, pairing
+    from client.ui import ClientUI
+
+    monkeypatch.setattr(pairing, "DATA_DIR", str(tmp_path))
+    delta_store.save_reference("bob", delta_store.SENT, b"https://example.org", "url")
+    assert delta_store.load_reference_with_type("bob", delta_store.SENT) == (b"https://example.org", "url")
+    assert delta_store.load_reference("bob", delta_store.SENT) == b"https://example.org"
+
+    built, toasts = [], []
+    ui = SimpleNamespace(
+        _build_bundle=lambda *args, **kwargs: built.append((args, kwargs)) or "bundle",
+        _deliver=lambda bundle, peer_id: None,
+        toast=toasts.append,
+    )
+    ClientUI._handle_control(ui, "bob", '{"type": "delta-resync"}')
+    assert built == [(("bob", "https://example.org", "url"), {"delta": True})]
+    assert toasts == ["Full copy re-sent to peer"]
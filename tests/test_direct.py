@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_startup import ROOT
+from client import direct
+from client.pairing import generate_keys
+from crypto.hybrid_encrypt import encrypt_bundle
+from crypto.x25519_keys import serialize_public_key
+
+# A second client process: listens, publishes its announcement, prints its
+# public keys, then prints every bundle it decrypts.
+RECEIVER = r"""
+import sys
+from client import direct
+from client.pairing import generate_keys
+from crypto.hybrid_encrypt import decrypt_bundle
+from crypto.x25519_keys import serialize_public_key
+
+keys = generate_keys()
+alice_sign = bytes.fromhex(sys.argv[1])
+
+def on_bundle(bundle):
+    print(decrypt_bundle(bundle, keys.x25519_private, alice_sign), flush=True)
+
+listener = direct.DirectListener(on_bundle, accept_sender=lambda sid: sid == "alice").start()
+direct.publish(direct.make_announcement("bob", listener.address, keys.ed25519_private))
+print(serialize_public_key(keys.x25519_public).hex(),
+      serialize_public_key(keys.ed25519_public).hex(), flush=True)
+sys.stdin.read()
+"""
+
+
+def test_direct_push_between_two_processes(tmp_path, monkeypatch):
+    alice = generate_keys()
+    monkeypatch.setenv("SCCSE_DISCOVERY_DIR", str(tmp_path))
+    env = dict(os.environ)
+    bob = subprocess.Popen(
+        [sys.executable, "-c", RECEIVER, serialize_public_key(alice.ed25519_public).hex()],
+        cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        bob_x, bob_sign = (bytes.fromhex(h) for h in bob.stdout.readline().split())
+
+        address = direct.verify_announcement(direct.lookup("bob"), "bob", bob_sign)
+        assert address is not None
+        # someone else's key doesn't verify the announcement
+        assert direct.verify_announcement(
+            direct.lookup("bob"), "bob", generate_keys().ed25519_public
+        ) is None
+
+        bundle = encrypt_bundle("hello over the LAN", alice.ed25519_private, bob_x, "alice", "text")
+        t = time.perf_counter()
+        assert direct.push(address, bundle)
+        elapsed_ms = (time.perf_counter() - t) * 1000
+        assert bob.stdout.readline().strip() == "hello over the LAN"
+        assert elapsed_ms < 100
+
+        # the same bundle is not taken twice
+        assert not direct.push(address, bundle)
+    finally:
+        bob.stdin.close()
+        bob.wait(timeout=10)
+
+    # receiver gone: fails fast so the caller can fall back to the relay
+    t = time.perf_counter()
+    assert not direct.push(address, bundle)
+    assert time.perf_counter() - t < 1
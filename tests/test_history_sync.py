@@ -0,0 +1,62 @@
+import json
+import os
+import time
+
+from client import history, history_sync
+
+
+def _entry(i):
+    return {"id": f"{i:016x}", "ts": 1_700_000_000 + i, "type": "text", "content": f"clip {i} " * 20}
+
+
+def _run(a_items, b_items):
+    """Exchange messages until done; returns (a_items, b_items, bytes sent)."""
+    sides = [a_items, b_items]
+    msg, turn, sent = history_sync.summary(a_items), 1, 0
+    while msg is not None:
+        sent += len(json.dumps(msg))
+        reply, entries = history_sync.handle(msg, sides[turn])
+        ids = {history.entry_id(i) for i in sides[turn]}
+        sides[turn] = sides[turn] + [e for e in entries if history.entry_id(e) not in ids]
+        msg, turn = reply, 1 - turn
+    return sides[0], sides[1], sent
+
+
+def _ids(items):
+    return {history.entry_id(i) for i in items}
+
+
+def test_sync_converges_and_cost_tracks_difference():
+    common = [_entry(i) for i in range(5000)]
+    a = common + [_entry(10_001), _entry(10_002)]
+    b = common + [_entry(20_001)]
+
+    a2, b2, sent = _run(a, b)
+    assert _ids(a2) == _ids(b2) == _ids(a) | _ids(b)
+
+    total = len(json.dumps(common))
+    assert sent < total / 20
+
+    # already in sync: only the fixed-size summary is sent
+    _, _, sent = _run(a2, b2)
+    assert sent == len(json.dumps(history_sync.summary(a2)))
+
+
+def test_sync_never_accepts_passwords():
+    bad = {"id": "x", "ts": time.time(), "type": "password", "content": "hunter2!"}
+    reply, entries = history_sync.handle(
+        {"type": history_sync.ENTRIES, "entries": [bad, _entry(1)], "want": []}, []
+    )
+    assert reply is None
+    assert entries == [_entry(1)]
+
+
+def test_merge_entries_keeps_newest_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(history, "HISTORY_FILE", os.path.join(tmp_path, "history.enc"))
+    monkeypatch.setattr(history, "HISTORY_KEY_FILE", os.path.join(tmp_path, "key.bin"))
+
+    mine = history.save_to_history("local", "text")
+    older, newer = _entry(1), dict(_entry(2), ts=time.time() + 60)
+    assert history.merge_entries([older, newer, mine]) == [older, newer]
+    assert [i["id"] for i in history.load_history()] == [newer["id"], mine["id"], older["id"]]
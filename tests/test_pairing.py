@@ -0,0 +1,128 @@
+import base64
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from client import pairing
+from client.pairing import generate_keys
+from crypto import aead
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(pairing, "KEYS_DB", str(tmp_path / "keys.db"))
+    monkeypatch.setattr(pairing, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(pairing, "_local", type(pairing._local)())
+    return tmp_path
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def _peer_bundle(peer_id):
+    keys = generate_keys()
+    return {
+        "my_id": peer_id,
+        "x25519_public": _b64(keys.x25519_public.public_bytes_raw()),
+        "ed25519_public": _b64(keys.ed25519_public.public_bytes_raw()),
+    }
+
+
+def _write_legacy(path):
+    keys = generate_keys()
+    legacy = {
+        "me": {
+            "my_id": "me",
+            "x25519_private": _b64(keys.x25519_private.private_bytes_raw()),
+            "x25519_public": _b64(keys.x25519_public.public_bytes_raw()),
+            "ed25519_private": _b64(keys.ed25519_private.private_bytes_raw()),
+            "ed25519_public": _b64(keys.ed25519_public.public_bytes_raw()),
+        },
+        "peers": {p["my_id"]: {k: p[k] for k in ("x25519_public", "ed25519_public")}
+                  for p in (_peer_bundle("alice"), _peer_bundle("bob"))},
+    }
+    with open(path / "keys.json", "w", encoding="utf-8") as f:
+        json.dump(legacy, f)
+    return legacy
+
+
+def test_legacy_keys_json_is_migrated_once(store):
+    legacy = _write_legacy(store)
+
+    assert pairing.load_all() == legacy
+    assert pairing.get_my_id() == "me"
+    assert not (store / "keys.json").exists() and (store / "keys.json.migrated").exists()
+
+    # a second run finds no keys.json; a stray one doesn't overwrite the store
+    pairing.save_peer("carol", b"x", b"e")
+    pairing._local.conns.clear()
+    assert pairing.list_peers() == ["alice", "bob", "carol"]
+    _write_legacy(store)
+    pairing._local.conns.clear()
+    assert pairing.load_all()["me"] == legacy["me"]
+    assert (store / "keys.json").exists()
+
+
+def test_migration_from_several_threads_runs_once(store):
+    legacy = _write_legacy(store)
+    results, errors = [], []
+    start = threading.Barrier(8)
+
+    def open_store():
+        try:
+            start.wait()
+            results.append(pairing.load_all())  # each thread opens its own connection
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=open_store) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert results == [legacy] * 8
+    assert (store / "keys.json.migrated").exists()
+
+
+def test_bulk_import_is_all_or_nothing(store):
+    good = [_peer_bundle(f"peer{i}") for i in range(3)]
+
+    with pytest.raises(KeyError):
+        pairing.import_peer_public_bundles(good + [{"my_id": "broken"}])
+    assert pairing.list_peers() == []
+
+    # a record the database refuses halfway through rolls back the rest
+    with pytest.raises(sqlite3.Error):
+        pairing.import_peer_public_bundles(good + [dict(good[0], my_id={"not": "an id"})])
+    assert pairing.list_peers() == []
+
+    assert pairing.import_peer_public_bundles(good) == 3
+    assert pairing.list_peers() == ["peer0", "peer1", "peer2"]
+
+
+def test_keys_and_peers_round_trip(store):
+    keys = generate_keys()
+    pairing.save_my_keys("me", keys)
+    loaded = pairing.load_my_keys()
+    assert pairing.get_my_id() == "me"
+    assert loaded.x25519_private.private_bytes_raw() == keys.x25519_private.private_bytes_raw()
+    assert loaded.ed25519_public.public_bytes_raw() == keys.ed25519_public.public_bytes_raw()
+
+    bob = _peer_bundle("bob")
+    pairing.import_peer_public_bundle(dict(bob, aead={aead.AES_GCM: 2.0, "bogus": 1.0}))
+    peer = pairing.load_peer("bob")
+    assert _b64(peer["x25519_public"]) == bob["x25519_public"]
+    assert _b64(peer["ed25519_public"]) == bob["ed25519_public"]
+    assert peer["aead"] == {aead.AES_GCM: 2.0}
+    assert pairing.load_peer("nobody") is None
+
+    revision = pairing.peer_revision("bob")
+    pairing.save_peer("bob", b"x", b"e")
+    assert pairing.peer_revision("bob") != revision
+    assert pairing.load_peer("bob")["aead"] is None
+    assert pairing.peer_revision("nobody") is None
@@ -0,0 +1,81 @@
+import sqlite3
+import time
+
+import pytest
+
+from client import pairing
+from client.pairing import generate_keys
+from crypto import peer_context
+from crypto.hybrid_encrypt import decrypt_bundle
+
+
+@pytest.fixture
+def paired(tmp_path, monkeypatch):
+    monkeypatch.setattr(pairing, "KEYS_DB", str(tmp_path / "keys.db"))
+    monkeypatch.setattr(pairing, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(pairing, "_local", type(pairing._local)())
+    peer_context.clear()
+
+    me, bob = generate_keys(), generate_keys()
+    pairing.save_my_keys("alice", me)
+    pairing.save_peer("bob", bob.x25519_public.public_bytes_raw(), bob.ed25519_public.public_bytes_raw())
+    yield me, bob
+    peer_context.clear()
+
+
+def _wait_full(ctx, timeout=5.0):
+    deadline = time.time() + timeout
+    while ctx.ready() < ctx.pool_size and time.time() < deadline:
+        time.sleep(0.005)
+    return ctx.ready()
+
+
+def test_prepared_pairs_are_used_once(paired):
+    me, bob = paired
+    ctx = peer_context.get("bob")
+    assert _wait_full(ctx) == peer_context.POOL_SIZE
+
+    bundles = [ctx.encrypt(f"msg {i}", "text") for i in range(3 * peer_context.POOL_SIZE)]
+    assert len({b["ephemeral_pubkey"] for b in bundles}) == len(bundles)
+    for i, b in enumerate(bundles):
+        assert decrypt_bundle(b, bob.x25519_private, me.ed25519_public) == f"msg {i}"
+
+    # refilled in the background after the burst
+    assert _wait_full(ctx) == peer_context.POOL_SIZE
+
+
+def test_stale_pairs_and_contexts_are_dropped(paired, monkeypatch):
+    me, bob = paired
+    ctx = peer_context.get("bob")
+    _wait_full(ctx)
+    prepared = list(ctx._pool)
+    monkeypatch.setattr(peer_context, "MAX_AGE", -1)
+    eph = ctx.take()[0]
+    assert eph not in {p[1] for p in prepared}
+
+    assert peer_context.get("bob") is ctx
+    # re-pairing bob invalidates the cached keys
+    bob2 = generate_keys()
+    pairing.save_peer("bob", bob2.x25519_public.public_bytes_raw(), bob2.ed25519_public.public_bytes_raw())
+    fresh = peer_context.get("bob")
+    assert fresh is not ctx
+    bundle = fresh.encrypt("hi", "text")
+    assert decrypt_bundle(bundle, bob2.x25519_private, me.ed25519_public) == "hi"
+
+
+def test_peer_re_paired_by_another_process_is_picked_up(paired):
+    me, bob = paired
+    ctx = peer_context.get("bob")
+
+    # the pairing CLI runs in its own process: nothing in this one is told
+    bob2 = generate_keys()
+    with sqlite3.connect(pairing.KEYS_DB) as other:
+        other.execute("UPDATE peers SET x25519_public = ?, ed25519_public = ? WHERE peer_id = 'bob'",
+                      (bob2.x25519_public.public_bytes_raw(), bob2.ed25519_public.public_bytes_raw()))
+    other.close()
+
+    fresh = peer_context.get("bob")
+    assert fresh is not ctx
+    bundle = fresh.encrypt("hi", "text")
+    assert decrypt_bundle(bundle, bob2.x25519_private, me.ed25519_public) == "hi"
+    assert peer_context.get("bob") is fresh
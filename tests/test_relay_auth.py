@@ -0,0 +1,195 @@
+import base64
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from client import server_api
+from crypto.signature import generate_signing_keys, relay_auth_message
+from server import auth, database, replay_protection
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+from server import main  # noqa: E402
+
+client = TestClient(main.app)
+
+
+def setup_function():
+    database.clear()
+    replay_protection.clear()
+    auth.clear()
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def _upload(rid):
+    bundle = {"ciphertext": "AA==", "metadata": {"sender_id": "alice", "nonce": os.urandom(8).hex()}}
+    assert client.post(f"/upload/{rid}", json=bundle).status_code == 200
+
+
+def _login(device_id, keys, challenge=None, message=None):
+    private, public = keys
+    if challenge is None:
+        challenge = client.post(f"/auth/{device_id}/challenge").json()["challenge"]
+    signature = private.sign(message or relay_auth_message(device_id, challenge))
+    return client.post(f"/auth/{device_id}/token", json={
+        "public_key": _b64(public.public_bytes_raw()), "challenge": challenge, "signature": _b64(signature),
+    })
+
+
+def _fetch(rid, token):
+    return client.get(f"/fetch/{rid}", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_fetch_needs_a_token_for_that_mailbox():
+    _upload("bob")
+    r = client.get("/fetch/bob")
+    assert r.status_code == 401 and r.headers["www-authenticate"] == "Bearer"
+
+    bob, mallory = generate_signing_keys(), generate_signing_keys()
+    token = _login("bob", bob).json()["token"]
+    assert _fetch("bob", _login("mallory", mallory).json()["token"]).status_code == 401
+    assert _fetch("bob", token).status_code == 200
+    assert _fetch("bob", token).status_code == 404  # the token stays good
+    assert client.get("/stats").json()["tokens"] == 2
+
+
+def test_login_checks_challenge_signature_and_binding():
+    bob = generate_signing_keys()
+    challenge = client.post("/auth/bob/challenge").json()["challenge"]
+    assert _login("bob", bob, challenge, message=b"something else").status_code == 401
+    # the failed attempt used up the challenge
+    assert _login("bob", bob, challenge).status_code == 401
+    assert _login("bob", bob, client.post("/auth/carol/challenge").json()["challenge"]).status_code == 401
+
+    assert _login("bob", bob).status_code == 200
+    # the id is now bound to bob's key
+    assert _login("bob", generate_signing_keys()).status_code == 403
+    assert _login("bob", bob).status_code == 200
+
+
+def test_bindings_survive_a_restart_until_released():
+    bob, mallory = generate_signing_keys(), generate_signing_keys()
+    assert _login("bob", bob).status_code == 200
+
+    auth.clear()  # what a restarted relay knows
+    assert _login("bob", mallory).status_code == 403
+    assert _login("bob", bob).status_code == 200
+
+    assert auth.release("bob") and not auth.release("bob")
+    assert _login("bob", mallory).status_code == 200
+
+
+def test_tampered_and_expired_tokens_are_refused():
+    _upload("bob")
+    token = _login("bob", generate_signing_keys()).json()["token"]
+    token_id, expires, mac = token.split(".")
+
+    for bad in (f"{token_id}.{int(expires) + 3600}.{mac}", f"{token_id}.{expires}.{'0' * len(mac)}",
+                f"{os.urandom(12).hex()}.{expires}.{mac}", "junk"):
+        assert _fetch("bob", bad).status_code == 401
+
+    auth._tokens[token_id] = ("bob", time.time() - 1)  # TOKEN_TTL went by
+    assert _fetch("bob", token).status_code == 401
+    assert client.post("/cleanup").json()["auth_removed"] == 1
+    assert client.get("/stats").json()["tokens"] == 0
+
+
+def test_challenge_and_token_floods_evict_instead_of_locking_out(monkeypatch):
+    monkeypatch.setattr(auth, "MAX_CHALLENGES", 50)
+    monkeypatch.setattr(auth, "MAX_TOKENS", 50)
+    bob, mallory = generate_signing_keys(), generate_signing_keys()
+
+    challenge = client.post("/auth/bob/challenge").json()["challenge"]
+    for i in range(200):
+        assert client.post(f"/auth/junk{i}/challenge").status_code == 200
+    for _ in range(10):
+        client.post("/auth/junk0/challenge")
+    assert len(auth._challenges) <= 50 and len(auth._device_challenges["junk0"]) == auth.MAX_CHALLENGES_PER_DEVICE
+    assert _login("bob", bob, challenge).status_code == 401  # flooded out: just ask again
+    token = _login("bob", bob).json()["token"]
+
+    # one self-claimed id logging in over and over only replaces its own tokens
+    for _ in range(100):
+        assert _login("mallory", mallory).status_code == 200
+    assert len(auth._device_tokens["mallory"]) == auth.MAX_TOKENS_PER_DEVICE
+    _upload("bob")
+    assert _fetch("bob", token).status_code == 200
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def relay(monkeypatch):
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    monkeypatch.setattr(server_api, "SERVER_URL", f"http://127.0.0.1:{port}")
+    monkeypatch.delenv("SCCSE_RELAYS", raising=False)
+    yield
+    server.should_exit = True
+    thread.join()
+
+
+def test_client_logs_in_once_and_again_after_relay_restart(relay, my_keys, monkeypatch):
+    logins = []
+    real = auth.login
+    monkeypatch.setattr(auth, "login", lambda *args: logins.append(1) or real(*args))
+
+    assert server_api.authenticate_all("me") == 1
+    for _ in range(3):
+        _upload("me")
+        assert server_api.fetch_bundle("me") is not None
+    assert len(logins) == 1
+
+    auth.clear()  # what a restarted relay knows
+    _upload("me")
+    assert server_api.fetch_bundle("me") is not None
+    assert len(logins) == 2
+
+
+def test_client_reports_a_mailbox_bound_to_another_key(relay, my_keys, monkeypatch):
+    assert _login("me", generate_signing_keys()).status_code == 200
+    _upload("me")
+    challenges = []
+    real = auth.challenge
+    monkeypatch.setattr(auth, "challenge", lambda *args: challenges.append(1) or real(*args))
+
+    for _ in range(2):
+        errors = []
+        assert server_api.fetch_all("me", errors) == []
+        assert [type(e) for _, e in errors] == [server_api.MailboxClaimed]
+    assert len(challenges) == 1  # not asked again right away
+    assert database.count() == 1
+
+
+def test_only_the_device_may_publish_its_announcement():
+    record = {"id": "bob", "addr": "10.0.0.1:7000"}
+    assert client.put("/announce/bob", json=record).status_code == 401
+    token = _login("bob", generate_signing_keys()).json()["token"]
+    mallory = _login("mallory", generate_signing_keys()).json()["token"]
+    assert client.put("/announce/bob", json=record,
+                      headers={"Authorization": f"Bearer {mallory}"}).status_code == 401
+    assert client.put("/announce/bob", json=record,
+                      headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    assert client.get("/announce/bob").json() == record
+
+
+def test_client_announces_with_its_token(relay, my_keys):
+    server_api.announce("me", {"id": "me", "addr": "10.0.0.2:7000"})
+    assert server_api.lookup_announcement("me") == {"id": "me", "addr": "10.0.0.2:7000"}
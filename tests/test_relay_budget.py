@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from server import auth, budget, database, replay_protection
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+from server.main import app  # noqa: E402
+
+client = TestClient(app)
+
+
+def _body(size, ctype="text", sender="alice"):
+    return json.dumps({
+        "ciphertext": "A" * size,
+        "metadata": {"sender_id": sender, "nonce": os.urandom(8).hex(), "content_type": ctype},
+    }).encode()
+
+
+def _upload(rid, body):
+    return client.post(f"/upload/{rid}", content=body)
+
+
+def _fetch(rid):
+    return client.get(f"/fetch/{rid}", headers={"Authorization": f"Bearer {auth.issue(rid)}"})
+
+
+@pytest.fixture(autouse=True)
+def _fresh(monkeypatch):
+    database.clear()
+    replay_protection.clear()
+    budget.reset_stats()
+    monkeypatch.setattr(budget, "MAX_BYTES", 10_000)
+    monkeypatch.setattr(budget, "MAX_RECIPIENT_BYTES", 0)
+
+
+def test_accounting_is_byte_exact():
+    bodies = {f"r{i}": _body(500 + i) for i in range(5)}
+    for rid, body in bodies.items():
+        assert _upload(rid, body).status_code == 200
+    assert database.used_bytes() == sum(len(b) for b in bodies.values())
+
+    # queueing a second bundle and fetching adjust the total
+    second = _body(10)
+    _upload("r0", second)
+    _fetch("r1")
+    del bodies["r1"]
+    stats = client.get("/stats").json()
+    assert stats["used_bytes"] == sum(len(b) for b in bodies.values()) + len(second)
+    assert stats["bundles"] == 5
+
+
+@pytest.mark.parametrize("policy, evicted", [
+    ("oldest", "r0"),
+    ("largest", "r1"),
+    ("priority", "r2"),
+])
+def test_eviction_policies(monkeypatch, policy, evicted):
+    monkeypatch.setattr(budget, "POLICY", policy)
+    _upload("r0", _body(3000))
+    _upload("r1", _body(3500))
+    _upload("r2", _body(2500, ctype="file"))
+
+    assert _upload("r3", _body(2000)).status_code == 200
+    assert database.get_bundle(evicted) is None
+    assert database.used_bytes() <= budget.MAX_BYTES
+    assert client.get("/stats").json()["evicted"] == 1
+
+
+def test_reject_policy_returns_507_and_allows_retry(monkeypatch):
+    monkeypatch.setattr(budget, "POLICY", "reject")
+    _upload("r0", _body(9000))
+
+    body = _body(2000)
+    r = _upload("r1", body)
+    assert r.status_code == 507
+    assert int(r.headers["Retry-After"]) >= 1
+
+    # once space frees up, the very same bundle is accepted (not a replay)
+    _fetch("r0")
+    assert _upload("r1", body).status_code == 200
+
+
+def test_oversized_bundles_are_413(monkeypatch):
+    monkeypatch.setattr(budget, "RECIPIENT_BUDGETS", {"small": 1000})
+    assert _upload("small", _body(2000)).status_code == 413
+    assert _upload("other", _body(2000)).status_code == 200
+    assert _upload("other", _body(20_000)).status_code == 413
+
+
+def test_full_queue_is_507_and_expired_bundles_are_skipped(monkeypatch):
+    monkeypatch.setattr(database, "MAX_PENDING", 2)
+    first, second = _body(10), _body(20)
+    assert _upload("r0", first).status_code == 200
+    assert _upload("r0", second).status_code == 200
+    r = _upload("r0", _body(30))
+    assert r.status_code == 507 and int(r.headers["Retry-After"]) >= 1
+    assert database.count() == 2
+
+    database.get_bundle("r0").stored_at -= 10 ** 6  # the oldest one expired
+    assert _fetch("r0").content == second
+    assert _fetch("r0").status_code == 404
+    assert database.used_bytes() == 0
+
+
+def test_recipient_budget_covers_the_whole_queue(monkeypatch):
+    monkeypatch.setattr(budget, "MAX_RECIPIENT_BYTES", 2000)
+    first = _body(800)
+    assert _upload("r0", first).status_code == 200
+    assert _upload("r0", _body(800)).status_code == 200
+    r = _upload("r0", _body(800))
+    assert r.status_code == 507 and int(r.headers["Retry-After"]) >= 1
+    assert database.recipient_bytes("r0") <= 2000
+    assert _upload("r1", _body(800)).status_code == 200  # others are unaffected
+
+    assert _fetch("r0").content == first
+    assert _upload("r0", _body(800)).status_code == 200
+    assert database.recipient_bytes("r0") == database.used_bytes() - database.recipient_bytes("r1")
+
+
+def test_oversized_bodies_are_refused_before_they_are_read(monkeypatch):
+    import httpx
+
+    streamed = []
+
+    async def chunks(n):
+        for _ in range(n):
+            streamed.append(1)
+            yield b"A" * 1000
+
+    async def post(path, content):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://relay") as c:
+            return await c.post(path, content=content)
+
+    # declared too large: refused from the header alone
+    assert asyncio.run(post("/upload/r0", b"A" * 20_000)).status_code == 413
+    # chunked, no Content-Length: cut off once past the limit
+    for path in ("/upload/r0", "/upload_batch"):
+        streamed.clear()
+        assert asyncio.run(post(path, chunks(100))).status_code == 413
+        assert len(streamed) < 20
+
+    monkeypatch.setattr(budget, "RECIPIENT_BUDGETS", {"small": 1000})
+    assert _upload("small", _body(2000)).status_code == 413
+    assert database.count() == 0
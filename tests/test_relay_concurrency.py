@@ -0,0 +1,122 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from server import auth, database, replay_protection
+
+httpx = pytest.importorskip("httpx")
+
+from server.main import app  # noqa: E402
+
+
+def _bundle(sender_id, nonce):
+    return {
+        "ciphertext": "AA==",
+        "metadata": {"sender_id": sender_id, "nonce": nonce, "content_type": "text"},
+    }
+
+
+def setup_function():
+    database.clear()
+    replay_protection.clear()
+
+
+def test_pop_is_exactly_once_across_threads():
+    recipients = [f"r{i}" for i in range(500)]
+    for rid in recipients:
+        database.save_bundle(rid, database.StoredBundle(rid.encode(), "alice"))
+
+    delivered = []
+    lock = threading.Lock()
+    start = threading.Barrier(16)
+
+    def worker():
+        start.wait()
+        for rid in recipients:
+            got = database.pop_bundle(rid)
+            if got is not None:
+                with lock:
+                    delivered.append(got.data.decode())
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(delivered) == sorted(recipients)
+
+
+def test_check_and_store_accepts_a_nonce_once_across_threads():
+    start = threading.Barrier(16)
+
+    def worker(_):
+        start.wait()
+        return sum(replay_protection.check_and_store("alice", f"n{i}") for i in range(50))
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        accepted = sum(pool.map(worker, range(16)))
+
+    assert accepted == 50
+
+
+def test_concurrent_fetches_deliver_each_bundle_once():
+    n_recipients = 200
+    fetches_per_recipient = 8
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://relay") as client:
+            uploads = await asyncio.gather(*[
+                client.post(f"/upload/r{i}", json=_bundle("alice", os.urandom(8).hex()))
+                for i in range(n_recipients)
+            ])
+            assert all(r.status_code == 200 for r in uploads)
+
+            tokens = {i: auth.issue(f"r{i}") for i in range(n_recipients)}
+            fetches = [
+                client.get(f"/fetch/r{i}", headers={"Authorization": f"Bearer {tokens[i]}"})
+                for i in range(n_recipients)
+                for _ in range(fetches_per_recipient)
+            ]
+            return await asyncio.gather(*fetches)
+
+    responses = asyncio.run(run())
+    ok = [r for r in responses if r.status_code == 200]
+    assert len(ok) == n_recipients
+    assert len({r.json()["metadata"]["nonce"] for r in ok}) == n_recipients
+    assert all(r.status_code == 404 for r in responses if r.status_code != 200)
+
+
+def test_concurrent_replays_are_rejected():
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://relay") as client:
+            return await asyncio.gather(*[
+                client.post(f"/upload/r{i}", json=_bundle("mallory", "same-nonce"))
+                for i in range(50)
+            ])
+
+    codes = [r.status_code for r in asyncio.run(run())]
+    assert codes.count(200) == 1
+    assert codes.count(409) == 49
+
+
+def test_replayed_body_under_fresh_headers_is_refused():
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://relay") as client:
+            body = _bundle("alice", "n1")
+            first = await client.post("/upload/bob", json=body,
+                                      headers={"X-SCCSE-Sender": "alice", "X-SCCSE-Nonce": "n1"})
+            forged = await client.post("/upload/bob", json=body,
+                                       headers={"X-SCCSE-Sender": "alice", "X-SCCSE-Nonce": "fresh"})
+            return first, forged
+
+    first, forged = asyncio.run(run())
+    assert first.status_code == 200
+    assert forged.status_code == 400
+    assert database.count() == 1
@@ -0,0 +1,150 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+from benchmarks.bench_startup import ROOT
+from client import relays, server_api
+
+
+def _bundle():
+    return {"ciphertext": "AA==", "metadata": {
+        "sender_id": "alice", "nonce": os.urandom(8).hex(),
+        "content_type": "text", "timestamp": time.time(), "ttl": 300}}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/ready", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+@pytest.fixture
+def three_relays(monkeypatch):
+    ports = [_free_port() for _ in range(3)]
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "server.app", "--port", str(port),
+                          "--log-level", "warning"], cwd=ROOT)
+        for port in ports
+    ]
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    try:
+        for url in urls:
+            _wait_ready(url)
+        monkeypatch.setenv("SCCSE_RELAYS", ",".join(urls))
+        yield urls, procs
+    finally:
+        for proc in procs:
+            proc.kill()
+            proc.wait()
+
+
+def test_scores_follow_rtt_and_errors():
+    pool = relays.RelayPool(["http://a", "http://b"])
+    assert pool.ranked() == ["http://a", "http://b"]  # config order until measured
+    for _ in range(3):
+        pool.record("http://a", True, 0.050)
+        pool.record("http://b", True, 0.010)
+    assert pool.ranked() == ["http://b", "http://a"]
+    pool.record("http://b", False)
+    assert pool.ranked() == ["http://a", "http://b"]
+    # back up: preferred again once its error average has decayed
+    pool.record("http://b", True, 0.010)
+    assert pool.ranked()[0] == "http://a"
+    for _ in range(6):
+        pool.record("http://b", True, 0.010)
+    assert pool.ranked()[0] == "http://b"
+
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status}", response=response)
+
+
+def test_one_failing_relay_does_not_cost_the_others_bundles(monkeypatch):
+    monkeypatch.setenv("SCCSE_RELAYS", "http://a,http://b")
+    bundle = _bundle()
+    pending = [bundle]
+
+    def fetch_bundle(recipient_id, relay):
+        if relay == "http://a":
+            raise _http_error(403)
+        return pending.pop() if pending else None  # deleted on b once returned
+
+    monkeypatch.setattr(server_api, "fetch_bundle", fetch_bundle)
+    errors = []
+    assert server_api.fetch_all("erin", errors) == [bundle]
+    assert [url for url, _ in errors] == ["http://a"]
+
+    # nothing came back: the refusal is raised, not taken for "no mail"
+    monkeypatch.setattr(server_api, "fetch_bundle", lambda rid, relay: fetch_bundle(rid, "http://a"))
+    with pytest.raises(requests.HTTPError):
+        server_api.fetch_all("erin")
+
+
+def test_failover_and_fetch_from_every_relay(three_relays, my_keys):
+    urls, procs = three_relays
+    pool = server_api.pool()
+    assert pool.urls == urls
+    pool.probe()
+
+    best = pool.ranked()[0]
+    server_api.send_bundle(_bundle(), "bob")
+    assert requests.get(f"{best}/health").json()["bundles"] == 1
+
+    # the best relay dies mid-run: the next upload fails over at once
+    victim = procs[urls.index(best)]
+    victim.kill()
+    victim.wait()
+    t0 = time.perf_counter()
+    server_api.send_bundle(_bundle(), "carol")
+    assert time.perf_counter() - t0 < 1.0
+    assert pool.ranked()[-1] == best
+
+    # mail for one recipient waiting on several relays is all collected
+    alive = [u for u in urls if u != best]
+    for url in alive:
+        b = _bundle()
+        requests.post(f"{url}/upload/erin", json=b).raise_for_status()
+    assert len(server_api.fetch_all("erin")) == 2
+    assert len(server_api.fetch_all("carol")) == 1
+    assert server_api.fetch_all("erin") == []
+
+
+def test_workers_are_relays_on_consecutive_ports(monkeypatch, my_keys):
+    port = _free_port()
+    launcher = subprocess.Popen([sys.executable, "-m", "server.app", "--port", str(port),
+                                 "--workers", "2", "--log-level", "warning"], cwd=ROOT)
+    urls = [f"http://127.0.0.1:{port}", f"http://127.0.0.1:{port + 1}"]
+    try:
+        for url in urls:
+            _wait_ready(url)
+        monkeypatch.setenv("SCCSE_RELAYS", ",".join(urls))
+        for url in urls:
+            requests.post(f"{url}/upload/erin", json=_bundle()).raise_for_status()
+        server_api.send_bundle(_bundle(), "erin")  # queued behind one of the two
+        assert len(server_api.fetch_all("erin")) == 3
+        assert server_api.fetch_all("erin") == []
+    finally:
+        launcher.terminate()
+        assert launcher.wait(timeout=20) == 0
+    for url in urls:
+        with pytest.raises(requests.ConnectionError):
+            requests.get(f"{url}/ready", timeout=1)
@@ -0,0 +1,29 @@
+import pytest
+
+from server import budget, database, main
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+client = TestClient(main.app)
+
+
+def setup_function():
+    database.clear()
+
+
+def test_ready_reflects_store_and_drain(monkeypatch):
+    assert client.get("/ready").status_code == 200
+
+    database.save_bundle("bob", database.StoredBundle(b"x" * 100, "alice"))
+    assert client.get("/health").json() == {"status": "ok", "bundles": 1, "used_bytes": 100}
+
+    monkeypatch.setattr(budget, "POLICY", "reject")
+    monkeypatch.setattr(budget, "MAX_BYTES", 100)
+    r = client.get("/ready")
+    assert (r.status_code, r.json()["status"]) == (503, "full")
+
+    monkeypatch.setattr(budget, "MAX_BYTES", 1000)
+    monkeypatch.setattr(main, "_draining", True)
+    r = client.get("/ready")
+    assert (r.status_code, r.json()["status"]) == (503, "draining")
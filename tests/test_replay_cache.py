@@ -0,0 +1,116 @@
+import copy
+import time
+
+import pytest
+from cryptography.exceptions import InvalidSignature
+
+from client.replay_cache import ReplayCache
+from crypto import hybrid_encrypt
+from crypto.hybrid_encrypt import BundleRejected, b64e, decrypt_bundle, encrypt_bundle
+from crypto.session import SessionManager
+from crypto.signature import generate_signing_keys, sign_metadata
+from crypto.x25519_keys import generate_keypair
+
+
+@pytest.fixture
+def keys():
+    bob_priv, bob_pub = generate_keypair()
+    sign_priv, sign_pub = generate_signing_keys()
+    return bob_priv, bob_pub, sign_priv, sign_pub
+
+
+@pytest.fixture
+def ecdh_calls(monkeypatch):
+    calls = []
+    real = hybrid_encrypt.derive_shared_secret
+
+    def counting(*args):
+        calls.append(1)
+        return real(*args)
+
+    monkeypatch.setattr(hybrid_encrypt, "derive_shared_secret", counting)
+    return calls
+
+
+def test_bad_bundles_are_rejected_before_key_agreement(keys, ecdh_calls, tmp_path):
+    bob_priv, bob_pub, sign_priv, sign_pub = keys
+    seen = ReplayCache(str(tmp_path / "seen.db"))
+    bundle = encrypt_bundle("hello", sign_priv, bob_pub, "alice", "text")
+    ecdh_calls.clear()
+
+    assert decrypt_bundle(bundle, bob_priv, sign_pub, seen=seen) == "hello"
+    assert len(ecdh_calls) == 1
+
+    expired = copy.deepcopy(bundle)
+    expired["metadata"]["timestamp"] -= 3600
+    expired["metadata"]["nonce"] = "ff" * 16
+    expired["signature"] = b64e(sign_metadata(expired["metadata"], sign_priv))
+    no_nonce = copy.deepcopy(bundle)
+    del no_nonce["metadata"]["nonce"]
+    short_key = copy.deepcopy(bundle)
+    short_key["metadata"]["nonce"] = "ee" * 16
+    short_key["ephemeral_pubkey"] = short_key["ephemeral_pubkey"][:8]
+
+    for bad, reason in ((bundle, "already received"), (expired, "expired"),
+                        (no_nonce, "nonce"), (short_key, "ephemeral_pubkey"), ("junk", "metadata")):
+        with pytest.raises(BundleRejected, match=reason):
+            decrypt_bundle(bad, bob_priv, sign_pub, seen=seen)
+
+    forged = copy.deepcopy(bundle)
+    forged["metadata"]["nonce"] = "00" * 16
+    with pytest.raises(InvalidSignature):
+        decrypt_bundle(forged, bob_priv, sign_pub, seen=seen)
+    assert len(ecdh_calls) == 1
+
+
+def test_only_authenticated_bundles_are_remembered(keys, tmp_path):
+    bob_priv, bob_pub, sign_priv, sign_pub = keys
+    path = str(tmp_path / "seen.db")
+    seen = ReplayCache(path)
+    bundle = encrypt_bundle("hello", sign_priv, bob_pub, "alice", "text")
+
+    # signed metadata, but a ciphertext that doesn't authenticate
+    tampered = dict(bundle, ciphertext=b64e(b"\x00" * 21))
+    with pytest.raises(Exception):
+        decrypt_bundle(tampered, bob_priv, sign_pub, seen=seen)
+    assert len(seen) == 0
+
+    assert decrypt_bundle(bundle, bob_priv, sign_pub, seen=seen) == "hello"
+    seen.close()
+
+    # survives a restart
+    reopened = ReplayCache(path)
+    with pytest.raises(BundleRejected):
+        decrypt_bundle(bundle, bob_priv, sign_pub, seen=reopened)
+
+
+def test_cache_is_bounded(tmp_path):
+    path = str(tmp_path / "seen.db")
+    seen = ReplayCache(path, max_entries=100)
+    now = time.time()
+    seen.add("alice", "old", now - 1)
+    for i in range(150):
+        seen.add("alice", f"n{i}", now + 300 + i)
+    assert len(seen) <= 100
+    assert ("alice", "old") not in seen
+    assert ("alice", "n149") in seen and ("alice", "n0") not in seen
+    seen.close()
+
+    reopened = ReplayCache(path, max_entries=100)
+    assert len(reopened) == len(seen)
+    assert ("alice", "n149") in reopened
+
+
+def test_session_replay_after_restart(keys, tmp_path):
+    bob_priv, bob_pub, _, _ = keys
+    alice_priv, alice_pub = generate_keypair()
+    alice_sign, alice_sign_pub = generate_signing_keys()
+    seen = ReplayCache(str(tmp_path / "seen.db"))
+
+    alice = SessionManager("alice", alice_priv, alice_sign)
+    bundle = alice.encrypt("hi", "bob", bob_pub, "text")
+    assert SessionManager("bob", bob_priv, None).decrypt(bundle, alice_pub, alice_sign_pub, seen=seen) == "hi"
+
+    # a fresh receiver has no session state; the cache still catches it
+    with pytest.raises(BundleRejected):
+        SessionManager("bob", bob_priv, None).decrypt(bundle, alice_pub, alice_sign_pub, seen=seen)
@@ -0,0 +1,201 @@
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from client import server_api
+from server import auth, database, main, replay_protection, uploads
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+client = TestClient(main.app)
+
+
+def setup_function():
+    database.clear()
+    replay_protection.clear()
+    uploads.clear()
+
+
+def _open(size, nonce="n1", ttl=None):
+    headers = {"X-SCCSE-Sender": "alice", "X-SCCSE-Nonce": nonce,
+               "X-SCCSE-Content-Type": "file", "X-SCCSE-Length": str(size)}
+    if ttl is not None:
+        headers["X-SCCSE-TTL"] = str(ttl)
+    return client.post("/uploads/bob", headers=headers)
+
+
+def _body(size, nonce="n1"):
+    # a bundle whose metadata matches the headers, padded to `size` bytes
+    body = json.dumps({"ciphertext": "", "metadata": {"sender_id": "alice", "nonce": nonce}})
+    return body.replace('""', '"' + "A" * (size - len(body)) + '"', 1).encode()
+
+
+def _put(upload_id, data, first, size):
+    return client.put(f"/uploads/{upload_id}", content=data, headers={
+        "Content-Range": f"bytes {first}-{first + len(data) - 1}/{size}"})
+
+
+def test_chunks_in_any_order_then_commit_and_ranged_fetch():
+    data = _body(1000)
+    upload_id = _open(len(data)).json()["upload_id"]
+
+    _put(upload_id, data[600:], 600, 1000)
+    _put(upload_id, data[:300], 0, 1000)
+    _put(upload_id, data[200:400], 200, 1000)  # overlapping retry
+    status = client.get(f"/uploads/{upload_id}").json()
+    assert status["received"] == [[0, 400], [600, 1000]] and not status["complete"]
+    assert client.post(f"/uploads/{upload_id}/commit").status_code == 409
+
+    assert _put(upload_id, data[400:600], 400, 1000).json()["complete"]
+    assert client.post(f"/uploads/{upload_id}/commit").json()["status"] == "ok"
+    assert client.get(f"/uploads/{upload_id}").status_code == 404
+    # the nonce is now used: the same bundle can't be opened again
+    assert _open(len(data)).status_code == 409
+
+    owner = {"Authorization": f"Bearer {auth.issue('bob')}"}
+    r = client.get("/fetch/bob", headers={**owner, "Range": "bytes=0-499"})
+    assert r.status_code == 206 and r.content == data[:500]
+    assert r.headers["content-range"] == "bytes 0-499/1000"
+    etag = r.headers["etag"]
+    assert client.get("/fetch/bob", headers={**owner, "Range": "bytes=1000-"}).status_code == 416
+    assert client.get("/fetch/bob", headers={**owner, "Range": "bytes=-100", "If-Match": '"x"'}).status_code == 412
+
+    r = client.get("/fetch/bob", headers={**owner, "Range": "bytes=500-", "If-Match": etag})
+    assert r.status_code == 206 and r.content == data[500:]
+    assert database.count() == 1  # ranged reads don't consume
+    assert client.delete("/fetch/bob", headers={**owner, "If-Match": etag}).status_code == 204
+    assert database.count() == 0
+
+
+def test_commit_refuses_a_bundle_that_doesnt_match_the_headers():
+    data = _body(500, nonce="other")
+    upload_id = _open(len(data)).json()["upload_id"]
+    _put(upload_id, data, 0, len(data))
+    r = client.post(f"/uploads/{upload_id}/commit")
+    assert r.status_code == 400 and "Nonce" in r.json()["detail"]
+    assert client.get(f"/uploads/{upload_id}").status_code == 404
+    assert database.count() == 0
+    assert _open(len(data)).status_code == 200  # n1 was never recorded
+
+
+def test_chunk_in_flight_during_commit_cant_change_the_stored_bundle():
+    data = _body(500)
+    upload_id = _open(len(data)).json()["upload_id"]
+    _put(upload_id, data, 0, len(data))
+    session = uploads.get(upload_id)  # what a PUT still reading its body holds
+
+    assert client.post(f"/uploads/{upload_id}/commit").status_code == 200
+    forged = data.replace(b'"alice"', b'"mallo"')
+    with pytest.raises(uploads.UploadError) as e:
+        session.write(0, forged)
+    assert e.value.status == 409
+
+    owner = {"Authorization": f"Bearer {auth.issue('bob')}"}
+    assert client.get("/fetch/bob", headers=owner).content == data
+
+
+def test_commit_takes_content_type_and_ttl_from_the_bundle():
+    body = json.dumps({"ciphertext": "AA==", "metadata": {
+        "sender_id": "alice", "nonce": "n1", "content_type": "password", "ttl": 30}}).encode()
+    upload_id = _open(len(body), ttl=3600).json()["upload_id"]  # headers say file, 1 h
+    _put(upload_id, body, 0, len(body))
+    assert client.post(f"/uploads/{upload_id}/commit").status_code == 200
+    record = database.get_bundle("bob")
+    assert (record.content_type, record.ttl) == ("password", 30)
+
+
+def test_full_range_is_a_plain_fetch():
+    database.save_bundle("bob", database.StoredBundle(b'{"a": 1}', "alice", nonce="x"))
+    owner = {"Authorization": f"Bearer {auth.issue('bob')}"}
+    r = client.get("/fetch/bob", headers={**owner, "Range": "bytes=0-1048575"})
+    assert r.status_code == 200 and r.json() == {"a": 1}
+    assert database.count() == 0
+
+
+def test_partial_sessions_expire():
+    upload_id = _open(100, ttl=5).json()["upload_id"]
+    _put(upload_id, b"x" * 50, 0, 100)
+    assert client.get("/stats").json()["upload_bytes"] == 100
+
+    uploads.get(upload_id).stored_at -= 10
+    assert client.post("/cleanup").json()["uploads_removed"] == 1
+    assert client.get(f"/uploads/{upload_id}").status_code == 404
+    assert client.get("/stats").json()["uploads"] == 0
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def relay(monkeypatch):
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    monkeypatch.setattr(server_api, "SERVER_URL", f"http://127.0.0.1:{port}")
+    yield
+    server.should_exit = True
+    thread.join()
+
+
+def test_client_resumes_over_flaky_link(relay, my_keys, monkeypatch):
+    import requests
+
+    monkeypatch.setattr(server_api, "RESUMABLE_THRESHOLD", 10_000)
+    monkeypatch.setattr(server_api, "CHUNK_SIZE", 4096)
+    monkeypatch.setattr(server_api, "_backoff", lambda attempt: None)
+
+    calls = {"n": 0, "dropped": 0}
+    real = requests.Session.request
+
+    def flaky(self, method, url, *args, **kwargs):
+        # every fourth chunk request is lost on the way
+        if method in ("PUT", "GET") and ("/uploads/" in url or "Range" in (kwargs.get("headers") or {})):
+            calls["n"] += 1
+            if calls["n"] % 4 == 0:
+                calls["dropped"] += 1
+                raise requests.ConnectionError("link dropped")
+        return real(self, method, url, *args, **kwargs)
+
+    monkeypatch.setattr(requests.Session, "request", flaky)
+
+    bundle = {"ciphertext": os.urandom(30_000).hex(),
+              "metadata": {"sender_id": "alice", "nonce": "big", "content_type": "file", "ttl": 300}}
+    assert server_api.send_bundle(bundle, "bob")["status"] == "ok"
+    assert server_api.fetch_bundle("bob") == json.loads(json.dumps(bundle))
+    assert database.count() == 0
+    assert calls["dropped"] >= 6  # drops on both the upload and the download
+
+
+def test_client_reports_an_expired_session(relay, monkeypatch):
+    import requests
+
+    monkeypatch.setattr(server_api, "_backoff", lambda attempt: None)
+    real = requests.Session.request
+
+    def expire(self, method, url, *args, **kwargs):
+        # the session times out on the relay while the link is down
+        if method == "PUT":
+            uploads.clear()
+            raise requests.ConnectionError("link dropped")
+        return real(self, method, url, *args, **kwargs)
+
+    monkeypatch.setattr(requests.Session, "request", expire)
+
+    body = _body(1000)
+    headers = server_api._relay_headers({"sender_id": "alice", "nonce": "n1", "content_type": "file"})
+    with pytest.raises(requests.HTTPError) as e:
+        server_api.send_resumable(body, "bob", headers, server_api.SERVER_URL)
+    assert e.value.response.status_code == 404
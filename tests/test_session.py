@@ -0,0 +1,120 @@
+import random
+import threading
+
+import pytest
+
+from client import tracing
+from client.pairing import generate_keys
+from crypto import session
+from crypto.session import MAX_SKIP, SessionManager, SessionError
+
+
+def _pair():
+    alice, bob = generate_keys(), generate_keys()
+    a = SessionManager("alice", alice.x25519_private, alice.ed25519_private)
+    b = SessionManager("bob", bob.x25519_private, bob.ed25519_private)
+    return alice, bob, a, b
+
+
+def test_session_roundtrip_and_out_of_order():
+    alice, bob, a, b = _pair()
+    bundles = [a.encrypt(f"msg {i}", "bob", bob.x25519_public, "text") for i in range(5)]
+
+    # one handshake for the whole stream
+    assert len({x["session"]["id"] for x in bundles}) == 1
+
+    for i in (3, 0, 4, 1, 2):
+        assert b.decrypt(bundles[i], alice.x25519_public, alice.ed25519_public) == f"msg {i}"
+
+
+def test_session_rejects_replay_and_tampering():
+    alice, bob, a, b = _pair()
+    first = a.encrypt("hello", "bob", bob.x25519_public, "text")
+    b.decrypt(first, alice.x25519_public, alice.ed25519_public)
+
+    with pytest.raises(SessionError):
+        b.decrypt(first, alice.x25519_public, alice.ed25519_public)
+
+    second = a.encrypt("world", "bob", bob.x25519_public, "text")
+    second["metadata"]["content_type"] = "url"
+    with pytest.raises(Exception):
+        b.decrypt(second, alice.x25519_public, alice.ed25519_public)
+
+    # a failed message doesn't burn its key
+    second["metadata"]["content_type"] = "text"
+    assert b.decrypt(second, alice.x25519_public, alice.ed25519_public) == "world"
+
+
+def test_session_header_must_be_signed_by_sender():
+    alice, bob, a, b = _pair()
+    mallory = generate_keys()
+    bundle = a.encrypt("hi", "bob", bob.x25519_public, "text")
+    with pytest.raises(Exception):
+        b.decrypt(bundle, alice.x25519_public, mallory.ed25519_public)
+
+
+def test_forged_message_far_ahead_leaves_the_chain_alone():
+    alice, bob, a, b = _pair()
+    bundles = [a.encrypt(f"msg {i}", "bob", bob.x25519_public, "text") for i in range(3)]
+    b.decrypt(bundles[0], alice.x25519_public, alice.ed25519_public)
+    [rs] = b._recv.values()
+    state = (rs.chain_key, rs.next_counter, dict(rs.skipped))
+
+    forged = dict(bundles[2], session=dict(bundles[2]["session"], counter=MAX_SKIP))
+    with pytest.raises(Exception):
+        b.decrypt(forged, alice.x25519_public, alice.ed25519_public)
+    assert (rs.chain_key, rs.next_counter, dict(rs.skipped)) == state
+
+    assert b.decrypt(bundles[2], alice.x25519_public, alice.ed25519_public) == "msg 2"
+    assert b.decrypt(bundles[1], alice.x25519_public, alice.ed25519_public) == "msg 1"
+
+
+def test_skipped_keys_are_pruned_oldest_first(monkeypatch):
+    monkeypatch.setattr(session, "MAX_SKIP", 4)
+    alice, bob, a, b = _pair()
+    bundles = [a.encrypt(f"msg {i}", "bob", bob.x25519_public, "text") for i in range(10)]
+    b.decrypt(bundles[4], alice.x25519_public, alice.ed25519_public)
+    b.decrypt(bundles[9], alice.x25519_public, alice.ed25519_public)  # skips 5-8
+    [rs] = b._recv.values()
+    assert list(rs.skipped) == [5, 6, 7, 8]
+    with pytest.raises(SessionError):
+        b.decrypt(bundles[0], alice.x25519_public, alice.ed25519_public)
+    assert b.decrypt(bundles[6], alice.x25519_public, alice.ed25519_public) == "msg 6"
+
+
+def test_concurrent_decrypts_each_succeed_once():
+    alice, bob, a, b = _pair()
+    bundles = [a.encrypt(f"msg {i}", "bob", bob.x25519_public, "text") for i in range(200)]
+    random.Random(3).shuffle(bundles)
+    out = []
+
+    def run(part):
+        for x in part:
+            out.append(b.decrypt(x, alice.x25519_public, alice.ed25519_public))
+
+    threads = [threading.Thread(target=run, args=(bundles[i::4],)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(out) == sorted(f"msg {i}" for i in range(200))
+    for x in bundles[:5]:
+        with pytest.raises(SessionError):
+            b.decrypt(x, alice.x25519_public, alice.ed25519_public)
+
+
+def test_handshake_span_only_when_a_session_is_opened():
+    alice, bob, a, b = _pair()
+    was = tracing.is_enabled()
+    tracing.enable()
+    tracing.clear()
+    try:
+        for i in range(3):
+            b.decrypt(a.encrypt(f"msg {i}", "bob", bob.x25519_public, "text"),
+                      alice.x25519_public, alice.ed25519_public)
+        names = [s["name"] for s in tracing.get_spans()]
+    finally:
+        tracing.enable(was)
+        tracing.clear()
+    assert names.count("session.handshake") == 2  # one to send, one to receive
+    assert names.count("session.decrypt") == 3
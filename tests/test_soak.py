@@ -0,0 +1,38 @@
+import pytest
+
+from benchmarks import soak
+from server import main as relay, replay_protection
+
+_leaked = []
+
+
+@pytest.fixture(autouse=True)
+def small_windows(monkeypatch):
+    # replay windows are steady once full; keep them small so a short run
+    # gets there during warm-up
+    monkeypatch.setattr(replay_protection, "MAX_NONCES_PER_SENDER", 5)
+    monkeypatch.delenv("SCCSE_RELAYS", raising=False)
+
+
+def test_short_soak_is_steady():
+    report = soak.run(6, rate=20, interval=0.5, warmup=0.5, devices=5)
+    assert report.final.sent > 0 and report.final.received > 0
+    assert report.errors == 0
+    assert report.ok, "\n".join(report.lines())
+
+
+def test_leak_is_reported_with_its_site(monkeypatch):
+    store = relay._store
+
+    def leaky_store(recipient_id, record, nonce):
+        _leaked.append(bytes(64 * 1024))
+        store(recipient_id, record, nonce)
+
+    monkeypatch.setattr(relay, "_store", leaky_store)
+    try:
+        report = soak.run(4, rate=20, interval=0.5, warmup=0.5, devices=5)
+    finally:
+        _leaked.clear()
+    assert not report.ok
+    assert "traced memory grew" in report.failures[0]
+    assert "test_soak.py" in str(report.top[0].traceback)
@@ -0,0 +1,85 @@
+import os
+import time
+
+import pytest
+
+from client import pairing, server_api, spool
+from server import auth, database, replay_protection
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+from server.main import app  # noqa: E402
+
+client = TestClient(app)
+
+
+def _bundle(sender_id, nonce=None):
+    return {
+        "ciphertext": "AA==",
+        "metadata": {
+            "sender_id": sender_id,
+            "nonce": nonce or os.urandom(8).hex(),
+            "content_type": "text",
+            "timestamp": time.time(),
+            "ttl": 300,
+        },
+    }
+
+
+def setup_function():
+    database.clear()
+    replay_protection.clear()
+
+
+def test_upload_batch_reports_each_item():
+    dup = _bundle("alice", "dup")
+    r = client.post("/upload_batch", json={"items": [
+        {"recipient_id": "bob", "bundle": dup},
+        {"recipient_id": "carol", "bundle": _bundle("alice")},
+        {"recipient_id": "dave", "bundle": dup},
+        {"recipient_id": "erin", "bundle": {"ciphertext": "AA=="}},
+    ]})
+    assert r.status_code == 200
+    assert [x["status"] for x in r.json()["results"]] == ["ok", "ok", "replay", "invalid"]
+    assert r.json()["stored"] == 2
+    owner = {"Authorization": f"Bearer {auth.issue('carol')}"}
+    assert client.get("/fetch/carol", headers=owner).json()["metadata"]["sender_id"] == "alice"
+
+
+def test_batch_items_for_one_recipient_are_all_delivered_in_order():
+    first, second = _bundle("alice"), _bundle("alice")
+    r = client.post("/upload_batch", json={"items": [
+        {"recipient_id": "bob", "bundle": first},
+        {"recipient_id": "bob", "bundle": second},
+    ]})
+    assert [x["status"] for x in r.json()["results"]] == ["ok", "ok"]
+
+    owner = {"Authorization": f"Bearer {auth.issue('bob')}"}
+    nonces = [client.get("/fetch/bob", headers=owner).json()["metadata"]["nonce"] for _ in range(2)]
+    assert nonces == [first["metadata"]["nonce"], second["metadata"]["nonce"]]
+    assert client.get("/fetch/bob", headers=owner).status_code == 404
+
+
+def test_spool_survives_relay_outage(tmp_path, monkeypatch):
+    monkeypatch.setattr(pairing, "DATA_DIR", str(tmp_path))
+
+    def relay_down(items):
+        raise ConnectionError("relay down")
+
+    def relay_up(items):
+        payload = {"items": [{"recipient_id": rid, "bundle": b} for b, rid in items]}
+        return client.post("/upload_batch", json=payload).json()["results"]
+
+    for rid in ("bob", "carol", "dave"):
+        spool.enqueue(_bundle("alice"), rid)
+
+    monkeypatch.setattr(server_api, "send_batch", relay_down)
+    with pytest.raises(ConnectionError):
+        spool.flush_once()
+    assert len(spool.pending()) == 3
+
+    monkeypatch.setattr(server_api, "send_batch", relay_up)
+    assert spool.flush_once() == 3
+    assert spool.pending() == []
+    assert database.count() == 3
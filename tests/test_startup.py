@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.bench_startup import ROOT, importtime
+
+# Budgets for a cold `import client.app`. Override on slow machines.
+IMPORT_BUDGET_MS = float(os.environ.get("SCCSE_IMPORT_BUDGET_MS", "150"))
+COLD_START_BUDGET_MS = float(os.environ.get("SCCSE_COLD_START_BUDGET_MS", "1500"))
+
+HEAVY_MODULES = ("requests", "cryptography")
+
+
+def test_importtime_within_budget():
+    total_us, rows = importtime("client.app")
+    top = ", ".join(f"{name} {us / 1000:.1f}ms" for us, name in rows[:5])
+    assert total_us is not None
+    assert total_us / 1000 <= IMPORT_BUDGET_MS, f"import client.app too slow: {top}"
+
+
+def test_cold_start_defers_heavy_imports():
+    code = (
+        "import sys, time; t = time.perf_counter(); import client.app; "
+        "print(time.perf_counter() - t); "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60
+    )
+    assert out.returncode == 0, out.stderr
+    elapsed, loaded = out.stdout.splitlines()
+    assert loaded == "", f"loaded at startup: {loaded}"
+    assert float(elapsed) * 1000 <= COLD_START_BUDGET_MS
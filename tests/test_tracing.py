@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from client import tracing
+
+
+@pytest.fixture(autouse=True)
+def _tracing():
+    was = tracing.is_enabled()
+    tracing.clear()
+    yield
+    tracing.enable(was)
+    tracing.clear()
+
+
+def test_spans_are_free_when_off():
+    tracing.enable(False)
+    with tracing.span("encrypt.aead") as s:
+        s.set_trace("t1")
+    assert tracing.get_spans() == []
+    assert tracing.summary() == []
+
+
+def test_spans_join_the_current_trace():
+    tracing.enable()
+    token = tracing.set_trace_id("t1")
+    try:
+        with tracing.span("encrypt.aead"):
+            pass
+        with pytest.raises(ValueError):
+            with tracing.span("relay.upload"):
+                raise ValueError("down")
+    finally:
+        tracing.reset_trace_id(token)
+    with tracing.span("relay.fetch") as s:
+        s.set_trace("t2")  # found inside the fetched bundle
+
+    spans = tracing.get_spans()
+    assert [(s["name"], s["trace_id"], s["ok"]) for s in spans] == [
+        ("encrypt.aead", "t1", True), ("relay.upload", "t1", False), ("relay.fetch", "t2", True),
+    ]
+    assert tracing.current_trace_id() is None
+
+
+def test_summary_and_end_to_end_join():
+    sender = [{"trace_id": "t1", "name": "encrypt", "start": 100.0, "duration_ms": 5.0}]
+    receiver = [{"trace_id": "t1", "name": "decrypt", "start": 100.5, "duration_ms": 20.0},
+                {"trace_id": None, "name": "idle", "start": 0.0, "duration_ms": 1.0}]
+    assert tracing.join_traces(sender, receiver) == {"t1": pytest.approx(520.0)}
+
+    tracing.enable()
+    for _ in range(3):
+        with tracing.span("decrypt", "t9"):
+            pass
+    lines = tracing.summary()
+    assert lines[0].startswith("decrypt") and "n=3" in lines[0]
+    assert lines[-1].startswith("end-to-end") and "n=1" in lines[-1]
+
+
+def test_export_writes_every_span(tmp_path):
+    tracing.enable()
+    with tracing.span("keys.load", "t1"):
+        pass
+    path = tmp_path / "trace.json"
+    text = tracing.export_json(str(path))
+    assert json.loads(path.read_text()) == json.loads(text)
+    assert [s["name"] for s in json.loads(text)["spans"]] == ["keys.load"]
+
+
+def test_ui_summary_without_a_trace_box():
+    pytest.importorskip("tkinter")
+    from types import SimpleNamespace
+
+    from client.ui import ClientUI
+
+    tracing.enable()  # turned on after the layout was built without the box
+    ClientUI.refresh_trace_summary(SimpleNamespace(trace_box=None))
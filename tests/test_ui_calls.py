@@ -0,0 +1,68 @@
+import queue
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("tkinter")
+from client.ui import ClientUI  # noqa: E402
+
+
+class _Root:
+    def __init__(self):
+        self.scheduled, self.reported = [], []
+
+    def after(self, ms, fn):
+        self.scheduled.append(fn)
+
+    def report_callback_exception(self, exc, value, tb):
+        self.reported.append(value)
+
+
+def test_failing_ui_call_does_not_stop_the_queue():
+    ui = SimpleNamespace(_ui_calls=queue.Queue(), root=_Root())
+    ui._poll_ui_calls = lambda: ClientUI._poll_ui_calls(ui)
+    done = []
+
+    def boom():
+        raise RuntimeError("boom")
+
+    for call in ((done.append, (1,)), (boom, ()), (done.append, (2,))):
+        ui._ui_calls.put(call)
+    ClientUI._poll_ui_calls(ui)
+
+    assert done == [1, 2]
+    assert [str(e) for e in ui.root.reported] == ["boom"]
+    assert len(ui.root.scheduled) == 1  # keeps polling
+
+    ui._ui_calls.put((done.append, (3,)))
+    ui.root.scheduled[0]()
+    assert done == [1, 2, 3]
+
+
+def test_received_bundles_use_the_keys_loaded_at_startup(my_keys, monkeypatch):
+    from client import pairing, ui as ui_module
+    from client.pairing import generate_keys
+    from crypto.hybrid_encrypt import encrypt_bundle
+
+    bob = generate_keys()
+    pairing.save_peer("bob", bob.x25519_public.public_bytes_raw(), bob.ed25519_public.public_bytes_raw())
+
+    ui = SimpleNamespace(root=_Root(), my_id="me", my_keys=None, _init_results=queue.Queue(),
+                         _render_history=lambda items: None, toast=lambda *a, **k: None)
+    ui._init_results.put((pairing.load_my_keys(), []))
+    ClientUI._poll_background_init(ui)
+    assert ui.my_keys is not None
+
+    def no_reload():
+        raise AssertionError("keys loaded again")
+
+    copied = []
+    monkeypatch.setattr(ui_module, "load_my_keys", no_reload)
+    ui.autosender = SimpleNamespace(ignore=lambda text: None)
+    ui.root.clipboard_clear = lambda: None
+    ui.root.clipboard_append = copied.append
+    ui._add_history = lambda entries: None
+    for secret in ("hunter2", "swordfish"):
+        bundle = encrypt_bundle(secret, bob.ed25519_private, my_keys.x25519_public, "bob", "password")
+        ClientUI._receive_bundle(ui, bundle)
+    assert copied == ["hunter2", "swordfish"]
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from client.widgets import PREVIEW_CHARS, PREVIEW_LINE_CHARS, VirtualList, preview_window
+
+FRAME_MS = 1000 / 60
+
+
+def test_preview_is_bounded_for_huge_clips():
+    clip = ("x" * 99 + "\n") * 500_000  # 50 MB
+    t = time.perf_counter()
+    preview, truncated = preview_window(clip)
+    elapsed_ms = (time.perf_counter() - t) * 1000
+
+    assert truncated
+    assert len(preview) < PREVIEW_CHARS + 100
+    assert preview.startswith(clip[:1000])
+    assert elapsed_ms < FRAME_MS
+
+
+def test_preview_caps_long_lines_and_keeps_small_text():
+    preview, truncated = preview_window("a" * (PREVIEW_LINE_CHARS * 3) + "\nend")
+    assert truncated
+    assert max(len(line) for line in preview.split("\n")) <= PREVIEW_LINE_CHARS + 2
+
+    assert preview_window("hello\nworld") == ("hello\nworld", False)
+
+
+@pytest.fixture
+def root():
+    tk = pytest.importorskip("tkinter")
+    try:
+        r = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    yield r
+    r.destroy()
+
+
+def test_virtual_list_draws_only_visible_rows(root):
+    calls = []
+    view = VirtualList(root, formatter=lambda i: calls.append(i) or f"row {i}", height=20)
+    view.pack()
+    root.update()
+
+    t = time.perf_counter()
+    view.set_items(list(range(100_000)))
+    view.redraw()
+    view.insert(0, -1)
+    view.redraw()
+    elapsed_ms = (time.perf_counter() - t) * 1000
+
+    assert len(calls) <= 2 * view.visible_rows()
+    assert elapsed_ms < FRAME_MS
+    assert len(view) == 100_001